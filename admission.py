@@ -0,0 +1,139 @@
+"""Admission control in front of Oracle for server.py.
+
+Two independent limits keep Oracle load bounded whatever the terminals do:
+
+* RateLimiter: a token bucket per client (X-Device-ID header, `device_id`
+  query parameter, else the remote address) and route class, so one
+  terminal stuck in a retry loop or a runaway pager is turned away with a
+  429 before it reaches the database. A remote address may be a whole
+  store behind NAT, so server.py scales its bucket up.
+* DBGate: a process-wide cap on sessions doing work at once. Requests that
+  cannot get a slot within a short wait fail fast with 429 instead of
+  queueing on the pool for its full wait timeout.
+
+Both report `retry_after` seconds for the Retry-After header.
+"""
+from collections import OrderedDict
+import math
+import threading
+import time
+
+# Route prefix -> class; the first match wins, everything else is 'default'
+ROUTE_CLASSES = (
+    ('/api/itemmaster', 'catalog'),
+    ('/api/rpos-login/status', 'status'),
+    ('/api/rpos-login', 'login'),
+)
+
+
+def route_class(path):
+    for prefix, name in ROUTE_CLASSES:
+        if path.startswith(prefix):
+            return name
+    return 'default'
+
+
+def parse_rates(spec, defaults):
+    """Parse "catalog=10:40,status=2:10" into {class: (tokens per second, burst)}"""
+    rates = dict(defaults)
+    for part in filter(None, (item.strip() for item in (spec or '').split(','))):
+        name, _, values = part.partition('=')
+        rate, _, burst = values.partition(':')
+        current = rates.get(name.strip(), rates.get('default', (10.0, 40)))
+        rates[name.strip()] = (
+            float(rate) if rate else current[0],
+            int(burst) if burst else current[1],
+        )
+    return rates
+
+
+class Rejected(Exception):
+    """Request turned away by admission control; answered with 429"""
+
+    def __init__(self, reason, route_class, retry_after):
+        super().__init__(f"{reason} ({route_class})")
+        self.reason = reason
+        self.route_class = route_class
+        self.retry_after = retry_after
+
+
+class RateLimiter:
+    """Token buckets keyed by (client, route class), bounded to `max_clients` LRU entries"""
+
+    def __init__(self, rates, max_clients=10000):
+        self.rates = rates
+        self.max_clients = max_clients
+        self._buckets = OrderedDict()  # (client, class) -> [tokens, updated_at]
+        self._lock = threading.Lock()
+        self._stats = {'allowed': 0, 'limited': 0, 'evictions': 0}
+
+    def check(self, client, name, scale=1.0):
+        """Take one token or raise Rejected with the time until one is available.
+
+        `scale` multiplies the class's rate and burst for this client.
+        """
+        rate, burst = self.rates.get(name) or self.rates['default']
+        rate, burst = rate * scale, burst * scale
+        key = (client, name)
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [float(burst), now]
+                while len(self._buckets) > self.max_clients:
+                    self._buckets.popitem(last=False)
+                    self._stats['evictions'] += 1
+            else:
+                self._buckets.move_to_end(key)
+                bucket[0] = min(float(burst), bucket[0] + (now - bucket[1]) * rate)
+                bucket[1] = now
+
+            if bucket[0] >= 1.0:
+                bucket[0] -= 1.0
+                self._stats['allowed'] += 1
+                return
+            self._stats['limited'] += 1
+            wait = (1.0 - bucket[0]) / rate if rate > 0 else 60.0
+        raise Rejected('rate_limited', name, max(1, math.ceil(wait)))
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['clients'] = len(self._buckets)
+        stats['max_clients'] = self.max_clients
+        stats['rates'] = {name: {'rate': rate, 'burst': burst}
+                          for name, (rate, burst) in self.rates.items()}
+        return stats
+
+
+class DBGate:
+    """Counting semaphore over concurrent DB work with a bounded wait"""
+
+    def __init__(self, limit, retry_after=1):
+        self.limit = limit
+        self.retry_after = retry_after
+        self._semaphore = threading.BoundedSemaphore(limit)
+        self._lock = threading.Lock()
+        self._stats = {'active': 0, 'peak': 0, 'admitted': 0, 'rejected': 0}
+
+    def acquire(self, timeout, name='default'):
+        """Take a slot within `timeout` seconds or raise Rejected"""
+        if not self._semaphore.acquire(timeout=timeout):
+            with self._lock:
+                self._stats['rejected'] += 1
+            raise Rejected('db_busy', name, self.retry_after)
+        with self._lock:
+            self._stats['admitted'] += 1
+            self._stats['active'] += 1
+            self._stats['peak'] = max(self._stats['peak'], self._stats['active'])
+
+    def release(self):
+        with self._lock:
+            self._stats['active'] -= 1
+        self._semaphore.release()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats['limit'] = self.limit
+        return stats
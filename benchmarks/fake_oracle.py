@@ -0,0 +1,484 @@
+"""SQLite-backed stand-in for the parts of cx_Oracle that server.py uses.
+
+For benchmarking only: `install()` registers this module as `cx_Oracle`
+before server.py is imported. Each pooled session owns its own SQLite
+connection to a shared database file, and every client/server round trip
+sleeps for the configured latency, so the numbers react to the same things
+production does: pool size, round trips per request (arraysize and
+prefetchrows) and hard parses missed by the session statement cache.
+set_dsn() gives a DSN its own database file, or takes it down, to stand in
+for the standbys server.py routes reads to.
+"""
+from collections import OrderedDict
+import os
+import random
+import re
+import sqlite3
+import sys
+import threading
+import time
+
+# Type codes and pool modes referenced by server.py
+DB_TYPE_VARCHAR = 'DB_TYPE_VARCHAR'
+DB_TYPE_NUMBER = 'DB_TYPE_NUMBER'
+DB_TYPE_DATE = 'DB_TYPE_DATE'
+DB_TYPE_TIMESTAMP = 'DB_TYPE_TIMESTAMP'
+DB_TYPE_TIMESTAMP_TZ = 'DB_TYPE_TIMESTAMP_TZ'
+DB_TYPE_TIMESTAMP_LTZ = 'DB_TYPE_TIMESTAMP_LTZ'
+DB_TYPE_CLOB = 'DB_TYPE_CLOB'
+DB_TYPE_NCLOB = 'DB_TYPE_NCLOB'
+DB_TYPE_LONG = 'DB_TYPE_LONG'
+SPOOL_ATTRVAL_WAIT = 0
+SPOOL_ATTRVAL_NOWAIT = 1
+SPOOL_ATTRVAL_FORCEGET = 2
+SPOOL_ATTRVAL_TIMEDWAIT = 3
+
+
+class _ErrorInfo:
+    """Mirrors cx_Oracle's error object: `code` plus message"""
+
+    def __init__(self, code, message):
+        self.code = code
+        self.message = message
+
+    def __str__(self):
+        return self.message
+
+
+class Error(Exception):
+    pass
+
+
+class DatabaseError(Error):
+    pass
+
+
+class LOB:
+    pass
+
+
+def _error(code, message):
+    return DatabaseError(_ErrorInfo(code, message))
+
+
+# Simulated environment, set by install()
+SETTINGS = {
+    'database': None,
+    'latency': 0.0,   # seconds per round trip
+    'jitter': 0.0,    # extra uniform random seconds per round trip
+    'parse': 0.0,     # seconds per hard parse (statement cache miss)
+    'dsns': {},       # DSN -> its own database file, or None while it is down
+}
+_stats_lock = threading.Lock()
+STATS = {'round_trips': 0, 'hard_parses': 0, 'executes': 0}
+
+
+def set_dsn(dsn, database):
+    """Serve `dsn` from its own database file (a standby stand-in); None takes it down.
+
+    DSNs never set here all share the database passed to install().
+    """
+    SETTINGS['dsns'][dsn] = database
+
+
+def _database_for(dsn):
+    if dsn not in SETTINGS['dsns']:
+        return SETTINGS['database']
+    database = SETTINGS['dsns'][dsn]
+    if database is None:
+        raise _error(12541, f"ORA-12541: TNS:no listener ({dsn})")
+    return database
+
+
+def _round_trip():
+    delay = SETTINGS['latency']
+    if SETTINGS['jitter']:
+        delay += random.uniform(0, SETTINGS['jitter'])
+    if delay > 0:
+        time.sleep(delay)
+    with _stats_lock:
+        STATS['round_trips'] += 1
+
+
+_MERGE_RE = re.compile(
+    r"MERGE\s+INTO\s+(?P<table>\w+)\s+\w+\s+USING\s+\(.*?\)\s+\w+\s+"
+    r"ON\s+\(\w+\.(?P<key>\w+)\s*=\s*\w+\.\w+\)\s+"
+    r"WHEN\s+MATCHED\s+THEN\s+UPDATE\s+SET\s+(?P<set>.*?)\s+"
+    r"WHEN\s+NOT\s+MATCHED\s+THEN\s+INSERT\s+\((?P<cols>.*?)\)\s+VALUES\s+\((?P<vals>.*?)\)\s*$",
+    re.S | re.I,
+)
+_translated = {}
+
+
+def _translate(sql):
+    """Rewrite the Oracle-only syntax server.py uses into SQLite"""
+    cached = _translated.get(sql)
+    if cached is not None:
+        return cached
+
+    text = sql.strip()
+    merge = _MERGE_RE.match(text)
+    if merge:
+        text = (
+            f"INSERT INTO {merge['table']} ({merge['cols']}) VALUES ({merge['vals']}) "
+            f"ON CONFLICT({merge['key']}) DO UPDATE SET {merge['set']}"
+        )
+    text = re.sub(r'\bSYSDATE\b', 'CURRENT_TIMESTAMP', text)
+    text = re.sub(r'\s+FROM\s+dual\b', '', text, flags=re.I)
+    text = re.sub(r'FETCH\s+FIRST\s+(:\w+|\d+)\s+ROWS\s+ONLY', r'LIMIT \1', text, flags=re.I)
+    _translated[sql] = text
+    return text
+
+
+class Cursor:
+    def __init__(self, connection, scrollable=False):
+        self.connection = connection
+        self.arraysize = 100
+        self.prefetchrows = 2
+        self.description = None
+        self.rowcount = 0
+        self.outputtypehandler = None
+        self._cursor = connection._db.cursor()
+        self._buffer = []
+        self._exhausted = True
+
+    def var(self, *args, **kwargs):
+        return None
+
+    def setinputsizes(self, *args, **kwargs):
+        pass
+
+    def execute(self, statement, parameters=None, **kwargs):
+        params = dict(parameters or {})
+        params.update(kwargs)
+        self.connection._check_link()
+        self.connection._parse(statement)
+        _round_trip()
+        with _stats_lock:
+            STATS['executes'] += 1
+        try:
+            self._cursor.execute(_translate(statement), params)
+        except sqlite3.Error as error:
+            raise _error(900, f"ORA-00900: {error}") from error
+
+        self.rowcount = self._cursor.rowcount
+        if self._cursor.description is None:
+            self.description = None
+            self._buffer, self._exhausted = [], True
+            return None
+
+        self.description = [
+            (desc[0].upper(), DB_TYPE_VARCHAR, None, None, None, None, True)
+            for desc in self._cursor.description
+        ]
+        # Rows that come back with the execute round trip
+        self._buffer = self._cursor.fetchmany(self.prefetchrows) if self.prefetchrows else []
+        self._exhausted = len(self._buffer) < self.prefetchrows
+        return self
+
+    def executemany(self, statement, parameters, **kwargs):
+        self.connection._parse(statement)
+        _round_trip()
+        try:
+            self._cursor.executemany(_translate(statement), parameters)
+        except sqlite3.Error as error:
+            raise _error(900, f"ORA-00900: {error}") from error
+
+    def _fill(self):
+        if self._exhausted:
+            return False
+        _round_trip()
+        size = max(1, self.arraysize)
+        batch = self._cursor.fetchmany(size)
+        self._buffer.extend(batch)
+        self._exhausted = len(batch) < size
+        return bool(batch)
+
+    def fetchone(self):
+        if not self._buffer and not self._fill():
+            return None
+        return self._buffer.pop(0)
+
+    def fetchmany(self, numRows=None):
+        size = numRows or self.arraysize
+        while len(self._buffer) < size and self._fill():
+            pass
+        rows, self._buffer = self._buffer[:size], self._buffer[size:]
+        return rows
+
+    def fetchall(self):
+        while self._fill():
+            pass
+        rows, self._buffer = self._buffer, []
+        return rows
+
+    def __iter__(self):
+        while True:
+            row = self.fetchone()
+            if row is None:
+                return
+            yield row
+
+    def close(self):
+        self._cursor.close()
+
+
+class Connection:
+    """One pooled session: a SQLite connection plus a statement cache"""
+
+    def __init__(self, _pool=None, stmtcachesize=20):
+        self._dsn = _pool.dsn if _pool is not None else None
+        self._db = sqlite3.connect(
+            _database_for(self._dsn), check_same_thread=False, isolation_level=None, timeout=30
+        )
+        self._db.execute('PRAGMA busy_timeout = 30000')
+        self._pool = _pool
+        self._statements = OrderedDict()
+        self.stmtcachesize = stmtcachesize
+        self.call_timeout = 0
+        self.outputtypehandler = None
+
+    def _check_link(self):
+        """Sessions to a DSN taken down by set_dsn() fail like a dropped connection"""
+        if self._dsn in SETTINGS['dsns'] and SETTINGS['dsns'][self._dsn] is None:
+            raise _error(3113, 'ORA-03113: end-of-file on communication channel')
+
+    def _parse(self, statement):
+        """Charge a hard parse unless the SQL text is in this session's cache"""
+        if statement in self._statements:
+            self._statements.move_to_end(statement)
+            return
+        if SETTINGS['parse']:
+            time.sleep(SETTINGS['parse'])
+        with _stats_lock:
+            STATS['hard_parses'] += 1
+        self._statements[statement] = True
+        while len(self._statements) > self.stmtcachesize:
+            self._statements.popitem(last=False)
+
+    def cursor(self, scrollable=False):
+        return Cursor(self, scrollable)
+
+    def commit(self):
+        _round_trip()
+
+    def rollback(self):
+        _round_trip()
+
+    def ping(self):
+        _round_trip()
+
+    def close(self):
+        self._db.close()
+
+
+def connect(*args, **kwargs):
+    return Connection()
+
+
+class SessionPool:
+    def __init__(self, user=None, password=None, dsn=None, min=1, max=2, increment=1,
+                 threaded=True, getmode=SPOOL_ATTRVAL_WAIT, wait_timeout=0, timeout=0,
+                 ping_interval=60, stmtcachesize=20, connectiontype=Connection, **kwargs):
+        self.dsn = dsn
+        self.min = min
+        self.max = max
+        self.increment = increment
+        self.getmode = getmode
+        self.wait_timeout = wait_timeout
+        self.timeout = timeout
+        self.stmtcachesize = stmtcachesize
+        self._connectiontype = connectiontype
+        self._idle = []
+        self._busy = 0
+        self._cond = threading.Condition()
+        for _ in range(min):
+            self._idle.append(self._open())
+
+    def _open(self):
+        return self._connectiontype(_pool=self, stmtcachesize=self.stmtcachesize)
+
+    @property
+    def busy(self):
+        return self._busy
+
+    @property
+    def opened(self):
+        return self._busy + len(self._idle)
+
+    def acquire(self):
+        deadline = None
+        if self.getmode == SPOOL_ATTRVAL_TIMEDWAIT and self.wait_timeout:
+            deadline = time.monotonic() + self.wait_timeout / 1000
+        with self._cond:
+            while not self._idle and self.opened >= self.max:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise _error(24459, 'ORA-24459: timeout waiting for pool to create new connections')
+                self._cond.wait(remaining)
+            self._busy += 1
+            if self._idle:
+                return self._idle.pop()
+        try:
+            _round_trip()  # session creation
+            return self._open()
+        except Exception:
+            with self._cond:
+                self._busy -= 1
+                self._cond.notify()
+            raise
+
+    def release(self, connection):
+        with self._cond:
+            self._busy -= 1
+            self._idle.append(connection)
+            self._cond.notify()
+
+    def drop(self, connection):
+        connection.close()
+        with self._cond:
+            self._busy -= 1
+            self._cond.notify()
+
+    def close(self, force=False):
+        with self._cond:
+            for connection in self._idle:
+                connection.close()
+            self._idle.clear()
+
+
+_ITEM_NAMES = [
+    'Apple juice', 'Banana', 'Basmati rice', 'Cardamom', 'Cherry cake', 'Date syrup',
+    'Dish soap', 'Eggs', 'Flour', 'Grapes', 'Green tea', 'Honey', 'Labneh', 'Milk',
+    'Olive oil', 'Pita bread', 'Saffron', 'Sugar', 'Tahini', 'Water',
+    'حليب', 'أرز', 'شاي', 'سكر', 'خبز', 'تمر',
+]
+_ITEM_COLUMNS = (
+    'ITEMCODE', 'ITEMNAME', 'ITEMNAMEARA', 'BARCODE', 'UNIT', 'BASEUOM', 'RETAILPRICE',
+    'WHOLESALEPRICE', 'BRANCHPRICE', 'COSTPRICE', 'CURRENTSTOCK', 'CATEGORYCODE',
+    'CATEGORYNAME', 'MAINCATEGORYCODE', 'MAINCATEGORYNAME', 'BRANDCODE', 'BRANDNAME',
+    'DESCRIPTION', 'BRANCHSTOCK', 'LOCATIONCODE', 'SUPPLIERCODE', 'ONLINEPRICE', 'FACTOR',
+)
+
+
+def item_code(pos):
+    return f"I{pos:07d}"
+
+
+def item_barcode(pos):
+    return f"629{pos:010d}"
+
+
+def _item_row(pos, rng):
+    name = f"{rng.choice(_ITEM_NAMES)} {rng.choice(('250g', '500g', '1kg', '1L', '2L', 'x6'))} {pos}"
+    price = round(rng.uniform(0.25, 120.0), 2)
+    category = pos % 40
+    brand = pos % 300
+    return (
+        item_code(pos), name, f"صنف {name}", item_barcode(pos), 'PCS', 'PCS', price,
+        round(price * 0.85, 2), round(price * 0.95, 2), round(price * 0.7, 2),
+        rng.randint(0, 500), f"C{category:03d}", f"Category {category}", f"M{category % 8}",
+        f"Main {category % 8}", f"B{brand:04d}", f"Brand {brand}",
+        None if pos % 3 else f"Description for {name}", rng.randint(0, 200), '1',
+        f"S{pos % 150:04d}", price, 1,
+    )
+
+
+def _schema(db):
+    # Untyped columns keep values as inserted (numbers stay numbers)
+    extra_columns = [
+        column for column in _read_server_columns() if column not in _ITEM_COLUMNS
+    ]
+    column_sql = ', '.join(list(_ITEM_COLUMNS) + extra_columns)
+    db.executescript(f"""
+        CREATE TABLE ITEMMASTERDETAILS ({column_sql});
+        CREATE TABLE APPLICATIONUSER (
+            COUNTER TEXT, EMPLOYEECODE INTEGER PRIMARY KEY, LOCATIONCODE INTEGER,
+            PASSWORD TEXT, USERID TEXT
+        );
+        CREATE TABLE LOCATIONMASTER (
+            LOCATIONCODE INTEGER PRIMARY KEY, LOCATIONNAME TEXT, ADDRESS TEXT, FAX TEXT,
+            EMAILID TEXT, MANAGER TEXT
+        );
+        CREATE TABLE RPOS_LOGIN (
+            DEVICE_ID TEXT PRIMARY KEY, EMPLOYEE_ID TEXT, ADMIN_EMPLOYEE_ID TEXT, LAN_IP TEXT,
+            APPROVAL_FLAG TEXT, CREATED_AT TEXT, UPDATED_AT TEXT
+        );
+        CREATE TABLE BENCH_META (ITEMS INTEGER);
+    """)
+
+
+def _read_server_columns():
+    """Every selectable ITEMMASTERDETAILS column, so any `fields` value resolves"""
+    server_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'server.py')
+    with open(server_path, encoding='utf-8') as handle:
+        source = handle.read()
+    block = source[source.index('ITEMMASTER_COLUMNS = ('):]
+    block = block[:block.index(')')]
+    return re.findall(r"'(\w+)'", block)
+
+
+def seed(database, items, users=500, locations=50, devices=2000, seed_value=1):
+    """Create (or reuse) a benchmark database holding `items` catalog rows"""
+    if os.path.exists(database):
+        db = sqlite3.connect(database)
+        try:
+            (existing,) = db.execute('SELECT ITEMS FROM BENCH_META').fetchone()
+            if existing == items:
+                return database
+        except sqlite3.Error:
+            pass
+        finally:
+            db.close()
+        os.remove(database)
+
+    rng = random.Random(seed_value)
+    db = sqlite3.connect(database)
+    db.execute('PRAGMA journal_mode = WAL')
+    db.execute('PRAGMA synchronous = OFF')
+    _schema(db)
+
+    placeholders = ', '.join('?' for _ in _ITEM_COLUMNS)
+    insert = f"INSERT INTO ITEMMASTERDETAILS ({', '.join(_ITEM_COLUMNS)}) VALUES ({placeholders})"
+    batch = 10000
+    for start in range(1, items + 1, batch):
+        db.executemany(
+            insert, (_item_row(pos, rng) for pos in range(start, min(start + batch, items + 1)))
+        )
+    db.executemany(
+        'INSERT INTO APPLICATIONUSER VALUES (?, ?, ?, ?, ?)',
+        [('Y' if code % 5 else 'N', 1000 + code, 1 + code % locations, f"pw{code}", f"user{code}")
+         for code in range(users)],
+    )
+    db.executemany(
+        'INSERT INTO LOCATIONMASTER VALUES (?, ?, ?, ?, ?, ?)',
+        [(code, f"Branch {code}", f"Street {code}", '', f"branch{code}@example.com", f"Manager {code}")
+         for code in range(1, locations + 1)],
+    )
+    db.executemany(
+        'INSERT INTO RPOS_LOGIN VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)',
+        [(f"device-{pos}", str(1000 + pos % users), str(1000 + pos % users), f"10.0.{pos // 250}.{pos % 250}",
+          'Y' if pos % 2 else 'N') for pos in range(devices)],
+    )
+    # Indexes mirror the production access paths
+    db.executescript("""
+        CREATE INDEX ITEMMASTER_CODE ON ITEMMASTERDETAILS (ITEMCODE);
+        CREATE INDEX ITEMMASTER_BARCODE ON ITEMMASTERDETAILS (BARCODE);
+        CREATE INDEX ITEMMASTER_NAME ON ITEMMASTERDETAILS (ITEMNAME, ITEMCODE);
+    """)
+    db.execute('INSERT INTO BENCH_META VALUES (?)', (items,))
+    db.commit()
+    db.close()
+    return database
+
+
+def install(database, latency_ms=1.0, jitter_ms=0.0, parse_ms=0.5):
+    """Register this module as `cx_Oracle`; must run before server.py is imported"""
+    SETTINGS.update({
+        'database': database,
+        'latency': latency_ms / 1000,
+        'jitter': jitter_ms / 1000,
+        'parse': parse_ms / 1000,
+    })
+    sys.modules['cx_Oracle'] = sys.modules[__name__]
+    return sys.modules[__name__]
@@ -0,0 +1,374 @@
+"""Load-test server.py against the SQLite stand-in for Oracle.
+
+    python benchmarks/run.py --mix mixed --items 100000 --latency-ms 2 --concurrency 32
+    python benchmarks/run.py --mix scan --snapshot --duration 30 --json results.json
+
+By default the Flask app runs in this process (through its WSGI interface)
+with `benchmarks/fake_oracle.py` installed as cx_Oracle, so no Oracle
+server is needed. To include the HTTP server and worker model, start the
+production launcher against the same fake and point `--url` at it:
+
+    python benchmarks/serve_fake.py --items 100000 -- server --workers 2
+    python benchmarks/run.py --url http://127.0.0.1:5010 --items 100000
+
+`--read-replicas N` serves reads from N copies of the database behind their
+own DSNs (see DB_READ_DSNS in server.py).
+
+Mixes: login (login storm), scan (barcode scans), paging (catalog paging,
+search and category browse), status (approval status polling) and mixed (all
+of them).
+Reports requests/second and p50/p95/p99 latency per endpoint.
+"""
+import argparse
+import http.client
+import json
+import math
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import quote, urlsplit
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH_DIR)
+sys.path.insert(1, os.path.dirname(BENCH_DIR))
+
+import fake_oracle  # noqa: E402
+
+USERS = 500
+LOCATIONS = 50
+DEVICES = 2000
+
+
+class InProcessClient:
+    """Calls the Flask app directly; one per worker thread"""
+
+    def __init__(self, app):
+        self._client = app.test_client()
+
+    def request(self, method, path, payload=None):
+        response = self._client.open(path, method=method, json=payload)
+        try:
+            return response.status_code, response.get_data()
+        finally:
+            response.close()
+
+
+class HttpClient:
+    """Keep-alive HTTP connection to a running server; one per worker thread"""
+
+    def __init__(self, base_url):
+        parts = urlsplit(base_url)
+        self._host, self._port = parts.hostname, parts.port or 80
+        self._connection = None
+
+    def request(self, method, path, payload=None):
+        body = json.dumps(payload) if payload is not None else None
+        headers = {'Content-Type': 'application/json'} if body is not None else {}
+        for attempt in range(2):
+            if self._connection is None:
+                self._connection = http.client.HTTPConnection(self._host, self._port, timeout=60)
+            try:
+                self._connection.request(method, path, body=body, headers=headers)
+                response = self._connection.getresponse()
+                return response.status, response.read()
+            except (http.client.HTTPException, ConnectionError):
+                # Server closed an idle keep-alive connection; retry once
+                self._connection.close()
+                self._connection = None
+                if attempt:
+                    raise
+
+
+class Workload:
+    """Request generators for each mix; `state` is per worker thread"""
+
+    def __init__(self, items):
+        self.items = items
+
+    def _item(self, rng):
+        return rng.randint(1, self.items)
+
+    def user(self, client, rng, state):
+        code = 1000 + rng.randint(0, USERS + USERS // 10)  # ~9% unknown users
+        return client.request('GET', f"/api/user/{code}")
+
+    def location(self, client, rng, state):
+        return client.request('GET', f"/api/location/{rng.randint(1, LOCATIONS + 5)}")
+
+    def login(self, client, rng, state):
+        employee = str(1000 + rng.randint(0, USERS - 1))
+        return client.request('POST', '/api/rpos-login', {
+            'device_id': f"device-{rng.randint(0, DEVICES - 1)}",
+            'employee_id': employee,
+            'admin_employee_id': employee,
+            'approval_flag': rng.choice('YN'),
+            'lan_ip': f"10.1.{rng.randint(0, 255)}.{rng.randint(1, 254)}",
+        })
+
+    def status(self, client, rng, state):
+        device = f"device-{rng.randint(0, DEVICES - 1)}"
+        return client.request('GET', f"/api/rpos-login/status?device_id={device}")
+
+    def barcode(self, client, rng, state):
+        pos = self._item(rng) if rng.random() < 0.95 else self.items + rng.randint(1, 1000)
+        return client.request('GET', f"/api/itemmaster/barcode/{fake_oracle.item_barcode(pos)}")
+
+    def batch_lookup(self, client, rng, state):
+        barcodes = [fake_oracle.item_barcode(self._item(rng)) for _ in range(rng.randint(5, 50))]
+        return client.request('POST', '/api/itemmaster/lookup', {'barcodes': barcodes})
+
+    def page(self, client, rng, state):
+        """Walk the catalog with keyset cursors, restarting every few pages"""
+        token = state.get('cursor')
+        if token is None or state.get('pages', 0) >= 20:
+            token, state['pages'] = '', 0
+        status, body = client.request(
+            'GET', f"/api/itemmaster/details?limit=100&after={token}"
+        )
+        state['pages'] = state.get('pages', 0) + 1
+        state['cursor'] = json.loads(body).get('next_cursor') if status == 200 else None
+        return status, body
+
+    def search(self, client, rng, state):
+        term = rng.choice(('apple', 'rice', 'milk', 'tea', 'oil', 'حليب', 'شاي', '500g'))
+        return client.request(
+            'GET', f"/api/itemmaster/details?limit=50&search={quote(term)}"
+        )
+
+    def offset_page(self, client, rng, state):
+        offset = rng.randint(0, max(0, min(self.items, 5000) - 100))
+        return client.request(
+            'GET', f"/api/itemmaster/details?limit=100&offset={offset}"
+        )
+
+    def browse(self, client, rng, state):
+        """Category menu then one filtered page, as a terminal drawing a menu does"""
+        category = f"C{rng.randint(0, 39):03d}"
+        if rng.random() < 0.5:
+            return client.request('GET', f"/api/itemmaster/facets?facets=brand&category={category}")
+        return client.request(
+            'GET', f"/api/itemmaster/details?limit=50&after=&category={category}"
+        )
+
+    # Endpoint label reported for each operation
+    ENDPOINTS = {
+        'user': 'user', 'location': 'location', 'login': 'rpos_login', 'status': 'rpos_status',
+        'barcode': 'barcode', 'batch_lookup': 'lookup', 'page': 'details_page',
+        'search': 'details_search', 'offset_page': 'details_offset', 'browse': 'facet_browse',
+    }
+    # Relative weights of each operation per mix
+    MIXES = {
+        'login': {'user': 4, 'login': 3, 'location': 2, 'status': 1},
+        'scan': {'barcode': 9, 'batch_lookup': 1},
+        'paging': {'page': 6, 'search': 3, 'offset_page': 1, 'browse': 2},
+        'status': {'status': 1},
+        'mixed': {
+            'barcode': 30, 'batch_lookup': 3, 'status': 15, 'user': 10, 'login': 5,
+            'location': 5, 'page': 10, 'search': 5, 'offset_page': 2, 'browse': 2,
+        },
+    }
+
+    def mix(self, name):
+        """[(weight, endpoint label, operation)] for a mix"""
+        return [
+            (weight, self.ENDPOINTS[operation], getattr(self, operation))
+            for operation, weight in self.MIXES[name].items()
+        ]
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(fraction * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def run_load(make_client, workload, mix_name, concurrency, duration, warmup, seed):
+    operations = workload.mix(mix_name)
+    choices = [(endpoint, operation) for _, endpoint, operation in operations]
+    weights = [weight for weight, _, _ in operations]
+    results = []  # (endpoint, seconds, ok) per worker, merged at the end
+    start_at = time.perf_counter() + warmup
+    stop_at = start_at + duration
+
+    def worker(index):
+        rng = random.Random(seed + index)
+        client = make_client()
+        state = {}
+        local = []
+        while True:
+            started = time.perf_counter()
+            if started >= stop_at:
+                break
+            endpoint, operation = rng.choices(choices, weights)[0]
+            try:
+                status, _ = operation(client, rng, state)
+                ok = status < 500
+            except Exception as error:
+                ok = False
+                print(f"{endpoint} failed: {error}", file=sys.stderr)
+            finished = time.perf_counter()
+            if started >= start_at:
+                local.append((endpoint, finished - started, ok))
+        results.append(local)
+
+    threads = [threading.Thread(target=worker, args=(index,), daemon=True)
+               for index in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return [sample for local in results for sample in local]
+
+
+def summarise(samples, duration):
+    by_endpoint = {}
+    for endpoint, seconds, ok in samples:
+        by_endpoint.setdefault(endpoint, []).append((seconds, ok))
+    by_endpoint['TOTAL'] = [(seconds, ok) for _, seconds, ok in samples]
+
+    summary = {}
+    for endpoint, entries in by_endpoint.items():
+        latencies = sorted(seconds for seconds, _ in entries)
+        summary[endpoint] = {
+            'requests': len(entries),
+            'errors': sum(1 for _, ok in entries if not ok),
+            'rps': round(len(entries) / duration, 1),
+            'mean_ms': round(sum(latencies) / len(latencies) * 1000, 3) if latencies else 0.0,
+            'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+            'p95_ms': round(percentile(latencies, 0.95) * 1000, 3),
+            'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+        }
+    return summary
+
+
+def print_summary(summary):
+    header = f"{'endpoint':<16}{'requests':>10}{'errors':>8}{'rps':>10}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+    print(header)
+    print('-' * len(header))
+    for endpoint in sorted(summary, key=lambda name: (name == 'TOTAL', name)):
+        row = summary[endpoint]
+        print(f"{endpoint:<16}{row['requests']:>10}{row['errors']:>8}{row['rps']:>10}"
+              f"{row['mean_ms']:>10}{row['p50_ms']:>10}{row['p95_ms']:>10}{row['p99_ms']:>10}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark server.py against a local Oracle stand-in')
+    parser.add_argument('--mix', default='mixed', choices=sorted(Workload.MIXES))
+    parser.add_argument('--items', type=int, default=10000, help='catalog rows (10k to 1M)')
+    parser.add_argument('--concurrency', type=int, default=16, help='concurrent clients')
+    parser.add_argument('--duration', type=float, default=10, help='measured seconds')
+    parser.add_argument('--warmup', type=float, default=2, help='unmeasured seconds before that')
+    parser.add_argument('--latency-ms', type=float, default=1.0, help='per round trip to the fake DB')
+    parser.add_argument('--jitter-ms', type=float, default=0.5, help='random extra per round trip')
+    parser.add_argument('--parse-ms', type=float, default=0.5, help='per statement cache miss')
+    parser.add_argument('--pool-max', type=int, help='DB_POOL_MAX for the in-process app')
+    parser.add_argument('--snapshot', action='store_true', help='serve the catalog from the in-memory snapshot')
+    parser.add_argument('--admission', action='store_true',
+                        help='keep per-client rate limits on (all load comes from one client)')
+    parser.add_argument('--read-replicas', type=int, default=0,
+                        help='standby stand-ins (database copies) to route reads to')
+    parser.add_argument('--db', help='SQLite file to create or reuse (default: temp dir, keyed by --items)')
+    parser.add_argument('--url', help='drive a running server instead of the in-process app')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', dest='json_path', help='also write the results as JSON here')
+    return parser.parse_args(argv)
+
+
+def prepare_database(options):
+    database = options.db or os.path.join(tempfile.gettempdir(), f"pos-bench-{options.items}.sqlite")
+    started = time.perf_counter()
+    fake_oracle.seed(database, options.items, USERS, LOCATIONS, DEVICES)
+    print(f"Database {database} ready in {time.perf_counter() - started:.1f}s ({options.items} items)")
+    return database
+
+
+def install_replicas(database, count):
+    """Copy the seeded database behind DSNs replica1..N and list them in DB_READ_DSNS"""
+    dsns = []
+    for pos in range(1, count + 1):
+        replica = f"{database}.replica{pos}"
+        shutil.copyfile(database, replica)
+        fake_oracle.set_dsn(f"replica{pos}", replica)
+        dsns.append(f"replica{pos}")
+    if dsns:
+        os.environ.setdefault('DB_READ_DSNS', ','.join(dsns))
+        # The fake has no v$dataguard_stats; report the copies as caught up
+        os.environ.setdefault('DB_REPLICA_LAG_SQL', 'SELECT 0 FROM dual')
+
+
+def load_app(options, database):
+    """Import server.py with the fake installed and the requested settings"""
+    fake_oracle.install(database, options.latency_ms, options.jitter_ms, options.parse_ms)
+    install_replicas(database, options.read_replicas)
+    if options.pool_max:
+        os.environ['DB_POOL_MAX'] = str(options.pool_max)
+    os.environ['CATALOG_SNAPSHOT'] = '1' if options.snapshot else '0'
+    os.environ['ADMISSION_CONTROL'] = '1' if options.admission else '0'
+    # Writing a log line per request would be measured along with the server
+    os.environ.setdefault('ACCESS_LOG', '0')
+
+    import server
+    if options.read_replicas:
+        server.db_router.check()
+        server.db_router.start()
+    if options.snapshot:
+        started = time.perf_counter()
+        server.catalog_store.refresh()
+        server.catalog_store.start()
+        print(f"Catalog snapshot loaded in {time.perf_counter() - started:.1f}s")
+    return server
+
+
+def main(argv=None):
+    options = parse_args(argv)
+    workload = Workload(options.items)
+    server = None
+
+    if options.url:
+        make_client = lambda: HttpClient(options.url)
+        target = options.url
+    else:
+        server = load_app(options, prepare_database(options))
+        make_client = lambda: InProcessClient(server.app)
+        target = 'in-process'
+
+    print(f"Running mix '{options.mix}' against {target}: {options.concurrency} clients, "
+          f"{options.duration}s (+{options.warmup}s warm-up)")
+    round_trips_before = dict(fake_oracle.STATS)
+    samples = run_load(make_client, workload, options.mix, options.concurrency,
+                       options.duration, options.warmup, options.seed)
+    summary = summarise(samples, options.duration)
+    print_summary(summary)
+
+    results = {'mix': options.mix, 'target': target, 'options': vars(options), 'endpoints': summary}
+    if server is not None:
+        requests = summary['TOTAL']['requests'] or 1
+        database = {
+            key: fake_oracle.STATS[key] - round_trips_before[key] for key in fake_oracle.STATS
+        }
+        database['round_trips_per_request'] = round(database['round_trips'] / requests, 2)
+        results['database'] = database
+        results['pool'] = server.get_pool_stats()
+        results['statements'] = server.itemmaster_statements.stats()
+        print(f"DB round trips/request: {database['round_trips_per_request']}, "
+              f"hard parses: {database['hard_parses']}, "
+              f"pool wait avg/max ms: {results['pool']['wait_ms_avg']}/{results['pool']['wait_ms_max']}")
+        if options.read_replicas:
+            results['routing'] = server.db_router.status()
+            print("Sessions by backend: " + ', '.join(
+                f"{backend['name']}={backend['routed']}" for backend in results['routing']['backends']
+            ))
+
+    if options.json_path:
+        with open(options.json_path, 'w', encoding='utf-8') as handle:
+            json.dump(results, handle, indent=2, default=str)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+"""Run the production launcher (serve.py) against the SQLite Oracle stand-in.
+
+    python benchmarks/serve_fake.py --items 100000 --latency-ms 2 -- server --workers 2
+
+Everything after `--` is passed to serve.py unchanged. The fake is installed
+before server.py is imported, so pre-forked workers inherit it.
+"""
+import argparse
+import os
+import sys
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH_DIR)
+sys.path.insert(1, os.path.dirname(BENCH_DIR))
+
+import fake_oracle  # noqa: E402
+import run  # noqa: E402
+
+
+def main(argv=None):
+    argv = list(sys.argv[1:] if argv is None else argv)
+    serve_args = argv[argv.index('--') + 1:] if '--' in argv else ['server']
+    own_args = argv[:argv.index('--')] if '--' in argv else argv
+
+    parser = argparse.ArgumentParser(description='Serve server.py on top of the benchmark database')
+    parser.add_argument('--items', type=int, default=10000)
+    parser.add_argument('--latency-ms', type=float, default=1.0)
+    parser.add_argument('--jitter-ms', type=float, default=0.5)
+    parser.add_argument('--parse-ms', type=float, default=0.5)
+    parser.add_argument('--db')
+    parser.add_argument('--read-replicas', type=int, default=0)
+    options = parser.parse_args(own_args)
+
+    # One load generator would otherwise be rate limited as a single terminal
+    os.environ.setdefault('ADMISSION_CONTROL', '0')
+    # ...and the access log would measure the disk, not the server
+    os.environ.setdefault('ACCESS_LOG', '0')
+    database = run.prepare_database(options)
+    fake_oracle.install(database, options.latency_ms, options.jitter_ms, options.parse_ms)
+    run.install_replicas(database, options.read_replicas)
+
+    import serve
+    serve.main(serve_args)
+
+
+if __name__ == '__main__':
+    main()
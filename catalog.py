@@ -0,0 +1,848 @@
+"""In-memory snapshot of the ITEMMASTERDETAILS catalog.
+
+The snapshot is filled by a loader supplied by the caller (server.py reads
+it from Oracle), stored column-wise in (ITEMNAME, ITEMCODE, BARCODE) order
+and swapped atomically by a background refresher so readers never see a
+partial load.
+
+Stock and prices change far more often than names, barcodes and categories.
+An optional StockOverlay holds just those columns per (ITEMCODE, BARCODE)
+row, is reloaded on a much shorter interval with a narrow query, and is
+merged into rows when they are projected for a response.
+"""
+from array import array
+import bisect
+from collections import Counter, OrderedDict
+import hashlib
+import heapq
+import logging
+import os
+import re
+import threading
+import time
+import unicodedata
+
+logger = logging.getLogger(__name__)
+
+# Harakat, Quranic marks and tatweel carry no meaning for matching
+_ARABIC_MARKS = re.compile('[\u0610-\u061a\u064b-\u065f\u0670\u06d6-\u06ed\u0640]')
+_ARABIC_FOLD = str.maketrans({
+    '\u0623': '\u0627',  # alef with hamza above -> alef
+    '\u0625': '\u0627',  # alef with hamza below -> alef
+    '\u0622': '\u0627',  # alef with madda -> alef
+    '\u0671': '\u0627',  # alef wasla -> alef
+    '\u0629': '\u0647',  # taa marbuta -> haa
+    '\u0649': '\u064a',  # alef maqsura -> yaa
+    '\u0624': '\u0648',  # waw with hamza -> waw
+    '\u0626': '\u064a',  # yaa with hamza -> yaa
+})
+
+SEARCH_COLUMNS = ('ITEMNAME', 'ITEMNAMEARA', 'BARCODE')
+
+# Browse facets: (name used in the API, code column, display name column)
+FACETS = (
+    ('category', 'CATEGORYCODE', 'CATEGORYNAME'),
+    ('maincategory', 'MAINCATEGORYCODE', 'MAINCATEGORYNAME'),
+    ('microcategory', 'MICROCATEGORYCODE', 'MICROCATEGORYNAME'),
+    ('brand', 'BRANDCODE', 'BRANDNAME'),
+)
+
+
+def _sort_key(item_name, item_code, barcode=None):
+    """Sort key matching Oracle's ORDER BY ITEMNAME, ITEMCODE, BARCODE (NULLs last)"""
+    return (
+        item_name is None,
+        '' if item_name is None else str(item_name),
+        item_code is None,
+        '' if item_code is None else str(item_code),
+        barcode is None,
+        '' if barcode is None else str(barcode),
+    )
+
+
+def normalise_text(value):
+    """Case-fold and fold Arabic spelling variants so they match each other"""
+    if value is None:
+        return ''
+    text = unicodedata.normalize('NFKC', str(value)).casefold()
+    text = _ARABIC_MARKS.sub('', text)
+    text = text.translate(_ARABIC_FOLD)
+    return ' '.join(text.split())
+
+
+def _trigrams(text):
+    return {text[pos:pos + 3] for pos in range(len(text) - 2)}
+
+
+class SearchIndex:
+    """Trigram inverted index over the distinct normalised search texts.
+
+    Each distinct text gets a stable id; postings map a trigram to the set of
+    text ids containing it. Deriving an index from the previous one only
+    touches texts that were added or removed, and copies the posting sets it
+    changes so readers of the previous snapshot are unaffected.
+    """
+
+    __slots__ = ('_text_ids', '_texts', '_postings', '_rows', '_next_id')
+
+    def __init__(self, row_texts, previous=None):
+        rows = {}
+        for row_id, text in enumerate(row_texts):
+            rows.setdefault(text, []).append(row_id)
+
+        if previous is None:
+            text_ids, texts, postings, next_id = {}, {}, {}, 0
+        else:
+            text_ids = dict(previous._text_ids)
+            texts = dict(previous._texts)
+            postings = dict(previous._postings)
+            next_id = previous._next_id
+
+        copied = set()
+
+        def writable(gram):
+            if gram not in copied:
+                copied.add(gram)
+                postings[gram] = set(postings.get(gram, ()))
+            return postings[gram]
+
+        for text in [text for text in text_ids if text not in rows]:
+            text_id = text_ids.pop(text)
+            del texts[text_id]
+            for gram in _trigrams(text):
+                posting = writable(gram)
+                posting.discard(text_id)
+                if not posting:
+                    del postings[gram]
+                    copied.discard(gram)
+
+        for text in rows:
+            if text in text_ids:
+                continue
+            text_id = next_id
+            next_id += 1
+            text_ids[text] = text_id
+            texts[text_id] = text
+            for gram in _trigrams(text):
+                writable(gram).add(text_id)
+
+        self._text_ids = text_ids
+        self._texts = texts
+        self._postings = postings
+        self._next_id = next_id
+        self._rows = {text_ids[text]: tuple(row_ids) for text, row_ids in rows.items()}
+
+    def match(self, needle):
+        """Ids of texts containing the (already normalised) `needle`"""
+        if len(needle) < 3:
+            # Too short for a trigram: scan the distinct texts instead
+            return [text_id for text_id, text in self._texts.items() if needle in text]
+
+        grams = sorted(_trigrams(needle), key=lambda gram: len(self._postings.get(gram, ())))
+        if grams[0] not in self._postings:
+            return []
+        candidates = set(self._postings[grams[0]])
+        for gram in grams[1:]:
+            candidates &= self._postings[gram]
+            if not candidates:
+                return []
+        # Shared trigrams do not guarantee adjacency, so confirm the substring
+        return [text_id for text_id in candidates if needle in self._texts[text_id]]
+
+    def rows(self, text_id):
+        return self._rows[text_id]
+
+    def score(self, text_id, needle):
+        """Lower is better: whole field, field prefix, word prefix, substring"""
+        best = 3
+        for field in self._texts[text_id].split('\x00'):
+            if field == needle:
+                return 0
+            if field.startswith(needle):
+                best = min(best, 1)
+            elif best > 2 and any(word.startswith(needle) for word in field.split(' ')):
+                best = 2
+        return best
+
+
+def _facet_value_order(value):
+    return (value['name'] is None, str(value['name'] or ''), value['code'])
+
+
+class FacetIndex:
+    """Posting lists for one facet: code -> row ids (catalog order) plus counts.
+
+    Postings are compact int arrays; `codes` keeps each row's code so a
+    candidate list can be narrowed by a second facet without building sets.
+    The unfiltered value list (code, name, count) is computed once per load.
+    """
+
+    __slots__ = ('codes', '_postings', 'values')
+
+    def __init__(self, codes, names):
+        postings = {}
+        display = {}
+        row_codes = []
+        shared = {}
+        for row_id, code in enumerate(codes):
+            if code is None:
+                row_codes.append(None)
+                continue
+            key = str(code).strip()
+            posting = postings.get(key)
+            if posting is None:
+                posting = postings[key] = array('i')
+                display[key] = names[row_id]
+            elif display[key] is None:
+                display[key] = names[row_id]
+            posting.append(row_id)
+            # One shared string per code rather than one per row
+            row_codes.append(shared.setdefault(key, key))
+
+        self.codes = tuple(row_codes)
+        self._postings = postings
+        self.values = tuple(sorted(
+            ({'code': key, 'name': display[key], 'count': len(posting)}
+             for key, posting in postings.items()),
+            key=_facet_value_order,
+        ))
+
+    def rows(self, code):
+        return self._postings.get(code, ())
+
+    def count(self, code):
+        return len(self._postings.get(code, ()))
+
+    def counts(self, candidates=None):
+        """Facet values with their row counts, restricted to `candidates` when given"""
+        if candidates is None:
+            return list(self.values)
+        counts = Counter(self.codes[row_id] for row_id in candidates)
+        counts.pop(None, None)
+        return [
+            {'code': value['code'], 'name': value['name'], 'count': counts[value['code']]}
+            for value in self.values
+            if value['code'] in counts
+        ]
+
+
+def _row_key(item_code, barcode):
+    """(ITEMCODE, BARCODE) identifying one unit row of an item, normalised like lookups"""
+    return (
+        None if item_code is None else str(item_code).strip(),
+        None if barcode is None else str(barcode).strip(),
+    )
+
+
+def _build_key_index(values):
+    index = {}
+    for row_id, value in enumerate(values):
+        if value is None:
+            continue
+        index.setdefault(str(value).strip(), []).append(row_id)
+    return {key: tuple(row_ids) for key, row_ids in index.items()}
+
+
+class StockOverlay:
+    """(ITEMCODE, BARCODE) -> volatile column values (stock, prices).
+
+    Built from rows that start with ITEMCODE and BARCODE, ordered by them so
+    the version does not depend on the order Oracle happens to return. Each
+    unit row (a piece and its carton) keeps its own price. Values never
+    change after construction; only `loaded_at` is bumped when a reload
+    finds nothing new.
+    """
+
+    __slots__ = ('column_names', 'positions', 'values', 'version', 'loaded_at')
+
+    def __init__(self, column_names, rows, loaded_at=None):
+        column_names = list(column_names)
+        if column_names[:2] != ['ITEMCODE', 'BARCODE']:
+            raise ValueError('overlay rows must start with ITEMCODE, BARCODE')
+
+        digest = hashlib.blake2b(digest_size=8)
+        digest.update(repr(column_names).encode('utf-8'))
+        values = {}
+        for row in rows:
+            if row[0] is None:
+                continue
+            key = _row_key(row[0], row[1])
+            if key not in values:
+                values[key] = tuple(row[2:])
+                digest.update(repr(row).encode('utf-8'))
+
+        self.column_names = tuple(column_names[2:])
+        self.positions = {name: pos for pos, name in enumerate(self.column_names)}
+        self.values = values
+        self.version = digest.hexdigest()
+        self.loaded_at = loaded_at if loaded_at is not None else time.time()
+
+
+class CatalogSnapshot:
+    """Immutable, column-oriented copy of the catalog view"""
+
+    __slots__ = (
+        'columns',
+        'column_names',
+        'row_count',
+        'version',
+        'loaded_at',
+        '_sort_keys',
+        'item_hashes',
+        '_row_keys',
+        '_search_index',
+        '_key_index',
+        '_facets',
+    )
+
+    def __init__(self, column_names, rows, loaded_at=None, previous=None):
+        column_names = list(column_names)
+        name_pos = column_names.index('ITEMNAME')
+        code_pos = column_names.index('ITEMCODE')
+        # BARCODE breaks ties between the unit rows of one item
+        barcode_pos = column_names.index('BARCODE') if 'BARCODE' in column_names else None
+
+        def sort_key(row):
+            return _sort_key(
+                row[name_pos], row[code_pos], None if barcode_pos is None else row[barcode_pos]
+            )
+
+        rows = sorted(rows, key=sort_key)
+
+        digest = hashlib.blake2b(digest_size=8)
+        digest.update(repr(column_names).encode('utf-8'))
+        # Content hash per ITEMCODE (all of its rows) for delta sync
+        item_digests = {}
+        for row in rows:
+            encoded = repr(row).encode('utf-8')
+            digest.update(encoded)
+            code = row[code_pos]
+            if code is None:
+                continue
+            code = str(code).strip()
+            item_digest = item_digests.get(code)
+            if item_digest is None:
+                item_digest = item_digests[code] = hashlib.blake2b(digest_size=8)
+            item_digest.update(encoded)
+
+        self.column_names = tuple(column_names)
+        self.columns = {
+            name: tuple(row[pos] for row in rows)
+            for pos, name in enumerate(column_names)
+        }
+        self.row_count = len(rows)
+        self.version = digest.hexdigest()
+        self.item_hashes = {
+            code: item_digest.digest() for code, item_digest in item_digests.items()
+        }
+        # Normalised (ITEMCODE, BARCODE) per row, for merging a StockOverlay
+        self._row_keys = tuple(
+            _row_key(code, barcode) for code, barcode in zip(
+                self.columns['ITEMCODE'],
+                self.columns.get('BARCODE', (None,) * len(rows)),
+            )
+        )
+        self.loaded_at = loaded_at if loaded_at is not None else time.time()
+        self._sort_keys = [sort_key(row) for row in rows]
+
+        search_columns = [
+            self.columns.get(name, (None,) * self.row_count) for name in SEARCH_COLUMNS
+        ]
+        # NUL-separated so a needle can never match across two columns
+        row_texts = (
+            '\x00'.join(normalise_text(value) for value in values)
+            for values in zip(*search_columns)
+        )
+        self._search_index = SearchIndex(
+            row_texts, previous._search_index if previous is not None else None
+        )
+
+        # Exact-match hash indexes for till scans: key -> tuple of row ids
+        self._key_index = {
+            name: _build_key_index(self.columns[name])
+            for name in ('BARCODE', 'ITEMCODE')
+            if name in self.columns
+        }
+
+        # Category/brand browse: posting lists and counts per facet value
+        self._facets = {
+            facet: FacetIndex(
+                self.columns[code_column],
+                self.columns.get(name_column, (None,) * self.row_count),
+            )
+            for facet, code_column, name_column in FACETS
+            if code_column in self.columns
+        }
+
+    def lookup(self, column, key):
+        """Row ids whose `column` (BARCODE or ITEMCODE) equals `key`"""
+        index = self._key_index.get(column)
+        if index is None:
+            return ()
+        return index.get(str(key).strip(), ())
+
+    def item_rows(self, item_codes):
+        """Row ids (in catalog order) belonging to any of `item_codes`"""
+        index = self._key_index.get('ITEMCODE', {})
+        row_ids = []
+        for code in item_codes:
+            row_ids.extend(index.get(code, ()))
+        row_ids.sort()
+        return row_ids
+
+    def overlay_changes(self, overlay):
+        """{ITEMCODE: hash} for items the overlay serves differently from the snapshot.
+
+        The hash covers the item's snapshot hash and its live values, so it
+        changes whenever what a terminal would receive for the item does.
+        """
+        columns = [
+            (pos, self.columns[name]) for name, pos in overlay.positions.items()
+            if name in self.columns
+        ]
+        values = overlay.values
+        changed = set()
+        for row_id, key in enumerate(self._row_keys):
+            live = values.get(key)
+            if live is None or key[0] in changed:
+                continue
+            if any(column[row_id] != live[pos] for pos, column in columns):
+                changed.add(key[0])
+
+        index = self._key_index.get('ITEMCODE', {})
+        hashes = {}
+        for code in changed:
+            digest = hashlib.blake2b(self.item_hashes.get(code, b''), digest_size=8)
+            for row_id in index.get(code, ()):
+                digest.update(repr(values.get(self._row_keys[row_id])).encode('utf-8'))
+            hashes[code] = digest.digest()
+        return hashes
+
+    def search(self, needle):
+        """Row ids (in catalog order) whose name, Arabic name or barcode contain `needle`"""
+        needle = normalise_text(needle)
+        if not needle:
+            return range(self.row_count)
+        index = self._search_index
+        row_ids = []
+        for text_id in index.match(needle):
+            row_ids.extend(index.rows(text_id))
+        row_ids.sort()
+        return row_ids
+
+    def search_ranked(self, needle, top_k, filters=None):
+        """Return (row_ids, total): the best `top_k` matches, ranked by match
+        quality then catalog order, and how many rows matched in all.
+
+        `filters` ({facet: code}) restricts the matches before ranking.
+        """
+        needle = normalise_text(needle)
+        if not needle:
+            row_ids = self.filter_rows(filters or {})
+            return list(row_ids[:top_k]), len(row_ids)
+        index = self._search_index
+        checks = self._facet_checks(filters or {})
+        if checks is None:
+            return [], 0
+        scored = [
+            (index.score(text_id, needle), row_id)
+            for text_id in index.match(needle)
+            for row_id in index.rows(text_id)
+            if all(facet.codes[row_id] == code for facet, code in checks)
+        ]
+        return [row_id for _, row_id in heapq.nsmallest(top_k, scored)], len(scored)
+
+    def _facet_checks(self, filters):
+        """[(FacetIndex, code)] for `filters`, or None if a facet is not in this snapshot"""
+        checks = []
+        for facet, code in filters.items():
+            index = self._facets.get(facet)
+            if index is None:
+                return None
+            checks.append((index, str(code).strip()))
+        return checks
+
+    def filter_rows(self, filters, candidates=None):
+        """Row ids (in catalog order) matching every {facet: code} in `filters`.
+
+        Starts from `candidates` (e.g. search hits) when given, otherwise from
+        the shortest posting list, and checks the remaining facets per row.
+        """
+        checks = self._facet_checks(filters)
+        if checks is None:
+            return ()
+        if candidates is None:
+            if not checks:
+                return range(self.row_count)
+            checks.sort(key=lambda check: check[0].count(check[1]))
+            index, code = checks.pop(0)
+            candidates = index.rows(code)
+        if not checks:
+            return candidates
+        return [
+            row_id for row_id in candidates
+            if all(index.codes[row_id] == code for index, code in checks)
+        ]
+
+    def facet_counts(self, facets, filters, candidates=None):
+        """{facet: [{code, name, count}]} for the rows matching `filters`.
+
+        Each facet is counted with the filters on the other facets only, so a
+        menu still lists the siblings of the value currently selected.
+        """
+        result = {}
+        for facet in facets:
+            index = self._facets.get(facet)
+            if index is None:
+                continue
+            others = {name: code for name, code in filters.items() if name != facet}
+            if candidates is None and not others:
+                result[facet] = index.counts()
+            else:
+                result[facet] = index.counts(self.filter_rows(others, candidates))
+        return result
+
+    def _overlay_plan(self, fields, overlay):
+        """[(field, snapshot column, overlay position or None)], or None if no field is overlaid"""
+        if overlay is None:
+            return None
+        plan = [
+            (field, self.columns[field], overlay.positions.get(field)) for field in fields
+        ]
+        if all(pos is None for _, _, pos in plan):
+            return None
+        return plan
+
+    def project(self, row_ids, fields, overlay=None):
+        """Build response rows for `row_ids` containing only `fields`.
+
+        With an `overlay`, its stock/price values replace the snapshot's for
+        the rows it knows about.
+        """
+        plan = self._overlay_plan(fields, overlay)
+        if plan is None:
+            columns = [self.columns[field] for field in fields]
+            return [
+                {field: column[row_id] for field, column in zip(fields, columns)}
+                for row_id in row_ids
+            ]
+
+        rows = []
+        for row_id in row_ids:
+            live = overlay.values.get(self._row_keys[row_id])
+            if live is None:
+                rows.append({field: column[row_id] for field, column, _ in plan})
+            else:
+                rows.append({
+                    field: column[row_id] if pos is None else live[pos]
+                    for field, column, pos in plan
+                })
+        return rows
+
+    def project_columns(self, row_ids, fields, overlay=None):
+        """Columnar variant of project(): one list of values per field"""
+        plan = self._overlay_plan(fields, overlay)
+        if plan is None:
+            return {
+                field: [self.columns[field][row_id] for row_id in row_ids]
+                for field in fields
+            }
+
+        live_rows = [overlay.values.get(self._row_keys[row_id]) for row_id in row_ids]
+        result = {}
+        for field, column, pos in plan:
+            if pos is None:
+                result[field] = [column[row_id] for row_id in row_ids]
+            else:
+                result[field] = [
+                    column[row_id] if live is None else live[pos]
+                    for row_id, live in zip(row_ids, live_rows)
+                ]
+        return result
+
+    def page_rows(self, limit, offset=0, after=None, candidates=None):
+        """Return (row_ids, next_key) for one page in (ITEMNAME, ITEMCODE, BARCODE) order.
+
+        `candidates` restricts the page to a sorted list of row ids (e.g. search
+        hits). With `after` the page starts just past that (name, code, barcode) key,
+        otherwise at `offset`; `next_key` is the seek key of the last row when
+        more rows follow (also on the first keyset page, which has no `after`).
+        """
+        if candidates is None:
+            candidates = range(self.row_count)
+
+        if after is not None:
+            start_id = bisect.bisect_right(self._sort_keys, _sort_key(*after))
+            start = bisect.bisect_left(candidates, start_id)
+        else:
+            start = offset
+
+        row_ids = candidates[start:start + limit]
+        next_key = None
+        if start + limit < len(candidates) and row_ids:
+            last = row_ids[-1]
+            barcodes = self.columns.get('BARCODE')
+            next_key = (
+                self.columns['ITEMNAME'][last],
+                self.columns['ITEMCODE'][last],
+                barcodes[last] if barcodes is not None else None,
+            )
+
+        return row_ids, next_key
+
+
+class CatalogState:
+    """What is being served: a snapshot, the overlay merged into it and their version.
+
+    `changed` maps the ITEMCODEs the overlay serves differently to their
+    hashes. With no such items the version is the snapshot's own, so the
+    version only moves when some item's served values do.
+    """
+
+    __slots__ = ('version', 'snapshot', 'overlay', 'changed')
+
+    def __init__(self, snapshot, overlay=None):
+        changed = snapshot.overlay_changes(overlay) if overlay is not None else {}
+        version = snapshot.version
+        if changed:
+            digest = hashlib.blake2b(snapshot.version.encode('ascii'), digest_size=8)
+            for code in sorted(changed):
+                digest.update(code.encode('utf-8') + b'\x00' + changed[code])
+            version = digest.hexdigest()
+        self.version = version
+        self.snapshot = snapshot
+        self.overlay = overlay
+        self.changed = changed
+
+
+class CatalogStore:
+    """Holds the current snapshot and refreshes it on a background thread.
+
+    With an `overlay_loader`, a second thread reloads the StockOverlay every
+    `overlay_interval` seconds. `on_refresh(snapshot)` is called after every
+    successful load, e.g. to materialise the snapshot to disk.
+
+    Every change to what is served (a new snapshot, or overlay values that
+    differ from it) gets a version in the history, so changes_since() also
+    reports items whose stock or price moved since a terminal last synced.
+    """
+
+    def __init__(self, loader, refresh_interval=300, history_size=48,
+                 overlay_loader=None, overlay_interval=15, on_refresh=None):
+        self._loader = loader
+        self._on_refresh = on_refresh
+        self._refresh_interval = refresh_interval
+        self._overlay_loader = overlay_loader
+        self._overlay_interval = overlay_interval
+        self._overlay = None
+        self._overlay_thread = None
+        self.overlay_refreshed_at = None
+        self.overlay_error = None
+        self._snapshot = None
+        self._state = None
+        self._state_lock = threading.Lock()
+        # version -> (snapshot version, overlay-changed item hashes), oldest first
+        self._history = OrderedDict()
+        # snapshot version -> per-ITEMCODE hashes, for snapshots the history uses
+        self._bases = {}
+        self._history_size = history_size
+        self._refresh_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._pid = None
+        self.refreshed_at = None
+        self.last_error = None
+
+    @property
+    def snapshot(self):
+        return self._snapshot
+
+    @property
+    def state(self):
+        """CatalogState being served, or None before the first load"""
+        return self._state
+
+    @property
+    def overlay(self):
+        """Current stock overlay, or None when it is missing or older than the snapshot"""
+        overlay = self._overlay
+        snapshot = self._snapshot
+        if overlay is None or (snapshot is not None and overlay.loaded_at < snapshot.loaded_at):
+            return None
+        return overlay
+
+    def refresh_overlay(self):
+        """Reload the stock/price overlay; returns the current overlay"""
+        started = time.time()
+        column_names, rows = self._overlay_loader()
+        current = self._overlay
+        fresh = StockOverlay(column_names, rows, loaded_at=started)
+        if current is not None and current.version == fresh.version:
+            # Unchanged: keep the object (and version) but record how fresh it is
+            current.loaded_at = started
+        else:
+            self._overlay = fresh
+        self.overlay_refreshed_at = time.time()
+        self.overlay_error = None
+        self._update_state()
+        return self._overlay
+
+    def refresh(self):
+        """Load the catalog and swap it in; returns the current snapshot"""
+        with self._refresh_lock:
+            column_names, rows = self._loader()
+            current = self._snapshot
+            fresh = CatalogSnapshot(column_names, rows, previous=current)
+            # Keep the existing object (and version) when nothing changed
+            if current is None or current.version != fresh.version:
+                self._snapshot = fresh
+            self._update_state()
+            self.refreshed_at = time.time()
+            self.last_error = None
+            if self._on_refresh is not None:
+                self._on_refresh(self._snapshot)
+            return self._snapshot
+
+    def _update_state(self):
+        """Recompute the served state after the snapshot or overlay changed"""
+        with self._state_lock:
+            snapshot = self._snapshot
+            if snapshot is None:
+                return
+            overlay = self.overlay
+            current = self._state
+            if current is not None and current.snapshot is snapshot and current.overlay is overlay:
+                return
+            state = CatalogState(snapshot, overlay)
+            self._remember(state)
+            self._state = state
+
+    def _remember(self, state):
+        history = dict(self._history)
+        history.pop(state.version, None)
+        history[state.version] = (state.snapshot.version, state.changed)
+        while len(history) > self._history_size:
+            del history[next(iter(history))]
+        bases = {
+            version: item_hashes for version, item_hashes in self._bases.items()
+            if any(base == version for base, _ in history.values())
+        }
+        bases[state.snapshot.version] = state.snapshot.item_hashes
+        # Replace rather than mutate so changes_since() can read lock-free
+        self._bases = bases
+        self._history = OrderedDict(history)
+
+    def changes_since(self, version, state=None):
+        """Diff `state` (default: the current one) against an earlier `version`.
+
+        `version` may be any served version still in the history, or the
+        version of a retained snapshot (e.g. the catalog file's). Returns
+        (inserted, updated, removed) as lists of ITEMCODEs, or None when
+        `version` is unknown.
+        """
+        state = state or self._state
+        bases = self._bases
+        previous = self._history.get(version)
+        if previous is None and version in bases:
+            previous = (version, {})
+        if state is None or previous is None or previous[0] not in bases:
+            return None
+
+        base_version, previous_changed = previous
+        previous_base = bases[base_version]
+        current_base = state.snapshot.item_hashes
+        changed = state.changed
+        if base_version == state.snapshot.version:
+            # Same snapshot: only items either overlay touched can differ
+            updated = [
+                code for code in sorted(set(previous_changed) | set(changed))
+                if previous_changed.get(code, current_base.get(code))
+                != changed.get(code, current_base.get(code))
+            ]
+            return [], updated, []
+
+        inserted = [code for code in current_base if code not in previous_base]
+        updated = [
+            code for code, item_hash in current_base.items()
+            if code in previous_base
+            and previous_changed.get(code, previous_base[code]) != changed.get(code, item_hash)
+        ]
+        removed = [code for code in previous_base if code not in current_base]
+        return inserted, updated, removed
+
+    def start(self):
+        """Start the refresher thread if it is not running in this process"""
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            # After a fork the parent's thread does not exist in the child
+            self._stop.clear()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(
+                target=self._run, name='catalog-refresher', daemon=True
+            )
+            self._thread.start()
+            if self._overlay_loader is not None:
+                self._overlay_thread = threading.Thread(
+                    target=self._run_overlay, name='catalog-overlay', daemon=True
+                )
+                self._overlay_thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.refresh()
+            except Exception as error:
+                self.last_error = str(error)
+                logger.error("Error refreshing catalog snapshot: %s", error)
+            self._stop.wait(self._refresh_interval)
+
+    def _run_overlay(self):
+        while not self._stop.is_set():
+            try:
+                self.refresh_overlay()
+            except Exception as error:
+                self.overlay_error = str(error)
+                logger.error("Error refreshing catalog stock overlay: %s", error)
+            self._stop.wait(self._overlay_interval)
+
+    def status(self):
+        """Version, size and age of the snapshot currently being served"""
+        snapshot = self._snapshot
+        state = self._state
+        now = time.time()
+        return {
+            'loaded': snapshot is not None,
+            'version': state.version if state else None,
+            'snapshot_version': snapshot.version if snapshot else None,
+            'overlay_changed_items': len(state.changed) if state else 0,
+            'rows': snapshot.row_count if snapshot else 0,
+            'age_seconds': round(now - snapshot.loaded_at, 3) if snapshot else None,
+            'refreshed_seconds_ago': (
+                round(now - self.refreshed_at, 3) if self.refreshed_at else None
+            ),
+            'refresh_interval': self._refresh_interval,
+            'history': list(self._history),
+            'last_error': self.last_error,
+            'overlay': self._overlay_status(now),
+        }
+
+    def _overlay_status(self, now):
+        if self._overlay_loader is None:
+            return None
+        overlay = self._overlay
+        return {
+            'active': self.overlay is not None,
+            'version': overlay.version if overlay else None,
+            'items': len(overlay.values) if overlay else 0,
+            'columns': list(overlay.column_names) if overlay else [],
+            'age_seconds': round(now - overlay.loaded_at, 3) if overlay else None,
+            'refresh_interval': self._overlay_interval,
+            'last_error': self.overlay_error,
+        }
@@ -0,0 +1,288 @@
+"""Compact binary catalog file for provisioning new terminals.
+
+Pulling the whole catalog as paged JSON is slow to encode here and slow to
+parse on a device. Each catalog snapshot version is instead written once to
+disk in a fixed binary layout and served as a static file, with HTTP Range
+support so an interrupted download can resume.
+
+Layout (all integers little-endian):
+
+    header   64 bytes, see HEADER
+    columns  per column: u8 type, u8 name length, ASCII name
+    strings  u32 offsets[string_count + 1] into the UTF-8 blob that follows
+    rows     row_count fixed-size records in catalog order (ITEMNAME,
+             ITEMCODE, BARCODE; NULLs last): a null bitmap of
+             ceil(columns / 8) bytes, then one value per column --
+             u32 string id, i64 or f64 by column type
+    index    u16 count; per index: u16 column, u32 entries, u32 row ids
+             sorted by that column's UTF-8 bytes (BARCODE, ITEMCODE)
+
+The file's SHA-256 is its checksum; it is advertised with the catalog
+version so devices only download a file they do not already have.
+"""
+import hashlib
+import math
+import os
+import struct
+import threading
+import time
+
+MAGIC = b'POSCATv1'
+FORMAT_VERSION = 1
+# magic, format, columns, rows, strings, row size, column/string/row/index offsets, version
+HEADER = struct.Struct('<8sHHIIIQQQQ8s')
+HEADER_SIZE = 64
+
+TYPE_STRING = 1
+TYPE_INT = 2
+TYPE_FLOAT = 3
+_VALUE_FORMATS = {TYPE_STRING: 'I', TYPE_INT: 'q', TYPE_FLOAT: 'd'}
+
+INDEXED_COLUMNS = ('BARCODE', 'ITEMCODE')
+
+_INT64 = (-2 ** 63, 2 ** 63 - 1)
+
+
+def _column_type(values):
+    """Narrowest type holding every non-NULL value of a column"""
+    column_type = TYPE_INT
+    for value in values:
+        if value is None:
+            continue
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            return TYPE_STRING
+        if isinstance(value, float):
+            column_type = TYPE_FLOAT
+        elif not _INT64[0] <= value <= _INT64[1]:
+            return TYPE_STRING
+    return column_type
+
+
+def _file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as handle:
+        for chunk in iter(lambda: handle.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def write_catalog_file(path, snapshot):
+    """Write `snapshot` to `path` (via a temporary file); returns the SHA-256 hex digest"""
+    names = list(snapshot.column_names)
+    columns = [snapshot.columns[name] for name in names]
+    types = [_column_type(column) for column in columns]
+
+    # String table: every distinct string once, in first-seen order
+    string_ids = {}
+    for column, column_type in zip(columns, types):
+        if column_type != TYPE_STRING:
+            continue
+        for value in column:
+            if value is not None:
+                string_ids.setdefault(str(value), len(string_ids))
+    encoded = [text.encode('utf-8') for text in string_ids]
+    string_offsets = [0]
+    for data in encoded:
+        string_offsets.append(string_offsets[-1] + len(data))
+
+    bitmap_size = math.ceil(len(names) / 8)
+    row_struct = struct.Struct(
+        f"<{bitmap_size}s" + ''.join(_VALUE_FORMATS[column_type] for column_type in types)
+    )
+    column_section = b''.join(
+        struct.pack('<BB', column_type, len(name)) + name.encode('ascii')
+        for name, column_type in zip(names, types)
+    )
+
+    columns_offset = HEADER_SIZE
+    strings_offset = columns_offset + len(column_section)
+    rows_offset = strings_offset + 4 * len(string_offsets) + string_offsets[-1]
+    index_offset = rows_offset + row_struct.size * snapshot.row_count
+
+    header = HEADER.pack(
+        MAGIC, FORMAT_VERSION, len(names), snapshot.row_count, len(encoded), row_struct.size,
+        columns_offset, strings_offset, rows_offset, index_offset,
+        bytes.fromhex(snapshot.version)[:8].ljust(8, b'\0'),
+    ).ljust(HEADER_SIZE, b'\0')
+
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(temp_path, 'wb') as handle:
+            handle.write(header)
+            handle.write(column_section)
+            handle.write(struct.pack(f"<{len(string_offsets)}I", *string_offsets))
+            for data in encoded:
+                handle.write(data)
+
+            for row_id in range(snapshot.row_count):
+                bitmap = bytearray(bitmap_size)
+                values = []
+                for pos, (column, column_type) in enumerate(zip(columns, types)):
+                    value = column[row_id]
+                    if value is None:
+                        bitmap[pos >> 3] |= 1 << (pos & 7)
+                        values.append(0)
+                    elif column_type == TYPE_STRING:
+                        values.append(string_ids[str(value)])
+                    else:
+                        values.append(value)
+                handle.write(row_struct.pack(bytes(bitmap), *values))
+
+            indexed = [name for name in INDEXED_COLUMNS if name in names]
+            handle.write(struct.pack('<H', len(indexed)))
+            for name in indexed:
+                column = snapshot.columns[name]
+                # Python string order is code point order, i.e. UTF-8 byte order
+                row_ids = sorted(
+                    (row_id for row_id in range(snapshot.row_count) if column[row_id] is not None),
+                    key=lambda row_id: str(column[row_id]),
+                )
+                handle.write(struct.pack('<HI', names.index(name), len(row_ids)))
+                handle.write(struct.pack(f"<{len(row_ids)}I", *row_ids))
+        checksum = _file_sha256(temp_path)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return checksum
+
+
+def read_rows(buffer):
+    """Decode a catalog file (bytes or a buffer) into (column names, list of row tuples)"""
+    (magic, format_version, column_count, row_count, string_count, row_size,
+     columns_offset, strings_offset, rows_offset, _, _) = HEADER.unpack_from(buffer, 0)
+    if magic != MAGIC or format_version != FORMAT_VERSION:
+        raise ValueError('not a catalog file')
+
+    names, types = [], []
+    pos = columns_offset
+    for _ in range(column_count):
+        column_type, length = struct.unpack_from('<BB', buffer, pos)
+        names.append(bytes(buffer[pos + 2:pos + 2 + length]).decode('ascii'))
+        types.append(column_type)
+        pos += 2 + length
+
+    offsets = struct.unpack_from(f"<{string_count + 1}I", buffer, strings_offset)
+    blob = strings_offset + 4 * (string_count + 1)
+    strings = [
+        bytes(buffer[blob + offsets[i]:blob + offsets[i + 1]]).decode('utf-8')
+        for i in range(string_count)
+    ]
+
+    bitmap_size = math.ceil(column_count / 8)
+    row_struct = struct.Struct(
+        f"<{bitmap_size}s" + ''.join(_VALUE_FORMATS[column_type] for column_type in types)
+    )
+    if row_struct.size != row_size:
+        raise ValueError('catalog file column table does not match its row size')
+    rows = []
+    for row_id in range(row_count):
+        bitmap, *values = row_struct.unpack_from(buffer, rows_offset + row_id * row_size)
+        rows.append(tuple(
+            None if bitmap[pos >> 3] & (1 << (pos & 7))
+            else strings[value] if column_type == TYPE_STRING else value
+            for pos, (value, column_type) in enumerate(zip(values, types))
+        ))
+    return names, rows
+
+
+class CatalogFile:
+    """One published catalog file on disk"""
+
+    def __init__(self, path, version, checksum):
+        self.path = path
+        self.version = version
+        self.checksum = checksum
+        self.created_at = time.time()
+        self.size = os.path.getsize(path)
+
+    def info(self):
+        return {
+            'version': self.version,
+            'size': self.size,
+            'sha256': self.checksum,
+            'format': FORMAT_VERSION,
+            'created_at': self.created_at,
+        }
+
+
+class CatalogFileStore:
+    """Writes a file per snapshot version into `directory` and serves the newest.
+
+    Files are named by version, so workers sharing the directory reuse one
+    another's output. Every publish, including one that finds the version
+    unchanged, bumps the served file's mtime. A file is pruned only when it
+    is not among the `keep` newest and no store sharing the directory has
+    published it within `grace` seconds. Set `grace` above the refresh
+    interval so another worker's current file is never removed under it.
+    """
+
+    def __init__(self, directory, keep=2, grace=3600):
+        self.directory = directory
+        self.keep = keep
+        self.grace = grace
+        self._current = None
+        self._lock = threading.Lock()
+        self.last_error = None
+
+    @property
+    def current(self):
+        return self._current
+
+    def publish(self, snapshot):
+        """Materialise `snapshot` unless its file already exists; returns the CatalogFile"""
+        with self._lock:
+            current = self._current
+            if current is not None and current.version == snapshot.version:
+                try:
+                    os.utime(current.path)
+                    return current
+                except FileNotFoundError:
+                    pass  # removed behind our back: write it again
+
+            os.makedirs(self.directory, exist_ok=True)
+            path = os.path.join(self.directory, f"catalog-{snapshot.version}.bin")
+            checksum_path = path + '.sha256'
+            checksum = None
+            if os.path.exists(path) and os.path.exists(checksum_path):
+                with open(checksum_path, encoding='ascii') as handle:
+                    checksum = handle.read().strip() or None
+            if checksum is None:
+                checksum = write_catalog_file(path, snapshot)
+                temp_path = f"{checksum_path}.{os.getpid()}.tmp"
+                with open(temp_path, 'w', encoding='ascii') as handle:
+                    handle.write(checksum)
+                os.replace(temp_path, checksum_path)
+            else:
+                os.utime(path)
+
+            self._current = CatalogFile(path, snapshot.version, checksum)
+            self.last_error = None
+            self._prune()
+            return self._current
+
+    def _prune(self):
+        files = sorted(
+            (entry for entry in os.scandir(self.directory)
+             if entry.name.startswith('catalog-') and entry.name.endswith('.bin')),
+            key=lambda entry: entry.stat().st_mtime,
+            reverse=True,
+        )
+        expired = time.time() - self.grace
+        for entry in files[self.keep:]:
+            if entry.path == self._current.path or entry.stat().st_mtime > expired:
+                continue
+            for stale in (entry.path, entry.path + '.sha256'):
+                try:
+                    os.remove(stale)
+                except OSError:
+                    pass  # still open (Windows) or removed by another worker
+
+    def status(self):
+        current = self._current
+        return {
+            'directory': self.directory,
+            'file': current.info() if current is not None else None,
+            'last_error': self.last_error,
+        }
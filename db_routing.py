@@ -0,0 +1,245 @@
+"""Read routing across the primary and read-only standby DSNs for server.py.
+
+Writes and reads that must see them (RPOS_LOGIN approval status) stay on the
+primary. Other reads are classified by workload ('catalog', 'lookup', ...)
+and may go to a standby (Active Data Guard or any read replica):
+
+* Replicas are picked at random in proportion to their weight.
+* A background checker probes every backend on an interval, tracking round
+  trip latency and, where the probe reports it, replication lag in seconds.
+* A replica is taken out of rotation after `failure_threshold` consecutive
+  failed probes or lost sessions, or when its probe latency exceeds
+  `max_latency_ms`, and is put back by the next good probe. With no usable
+  replica, reads fall back to the primary.
+* A workload with a max staleness only uses replicas whose last measured
+  lag is within it; an unknown lag never qualifies.
+
+Replica pools are only ever created by the checker, so a request never
+waits on connecting to a standby that is down.
+"""
+import logging
+import os
+import random
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+PRIMARY = 'primary'
+
+
+def parse_dsns(spec):
+    """Parse "standby1=10.0.0.5:1521/rgc@3,10.0.0.6:1521/rgc" into [(name, dsn, weight)].
+
+    Entries are `[name=]dsn[@weight]`; unnamed entries become read1, read2,
+    ... and the weight defaults to 1. Use easy-connect strings or tnsnames
+    aliases here, not full connect descriptors.
+    """
+    replicas = []
+    for pos, part in enumerate(filter(None, (item.strip() for item in (spec or '').split(',')))):
+        name, _, dsn = part.rpartition('=')
+        dsn, _, weight = dsn.rpartition('@') if '@' in dsn else (dsn, '', '')
+        replicas.append((name.strip() or f"read{pos + 1}", dsn.strip(), float(weight or 1)))
+    names = [name for name, _, _ in replicas]
+    if PRIMARY in names or len(set(names)) != len(names):
+        raise ValueError(f"read DSN names must be unique and not {PRIMARY!r}: {names}")
+    return replicas
+
+
+def parse_staleness(spec, defaults):
+    """Parse "catalog=,lookup=30" into {workload: max lag seconds or None (any)}.
+
+    Workloads left out are served by the primary only; `workload=primary`
+    removes one listed in `defaults`.
+    """
+    staleness = dict(defaults)
+    for part in filter(None, (item.strip() for item in (spec or '').split(','))):
+        name, _, value = part.partition('=')
+        name, value = name.strip(), value.strip()
+        if value == PRIMARY:
+            staleness.pop(name, None)
+        else:
+            staleness[name] = float(value) if value else None
+    return staleness
+
+
+class Backend:
+    """One DSN with its weight and latest health-check results"""
+
+    def __init__(self, name, dsn, weight=1.0):
+        self.name = name
+        self.dsn = dsn
+        self.weight = weight
+        self.is_primary = name == PRIMARY
+        # Replicas stay out of rotation until their first good probe
+        self.healthy = self.is_primary
+        self.failures = 0
+        self.latency_ms = None
+        self.lag_seconds = None
+        self.checked_at = None
+        self.last_error = None
+        self.lag_error = None
+        self.stats = {'probes': 0, 'probe_errors': 0, 'routed': 0, 'session_errors': 0}
+
+    def usable(self, max_staleness, max_latency_ms):
+        if not self.healthy or self.weight <= 0:
+            return False
+        if max_latency_ms and self.latency_ms is not None and self.latency_ms > max_latency_ms:
+            return False
+        if max_staleness is None:
+            return True
+        return self.lag_seconds is not None and self.lag_seconds <= max_staleness
+
+    def info(self):
+        return {
+            'name': self.name,
+            'dsn': self.dsn,
+            'weight': self.weight,
+            'primary': self.is_primary,
+            'healthy': self.healthy,
+            'consecutive_failures': self.failures,
+            'latency_ms': round(self.latency_ms, 3) if self.latency_ms is not None else None,
+            'lag_seconds': self.lag_seconds,
+            'checked_seconds_ago': (
+                round(time.time() - self.checked_at, 3) if self.checked_at else None
+            ),
+            'last_error': self.last_error,
+            'lag_error': self.lag_error,
+            **self.stats,
+        }
+
+
+class ReadRouter:
+    """Chooses a backend per session and keeps replica health up to date.
+
+    `probe(backend)` runs a health query against the backend and returns its
+    replication lag in seconds (None if unknown); it raises when the backend
+    is unreachable. Latency is an exponentially weighted average of probe
+    round trips.
+    """
+
+    def __init__(self, primary_dsn, replicas, probe, staleness=None, interval=5.0,
+                 failure_threshold=2, max_latency_ms=None, latency_smoothing=0.3):
+        self.primary = Backend(PRIMARY, primary_dsn)
+        self.replicas = [Backend(name, dsn, weight) for name, dsn, weight in replicas]
+        self.backends = {backend.name: backend for backend in [self.primary, *self.replicas]}
+        self._probe = probe
+        # workload -> max lag in seconds (None: any); other workloads use the primary
+        self.staleness = dict(staleness or {})
+        self.interval = interval
+        self.failure_threshold = failure_threshold
+        self.max_latency_ms = max_latency_ms
+        self._smoothing = latency_smoothing
+        self._lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._pid = None
+        self.fallbacks = 0
+
+    def route(self, workload):
+        """Backend for one session: a weighted usable replica for reads, else the primary"""
+        backend = self.primary
+        if self.replicas and workload in self.staleness:
+            max_staleness = self.staleness[workload]
+            candidates = [
+                replica for replica in self.replicas
+                if replica.usable(max_staleness, self.max_latency_ms)
+            ]
+            if candidates:
+                backend = random.choices(
+                    candidates, weights=[replica.weight for replica in candidates]
+                )[0]
+            else:
+                with self._lock:
+                    self.fallbacks += 1
+        with self._lock:
+            backend.stats['routed'] += 1
+        return backend
+
+    def record_failure(self, backend, error, probe=False):
+        """Count a failed probe or lost session; enough in a row take a replica out"""
+        with self._lock:
+            backend.failures += 1
+            backend.last_error = str(error)
+            backend.stats['probe_errors' if probe else 'session_errors'] += 1
+            tripped = (
+                not backend.is_primary and backend.healthy
+                and backend.failures >= self.failure_threshold
+            )
+            if tripped:
+                backend.healthy = False
+        if tripped:
+            logger.warning("Read backend %s out of rotation: %s", backend.name, error)
+
+    def check(self):
+        """Probe every backend once"""
+        for backend in self.backends.values():
+            started = time.perf_counter()
+            try:
+                lag = self._probe(backend)
+            except Exception as error:
+                backend.checked_at = time.time()
+                self.record_failure(backend, error, probe=True)
+                continue
+            latency_ms = (time.perf_counter() - started) * 1000
+            with self._lock:
+                backend.stats['probes'] += 1
+                backend.latency_ms = latency_ms if backend.latency_ms is None else (
+                    self._smoothing * latency_ms + (1 - self._smoothing) * backend.latency_ms
+                )
+                backend.lag_seconds = lag
+                backend.checked_at = time.time()
+                backend.failures = 0
+                backend.last_error = None
+                recovered = not backend.healthy
+                backend.healthy = True
+            if recovered:
+                logger.warning("Read backend %s in rotation", backend.name)
+
+    def reset(self):
+        """Take replicas out of rotation until probed again (their pools are gone)"""
+        with self._lock:
+            for replica in self.replicas:
+                replica.healthy = False
+                replica.failures = 0
+
+    def start(self):
+        """Start the health checker if there are replicas and it is not running here"""
+        if not self.replicas:
+            return
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            # After a fork the parent's thread does not exist in the child
+            self._stop.clear()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='db-health', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.check()
+            except Exception as error:
+                logger.error("Error checking database backends: %s", error)
+            self._stop.wait(self.interval)
+
+    def status(self):
+        with self._lock:
+            backends = [backend.info() for backend in self.backends.values()]
+            fallbacks = self.fallbacks
+        return {
+            'backends': backends,
+            'primary_fallbacks': fallbacks,
+            'staleness': self.staleness,
+            'check_interval': self.interval,
+            'failure_threshold': self.failure_threshold,
+            'max_latency_ms': self.max_latency_ms,
+            'checker_running': self._thread is not None and self._pid == os.getpid(),
+        }
@@ -0,0 +1,583 @@
+"""Asyncio (ASGI) front end for the Flask apps.
+
+Connections, keep-alive and request/response I/O live on the event loop; the
+Flask app itself runs on a bounded thread pool, so blocking cx_Oracle calls
+never hold the loop. Each route class (catalog, status, default) has its own
+concurrency limit and wait queue: once a class's queue is full, further
+requests are shed with 503 + Retry-After instead of piling up, so slow
+catalog queries cannot starve /api/health or status polls.
+
+Long-polls on /api/rpos-login/status?wait=... are rate-checked, then parked
+on the event loop (no thread) until the login watcher reports a change, and
+answered from the watcher's entry; only a device the watcher knows nothing
+about is forwarded to Flask as a plain status request. Status streams (`stream=1` or
+`Accept: text/event-stream`) get their first event from such a request and
+are then relayed from the login watcher on the event loop, so an open
+stream holds neither a thread nor a bulkhead slot.
+
+Run it with `python serve.py server --async`.
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import io
+import json
+import logging
+import os
+import sys
+import threading
+from urllib.parse import parse_qsl, urlencode
+
+from werkzeug.datastructures import MIMEAccept
+from werkzeug.http import parse_accept_header
+
+from admission import ROUTE_CLASSES, Rejected
+
+logger = logging.getLogger(__name__)
+
+STATUS_PATH = '/api/rpos-login/status'
+
+# Cheap, non-blocking routes answered directly on the event loop
+INLINE_PATHS = {'/', '/api/health', '/metrics'}
+
+
+def _parse_limits(spec, defaults):
+    """Parse "catalog=8:32,status=16:64" into {class: (limit, max_queue)}"""
+    limits = dict(defaults)
+    for part in filter(None, (item.strip() for item in (spec or '').split(','))):
+        name, _, values = part.partition('=')
+        limit, _, max_queue = values.partition(':')
+        current = limits.get(name.strip(), (16, 64))
+        limits[name.strip()] = (
+            int(limit) if limit else current[0],
+            int(max_queue) if max_queue else current[1],
+        )
+    return limits
+
+
+GATEWAY_LIMITS = _parse_limits(
+    os.environ.get('GATEWAY_LIMITS'),
+    {'catalog': (8, 32), 'status': (16, 64), 'default': (16, 64)},
+)
+# Chunks a streamed response may buffer ahead of a slow client
+GATEWAY_STREAM_BUFFER = int(os.environ.get('GATEWAY_STREAM_BUFFER', 8))
+GATEWAY_RETRY_AFTER = int(os.environ.get('GATEWAY_RETRY_AFTER', 1))
+
+
+class Overloaded(Exception):
+    pass
+
+
+class _ClientGone(Exception):
+    pass
+
+
+class Bulkhead:
+    """Concurrency limit plus bounded wait queue for one route class"""
+
+    def __init__(self, name, limit, max_queue):
+        self.name = name
+        self.limit = limit
+        self.max_queue = max_queue
+        self._semaphore = asyncio.Semaphore(limit)
+        self.active = 0
+        self.waiting = 0
+        self.served = 0
+        self.shed = 0
+
+    async def __aenter__(self):
+        if self._semaphore.locked() and self.waiting >= self.max_queue:
+            self.shed += 1
+            raise Overloaded(self.name)
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        self.active += 1
+
+    async def __aexit__(self, *exc_info):
+        self.active -= 1
+        self.served += 1
+        self._semaphore.release()
+
+    def stats(self):
+        return {
+            'limit': self.limit,
+            'max_queue': self.max_queue,
+            'active': self.active,
+            'waiting': self.waiting,
+            'served': self.served,
+            'shed': self.shed,
+        }
+
+
+class Gateway:
+    """ASGI application dispatching to a WSGI app through per-class bulkheads"""
+
+    def __init__(self, wsgi_app, limits=None, login_watcher=None, watched_status=None,
+                 max_wait=60, status_payload=None, stream_heartbeat=15, stream_max_seconds=600,
+                 admit=None):
+        self.wsgi_app = wsgi_app
+        self.limits = limits or GATEWAY_LIMITS
+        self.login_watcher = login_watcher
+        self.watched_status = watched_status
+        self.max_wait = max_wait
+        # status_payload(state, admin_employee_id) -> (body, status), as in server.py
+        self.status_payload = status_payload
+        self.stream_heartbeat = stream_heartbeat
+        self.stream_max_seconds = stream_max_seconds
+        # admit(path, device_id, remote_addr) raises Rejected, as in server.py
+        self.admit = admit
+        self.parked = 0
+        self._reading = {}  # device_id -> in-flight watched_status read
+        self.streams = 0
+        self._bulkheads = None
+        self._executor = None
+
+    def _setup(self):
+        # Created lazily so they bind to the running loop of this process
+        if self._bulkheads is None:
+            self._bulkheads = {
+                name: Bulkhead(name, limit, max_queue)
+                for name, (limit, max_queue) in self.limits.items()
+            }
+            self._executor = ThreadPoolExecutor(
+                max_workers=sum(limit for limit, _ in self.limits.values()),
+                thread_name_prefix='gateway',
+            )
+
+    def stats(self):
+        self._setup()
+        return {
+            'bulkheads': {name: bulkhead.stats() for name, bulkhead in self._bulkheads.items()},
+            'parked_long_polls': self.parked,
+            'status_streams': self.streams,
+        }
+
+    def _bulkhead_for(self, path):
+        # Classes without a bulkhead of their own (e.g. 'login') share 'default'
+        for prefix, name in ROUTE_CLASSES:
+            if path.startswith(prefix):
+                return self._bulkheads.get(name, self._bulkheads['default'])
+        return self._bulkheads['default']
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            return
+
+        self._setup()
+        body = await self._read_body(receive)
+        path = scope['path']
+
+        if path == '/api/gateway':
+            await self._send_json(send, 200, _json_bytes(self.stats()))
+            return
+
+        if path in INLINE_PATHS:
+            status, headers, chunks = self._call_inline(scope, body)
+            await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+            await send({'type': 'http.response.body', 'body': b''.join(chunks)})
+            return
+
+        if path == STATUS_PATH and self.login_watcher is not None:
+            if self.status_payload is not None and _wants_event_stream(scope):
+                await self._stream_status(scope, body, receive, send)
+                return
+            scope, answer = await self._park_long_poll(scope)
+            if answer is not None:
+                payload, status = answer
+                await self._send_json(send, status, _json_bytes(payload))
+                return
+
+        try:
+            async with self._bulkhead_for(path):
+                await self._call_threaded(scope, body, receive, send)
+        except Overloaded as overloaded:
+            await self._send_overloaded(send, overloaded)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                self._setup()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                if self._executor is not None:
+                    self._executor.shutdown(wait=True)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _read_body(self, receive):
+        chunks = []
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                break
+            chunks.append(message.get('body', b''))
+            if not message.get('more_body'):
+                break
+        return b''.join(chunks)
+
+    async def _park_long_poll(self, scope):
+        """Wait on the event loop for a status change.
+
+        Returns (scope, answer): `answer` is the (status, body) to send from
+        the watcher's entry, or None to forward `scope` -- stripped of
+        `wait` -- to Flask. The client's rate limit is checked before
+        parking; a rejected poll is forwarded unparked and Flask turns it
+        away with the usual 429.
+        """
+        query = parse_qsl(scope.get('query_string', b'').decode('latin-1'), keep_blank_values=True)
+        params = dict(query)
+        device_id = params.get('device_id')
+        try:
+            wait = float(params.get('wait') or 0)
+        except ValueError:
+            wait = 0
+        if not device_id or wait <= 0 or params.get('stream') == '1':
+            return scope, None
+        forwarded = [(key, value) for key, value in query if key != 'wait']
+        forwarded = dict(scope, query_string=urlencode(forwarded).encode('latin-1'))
+
+        if self.admit is not None:
+            client_device = next(
+                (value.decode('latin-1') for name, value in scope.get('headers', [])
+                 if name.lower() == b'x-device-id'),
+                None,
+            ) or device_id
+            try:
+                self.admit(scope['path'], client_device, (scope.get('client') or ('',))[0])
+            except Rejected:
+                return forwarded, None
+
+        loop = asyncio.get_running_loop()
+        changed = asyncio.Event()
+        notify = lambda: loop.call_soon_threadsafe(changed.set)
+        watcher = self.login_watcher
+
+        watcher.subscribe(device_id)
+        watcher.add_listener(device_id, notify)
+        self.parked += 1
+        entry = None
+        try:
+            entry = watcher.current(device_id)
+            if entry is None:
+                entry = await self._read_status(scope['path'], device_id)
+            version, state = entry if entry else (None, None)
+            deadline = loop.time() + min(wait, self.max_wait)
+            while state is None or state[0] != 'Y':
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    await asyncio.wait_for(changed.wait(), timeout=remaining)
+                except asyncio.TimeoutError:
+                    break
+                changed.clear()
+                # The listener also fires for the first publish; only a new
+                # version counts as a change
+                latest = watcher.current(device_id)
+                if latest is not None and latest[0] != version:
+                    break
+            # Read before unsubscribing, which may drop the entry
+            entry = watcher.current(device_id)
+        except Overloaded:
+            entry = None
+        except Exception as error:
+            # Fall through: the forwarded request reports the error properly
+            logger.error("Error parking status long-poll: %s", error)
+            entry = None
+        finally:
+            self.parked -= 1
+            watcher.remove_listener(device_id, notify)
+            watcher.unsubscribe(device_id)
+
+        if entry is None or self.status_payload is None:
+            return forwarded, None
+        return forwarded, self.status_payload(entry[1], params.get('admin_employee_id'))
+
+    async def _read_status(self, path, device_id):
+        """watched_status() on the pool, one read shared by polls arriving together"""
+        reading = self._reading.get(device_id)
+        if reading is None:
+            reading = self._reading[device_id] = asyncio.ensure_future(
+                self._read_status_once(path, device_id)
+            )
+            reading.add_done_callback(lambda _: self._reading.pop(device_id, None))
+        # Shielded: one poll giving up must not cancel the others' read
+        return await asyncio.shield(reading)
+
+    async def _read_status_once(self, path, device_id):
+        async with self._bulkhead_for(path):
+            return await asyncio.get_running_loop().run_in_executor(
+                self._executor, self.watched_status, device_id
+            )
+
+    async def _stream_status(self, scope, body, receive, send):
+        """Server-sent status events relayed from the login watcher.
+
+        The first event is the body of a plain status request run through
+        Flask, so admission control, logging and error responses apply as
+        usual; after that only watcher changes are sent.
+        """
+        query = parse_qsl(scope.get('query_string', b'').decode('latin-1'), keep_blank_values=True)
+        params = dict(query)
+        device_id = params.get('device_id')
+        admin_employee_id = params.get('admin_employee_id')
+        forwarded = dict(
+            scope,
+            query_string=urlencode(
+                [(key, value) for key, value in query if key not in ('stream', 'wait')]
+            ).encode('latin-1'),
+            headers=[
+                (name, value) for name, value in scope.get('headers', [])
+                if name.lower() not in (b'accept', b'accept-encoding', b'if-none-match')
+            ],
+        )
+
+        loop = asyncio.get_running_loop()
+        changed = asyncio.Event()
+        notify = lambda: loop.call_soon_threadsafe(changed.set)
+        watcher = self.login_watcher
+        if device_id:
+            # Subscribe before the first read so no change falls in between
+            watcher.subscribe(device_id)
+            watcher.add_listener(device_id, notify)
+        self.streams += 1
+        disconnect = None
+        try:
+            try:
+                async with self._bulkhead_for(scope['path']):
+                    status, headers, chunks = await loop.run_in_executor(
+                        self._executor, self._call_inline, forwarded, body
+                    )
+            except Overloaded as overloaded:
+                await self._send_overloaded(send, overloaded)
+                return
+            if status not in (200, 404):
+                await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+                await send({'type': 'http.response.body', 'body': b''.join(chunks)})
+                return
+
+            await send({'type': 'http.response.start', 'status': 200, 'headers': [
+                (b'content-type', b'text/event-stream; charset=utf-8'),
+                (b'cache-control', b'no-cache'),
+                (b'x-accel-buffering', b'no'),
+            ]})
+            last = json.loads(b''.join(chunks))
+            await send({'type': 'http.response.body', 'body': _status_event(last), 'more_body': True})
+
+            disconnect = asyncio.ensure_future(self._wait_disconnect(receive))
+            deadline = loop.time() + self.stream_max_seconds
+            while True:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                waiter = asyncio.ensure_future(changed.wait())
+                done, _ = await asyncio.wait(
+                    {waiter, disconnect},
+                    timeout=min(self.stream_heartbeat, remaining),
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                waiter.cancel()
+                if disconnect in done:
+                    return
+                if waiter not in done:
+                    await send({'type': 'http.response.body', 'body': b': keep-alive\n\n',
+                                'more_body': True})
+                    continue
+                changed.clear()
+                entry = watcher.current(device_id)
+                if entry is None:
+                    continue
+                payload, _ = self.status_payload(entry[1], admin_employee_id)
+                if payload != last:
+                    last = payload
+                    await send({'type': 'http.response.body', 'body': _status_event(payload),
+                                'more_body': True})
+            await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+        finally:
+            self.streams -= 1
+            if disconnect is not None:
+                disconnect.cancel()
+            if device_id:
+                watcher.remove_listener(device_id, notify)
+                watcher.unsubscribe(device_id)
+
+    async def _wait_disconnect(self, receive):
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+
+    def _environ(self, scope, body):
+        server = scope.get('server') or ('localhost', 80)
+        client = scope.get('client') or ('', 0)
+        environ = {
+            'REQUEST_METHOD': scope['method'],
+            'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+            'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+            'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+            'SERVER_NAME': str(server[0]),
+            'SERVER_PORT': str(server[1]),
+            'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+            'REMOTE_ADDR': client[0],
+            'REMOTE_PORT': str(client[1]),
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': scope.get('scheme', 'http'),
+            'wsgi.input': io.BytesIO(body),
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': True,
+            'wsgi.run_once': False,
+        }
+        for raw_name, raw_value in scope.get('headers', []):
+            name = raw_name.decode('latin-1').upper().replace('-', '_')
+            value = raw_value.decode('latin-1')
+            if name == 'CONTENT_TYPE':
+                environ['CONTENT_TYPE'] = value
+            elif name == 'CONTENT_LENGTH':
+                environ['CONTENT_LENGTH'] = value
+            else:
+                key = f'HTTP_{name}'
+                environ[key] = f"{environ[key]},{value}" if key in environ else value
+        return environ
+
+    def _call_inline(self, scope, body):
+        response = {}
+
+        def start_response(status, headers, exc_info=None):
+            response['status'] = int(status.split(' ', 1)[0])
+            response['headers'] = _encode_headers(headers)
+
+        iterable = self.wsgi_app(self._environ(scope, body), start_response)
+        try:
+            chunks = [chunk for chunk in iterable if chunk]
+        finally:
+            close = getattr(iterable, 'close', None)
+            if close is not None:
+                close()
+        return response['status'], response['headers'], chunks
+
+    async def _call_threaded(self, scope, body, receive, send):
+        """Run the WSGI app on the pool, relaying its (possibly streamed) output"""
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+        credits = threading.Semaphore(GATEWAY_STREAM_BUFFER)
+        gone = threading.Event()
+        done = object()
+        environ = self._environ(scope, body)
+
+        def push(item):
+            # Blocks the worker thread while the client is GATEWAY_STREAM_BUFFER
+            # chunks behind, and aborts the response if it has disconnected.
+            while not credits.acquire(timeout=0.5):
+                if gone.is_set():
+                    raise _ClientGone()
+            if gone.is_set():
+                raise _ClientGone()
+            loop.call_soon_threadsafe(queue.put_nowait, item)
+
+        def run():
+            def start_response(status, headers, exc_info=None):
+                push(('start', int(status.split(' ', 1)[0]), _encode_headers(headers)))
+
+            try:
+                iterable = self.wsgi_app(environ, start_response)
+                try:
+                    for chunk in iterable:
+                        if chunk:
+                            push(chunk)
+                finally:
+                    close = getattr(iterable, 'close', None)
+                    if close is not None:
+                        close()
+            except _ClientGone:
+                pass
+            finally:
+                loop.call_soon_threadsafe(queue.put_nowait, done)
+
+        async def watch_disconnect():
+            while True:
+                message = await receive()
+                if message['type'] == 'http.disconnect':
+                    gone.set()
+                    return
+
+        worker = loop.run_in_executor(self._executor, run)
+        watcher = asyncio.ensure_future(watch_disconnect())
+        try:
+            started = False
+            while True:
+                item = await queue.get()
+                if item is done:
+                    break
+                credits.release()
+                if gone.is_set():
+                    continue
+                if isinstance(item, tuple):
+                    await send({'type': 'http.response.start', 'status': item[1], 'headers': item[2]})
+                    started = True
+                else:
+                    await send({'type': 'http.response.body', 'body': item, 'more_body': True})
+            if started and not gone.is_set():
+                await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+            await worker
+        finally:
+            gone.set()
+            watcher.cancel()
+
+    async def _send_overloaded(self, send, overloaded):
+        await self._send_json(
+            send, 503,
+            _json_bytes({
+                'error': 'Service unavailable',
+                'message': f'Too many {overloaded} requests in progress; retry shortly',
+            }),
+            [(b'retry-after', str(GATEWAY_RETRY_AFTER).encode('latin-1'))],
+        )
+
+    async def _send_json(self, send, status, body, extra_headers=()):
+        headers = [
+            (b'content-type', b'application/json'),
+            (b'content-length', str(len(body)).encode('latin-1')),
+            *extra_headers,
+        ]
+        await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': body})
+
+
+def _encode_headers(headers):
+    return [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers]
+
+
+def _json_bytes(payload):
+    return json.dumps(payload).encode('utf-8')
+
+
+def _status_event(payload):
+    return f"event: status\ndata: {json.dumps(payload)}\n\n".encode('utf-8')
+
+
+def _wants_event_stream(scope):
+    """Same test as server.py: `stream=1` or text/event-stream as the best Accept match"""
+    query = scope.get('query_string', b'').decode('latin-1')
+    if ('stream', '1') in parse_qsl(query, keep_blank_values=True):
+        return True
+    accept = b','.join(value for name, value in scope.get('headers', []) if name.lower() == b'accept')
+    return parse_accept_header(accept.decode('latin-1'), MIMEAccept).best == 'text/event-stream'
+
+
+def create_gateway(module):
+    """Wrap an app module (server.py / local-server.py) in a Gateway"""
+    return Gateway(
+        module.app,
+        login_watcher=getattr(module, 'login_watcher', None),
+        watched_status=getattr(module, '_watched_status', None),
+        max_wait=getattr(module, 'STATUS_WAIT_MAX', 60),
+        status_payload=getattr(module, '_rpos_status_payload', None),
+        stream_heartbeat=getattr(module, 'STATUS_SSE_HEARTBEAT', 15),
+        stream_max_seconds=getattr(module, 'STATUS_SSE_MAX_SECONDS', 600),
+        admit=getattr(module, '_admit', None),
+    )
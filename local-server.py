@@ -1,148 +1,58 @@
-from flask import Flask, jsonify, request
+from flask import Flask, jsonify
 from flask_cors import CORS
-import socket
 import platform
-import subprocess
-import re
 import os
-from datetime import datetime
+
+from net_identity import NetworkIdentity
+import request_log
 
 app = Flask(__name__)
 CORS(app)  # Allow Laravel/website to call this API
 
-# Add request logging
-@app.before_request
-def log_request_info():
-    """Log incoming requests for debugging"""
-    print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] {request.method} {request.path}")
-    if request.args:
-        print(f"  Query params: {request.args}")
+# Device name and LAN IP are read in the background, never per request
+NETWORK_REFRESH_SECONDS = float(os.environ.get('NETWORK_REFRESH_SECONDS', 30))
+network_identity = NetworkIdentity(NETWORK_REFRESH_SECONDS)
+PLATFORM_SYSTEM = platform.system()
+PLATFORM_RELEASE = platform.release()
+
+# Request logging goes through the background JSON-lines writer (request_log.py);
+# health checks are frequent, so only a sample of them is logged
+access_log = request_log.AccessLog('local-server', request_log.parse_sample_rates(
+    os.environ.get('ACCESS_LOG_SAMPLE'), {'/health': 0.1},
+))
+request_log.install(app, access_log)
 
 def get_device_name():
-    """Get the device/hostname name"""
-    try:
-        hostname = socket.gethostname()
-        if hostname:
-            return hostname
-    except Exception as e:
-        print(f"Error getting hostname: {e}")
-    
-    # Fallback methods
-    try:
-        if platform.system() == 'Windows':
-            result = subprocess.run(['hostname'], capture_output=True, text=True, timeout=2)
-            if result.returncode == 0:
-                return result.stdout.strip()
-        else:
-            result = subprocess.run(['hostname'], capture_output=True, text=True, timeout=2)
-            if result.returncode == 0:
-                return result.stdout.strip()
-    except Exception as e:
-        print(f"Error getting hostname via command: {e}")
-    
-    return 'Unknown-Device'
+    """Get the device/hostname name (cached)"""
+    return network_identity.current()['device_name']
 
 def get_lan_ip_address():
-    """Get the LAN IP address of the local machine"""
-    try:
-        # Method 1: Connect to a remote address to determine local IP
-        # This doesn't actually send data, just determines the route
-        s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        try:
-            # Connect to a public DNS server (doesn't actually connect)
-            s.connect(('8.8.8.8', 80))
-            ip = s.getsockname()[0]
-            s.close()
-            
-            # Check if it's a private IP
-            if is_private_ip(ip):
-                return ip
-        except Exception:
-            s.close()
-    except Exception as e:
-        print(f"Error with socket method: {e}")
-    
-    # Method 2: Try ipconfig/ifconfig
-    try:
-        if platform.system() == 'Windows':
-            result = subprocess.run(['ipconfig'], capture_output=True, text=True, timeout=5)
-            if result.returncode == 0:
-                output = result.stdout
-                # Look for IPv4 addresses in the output
-                ip_pattern = r'IPv4 Address[.\s]*:\s*(\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})'
-                matches = re.findall(ip_pattern, output)
-                for ip in matches:
-                    if is_private_ip(ip) and ip != '127.0.0.1':
-                        return ip
-        else:
-            # Linux/Mac
-            result = subprocess.run(['ifconfig'], capture_output=True, text=True, timeout=5)
-            if result.returncode == 0:
-                output = result.stdout
-                # Look for inet addresses (IPv4)
-                ip_pattern = r'inet\s+(\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})'
-                matches = re.findall(ip_pattern, output)
-                for ip in matches:
-                    if is_private_ip(ip) and ip != '127.0.0.1':
-                        return ip
-    except Exception as e:
-        print(f"Error with ipconfig/ifconfig: {e}")
-    
-    # Method 3: Try hostname -I (Linux)
-    try:
-        if platform.system() != 'Windows':
-            result = subprocess.run(['hostname', '-I'], capture_output=True, text=True, timeout=2)
-            if result.returncode == 0:
-                ips = result.stdout.strip().split()
-                for ip in ips:
-                    if is_private_ip(ip) and ip != '127.0.0.1':
-                        return ip
-    except Exception:
-        pass
-    
-    # Fallback: return localhost
-    return '127.0.0.1'
+    """Get the LAN IP address of the local machine (cached)"""
+    return network_identity.current()['lan_ip']
 
-def is_private_ip(ip):
-    """Check if an IP address is in a private range"""
-    try:
-        parts = ip.split('.')
-        if len(parts) != 4:
-            return False
-        
-        first = int(parts[0])
-        second = int(parts[1])
-        
-        # 10.0.0.0/8
-        if first == 10:
-            return True
-        # 172.16.0.0/12
-        if first == 172 and 16 <= second <= 31:
-            return True
-        # 192.168.0.0/16
-        if first == 192 and second == 168:
-            return True
-        # 169.254.0.0/16 (link-local)
-        if first == 169 and second == 254:
-            return True
-        
-        return False
-    except Exception:
-        return False
+def init_worker():
+    """Start the network identity refresher and log writer (called by serve.py after fork)"""
+    request_log.pipeline.start()
+    network_identity.start()
+
+def shutdown_worker():
+    network_identity.stop()
+    request_log.pipeline.stop()
 
 @app.route('/api/server-info', methods=['GET'])
 def get_server_info():
     """Get local server information (device name and LAN IP)"""
     try:
-        device_name = get_device_name()
-        lan_ip = get_lan_ip_address()
+        identity = network_identity.current()
         
         return jsonify({
             'success': True,
-            'device_name': device_name,
-            'lan_ip': lan_ip,
-            'platform': platform.system(),
-            'platform_release': platform.release()
+            'device_name': identity['device_name'],
+            'lan_ip': identity['lan_ip'],
+            'addresses': identity['addresses'],
+            'age_seconds': identity['age_seconds'],
+            'platform': PLATFORM_SYSTEM,
+            'platform_release': PLATFORM_RELEASE
         })
     except Exception as e:
         return jsonify({
@@ -154,10 +64,11 @@ def get_server_info():
 def get_device_name_endpoint():
     """Get device name only"""
     try:
-        device_name = get_device_name()
+        identity = network_identity.current()
         return jsonify({
             'success': True,
-            'device_name': device_name
+            'device_name': identity['device_name'],
+            'age_seconds': identity['age_seconds']
         })
     except Exception as e:
         return jsonify({
@@ -169,10 +80,11 @@ def get_device_name_endpoint():
 def get_lan_ip_endpoint():
     """Get LAN IP address only"""
     try:
-        lan_ip = get_lan_ip_address()
+        identity = network_identity.current()
         return jsonify({
             'success': True,
-            'lan_ip': lan_ip
+            'lan_ip': identity['lan_ip'],
+            'age_seconds': identity['age_seconds']
         })
     except Exception as e:
         return jsonify({
@@ -183,6 +95,7 @@ def get_lan_ip_endpoint():
 @app.route('/', methods=['GET'])
 def root():
     """Root endpoint - provides API information"""
+    identity = network_identity.current()
     return jsonify({
         'service': 'local-server',
         'version': '1.0.0',
@@ -192,18 +105,22 @@ def root():
             '/api/lan-ip': 'Get LAN IP address only',
             '/health': 'Health check endpoint'
         },
-        'device_name': get_device_name(),
-        'lan_ip': get_lan_ip_address()
+        'device_name': identity['device_name'],
+        'lan_ip': identity['lan_ip'],
+        'age_seconds': identity['age_seconds']
     })
 
 @app.route('/health', methods=['GET'])
 def health():
     """Health check endpoint"""
+    identity = network_identity.current()
     return jsonify({
         'status': 'ok',
         'service': 'local-server',
-        'device_name': get_device_name(),
-        'lan_ip': get_lan_ip_address()
+        'device_name': identity['device_name'],
+        'lan_ip': identity['lan_ip'],
+        'age_seconds': identity['age_seconds'],
+        'network': network_identity.stats()
     })
 
 @app.errorhandler(404)
@@ -223,6 +140,7 @@ def not_found(error):
     }), 404
 
 if __name__ == '__main__':
+    # Development server only; production runs via `python serve.py local`
     port = int(os.environ.get('LOCAL_SERVER_PORT', 5001))
     host = os.environ.get('LOCAL_SERVER_HOST', '0.0.0.0')
     
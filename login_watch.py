@@ -0,0 +1,149 @@
+"""Shared watcher for RPOS_LOGIN approval status.
+
+Devices waiting on admin approval long-poll or stream their status. Instead
+of each waiting request querying Oracle, they all wait on one StatusWatcher:
+server.py publishes to it when it writes RPOS_LOGIN, and a single background
+poller re-reads the watched devices to catch changes made outside the API.
+"""
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def _flag(state):
+    return state[0] if state is not None else None
+
+
+class StatusWatcher:
+    """Per-device status cache that wakes waiters when a status changes.
+
+    `fetch(device_ids)` must return {device_id: state} for the given ids; a
+    device with no row maps to None (or is left out). A state's first item is
+    its APPROVAL_FLAG: only a change of flag (or the row appearing or going
+    away) bumps the device's version, which waiters compare against. Other
+    columns are kept current without waking anyone.
+    """
+
+    def __init__(self, fetch, interval=1.0):
+        self._fetch = fetch
+        self._interval = interval
+        self._cond = threading.Condition()
+        self._states = {}    # device_id -> (version, state), watched devices only
+        self._watchers = {}  # device_id -> number of waiting requests
+        self._listeners = {}  # device_id -> callbacks run on each change
+        self._thread = None
+        self._pid = None
+        self._stats = {'polls': 0, 'poll_errors': 0, 'changes': 0}
+
+    def subscribe(self, device_id):
+        with self._cond:
+            self._watchers[device_id] = self._watchers.get(device_id, 0) + 1
+        self._ensure_poller()
+
+    def unsubscribe(self, device_id):
+        with self._cond:
+            remaining = self._watchers.get(device_id, 0) - 1
+            if remaining > 0:
+                self._watchers[device_id] = remaining
+            else:
+                # Nobody keeps this entry fresh any more, so forget it
+                self._watchers.pop(device_id, None)
+                self._states.pop(device_id, None)
+
+    def add_listener(self, device_id, callback):
+        """Call `callback()` (from the publishing thread) whenever the device changes.
+
+        Lets event-loop code wait without holding a thread; the callback must
+        be cheap and must not block.
+        """
+        with self._cond:
+            self._listeners.setdefault(device_id, []).append(callback)
+
+    def remove_listener(self, device_id, callback):
+        with self._cond:
+            callbacks = self._listeners.get(device_id, [])
+            if callback in callbacks:
+                callbacks.remove(callback)
+            if not callbacks:
+                self._listeners.pop(device_id, None)
+
+    def current(self, device_id):
+        """(version, state) if the device is watched and known, else None"""
+        with self._cond:
+            return self._states.get(device_id)
+
+    def publish(self, device_id, state):
+        """Record the latest state of a watched device; returns its version"""
+        with self._cond:
+            if device_id not in self._watchers:
+                return None
+            entry = self._states.get(device_id)
+            if entry is not None and _flag(entry[1]) == _flag(state):
+                self._states[device_id] = (entry[0], state)
+                return entry[0]
+            version = entry[0] + 1 if entry is not None else 1
+            self._states[device_id] = (version, state)
+            if entry is not None:
+                self._stats['changes'] += 1
+            self._cond.notify_all()
+            for callback in self._listeners.get(device_id, ()):
+                callback()
+            return version
+
+    def wait_for_change(self, device_id, version, timeout):
+        """Block until the device's version differs from `version`.
+
+        Returns the new (version, state), or None if `timeout` elapses first.
+        """
+        def changed():
+            entry = self._states.get(device_id)
+            return entry is not None and entry[0] != version
+
+        with self._cond:
+            if not self._cond.wait_for(changed, timeout):
+                return None
+            return self._states[device_id]
+
+    def stats(self):
+        with self._cond:
+            stats = dict(self._stats)
+            stats['watched_devices'] = len(self._watchers)
+            stats['waiting_requests'] = sum(self._watchers.values())
+        stats['interval'] = self._interval
+        return stats
+
+    def _ensure_poller(self):
+        with self._cond:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(
+                target=self._run, name='rpos-login-poller', daemon=True
+            )
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self._interval)
+            with self._cond:
+                device_ids = list(self._watchers)
+                if not device_ids:
+                    # Exit while holding the lock so subscribe() restarts us
+                    self._thread = None
+                    return
+
+            try:
+                states = self._fetch(device_ids)
+            except Exception as error:
+                with self._cond:
+                    self._stats['poll_errors'] += 1
+                logger.error("Error polling RPOS login status: %s", error)
+                continue
+
+            with self._cond:
+                self._stats['polls'] += 1
+            for device_id in device_ids:
+                self.publish(device_id, states.get(device_id))
@@ -0,0 +1,230 @@
+"""Cached device name and LAN address for local-server.py.
+
+Reading the network identity used to fork `ifconfig`/`ipconfig`/`hostname`
+on every request. NetworkIdentity computes it once, keeps it in memory and
+refreshes it from a background thread using only socket calls and the
+kernel's own tables. On Linux the thread also listens on an rtnetlink socket
+so address changes (DHCP renewals, Wi-Fi switches) are picked up at once.
+"""
+import ipaddress
+import logging
+import os
+import select
+import socket
+import struct
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# rtnetlink multicast groups: link up/down and IPv4 address changes
+_RTMGRP_LINK = 0x1
+_RTMGRP_IPV4_IFADDR = 0x10
+_SIOCGIFADDR = 0x8915
+# Longest a netlink wait goes without checking for stop()
+_STOP_POLL_SECONDS = 0.5
+
+_PRIVATE_NETWORKS = tuple(
+    ipaddress.IPv4Network(network)
+    for network in ('10.0.0.0/8', '172.16.0.0/12', '192.168.0.0/16', '169.254.0.0/16')
+)
+
+# Interfaces that never carry the terminal's LAN address
+_VIRTUAL_PREFIXES = ('lo', 'docker', 'br-', 'veth', 'virbr', 'vmnet', 'tun', 'tap', 'wg', 'zt')
+
+
+def is_private_ip(ip):
+    """True for RFC 1918 and link-local (169.254/16) IPv4 addresses"""
+    try:
+        address = ipaddress.IPv4Address(ip)
+    except ValueError:
+        return False
+    return any(address in network for network in _PRIVATE_NETWORKS)
+
+
+def _routed_address():
+    """Source address the kernel would use to reach the internet (no packet is sent)"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        sock.connect(('8.8.8.8', 80))
+        return sock.getsockname()[0]
+    except OSError:
+        return None
+    finally:
+        sock.close()
+
+
+def _interface_addresses():
+    """[(interface, IPv4 address)] read from the kernel via ioctl (Linux only)"""
+    try:
+        import fcntl
+        interfaces = socket.if_nameindex()
+    except (ImportError, OSError, AttributeError):
+        return []
+
+    addresses = []
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        for _, name in interfaces:
+            request = struct.pack('256s', name.encode('utf-8')[:15])
+            try:
+                reply = fcntl.ioctl(sock.fileno(), _SIOCGIFADDR, request)
+            except OSError:
+                continue  # interface has no IPv4 address
+            addresses.append((name, socket.inet_ntoa(reply[20:24])))
+    finally:
+        sock.close()
+    return addresses
+
+
+def _resolver_addresses(hostname):
+    """IPv4 addresses bound to the host name (Windows/macOS fallback)"""
+    try:
+        infos = socket.getaddrinfo(hostname, None, socket.AF_INET, socket.SOCK_DGRAM)
+    except OSError:
+        return []
+    return [('', info[4][0]) for info in infos]
+
+
+def read_identity():
+    """Current (device_name, lan_ip, [(interface, address)]) without forking"""
+    try:
+        device_name = socket.gethostname() or 'Unknown-Device'
+    except OSError:
+        device_name = 'Unknown-Device'
+
+    addresses = _interface_addresses() or _resolver_addresses(device_name)
+    routed = _routed_address()
+    if routed and is_private_ip(routed):
+        return device_name, routed, addresses
+
+    physical = [ip for name, ip in addresses if not name.startswith(_VIRTUAL_PREFIXES)]
+    for ip in physical + [ip for _, ip in addresses]:
+        if is_private_ip(ip):
+            return device_name, ip, addresses
+    return device_name, '127.0.0.1', addresses
+
+
+class NetworkIdentity:
+    """Device name and LAN IP, refreshed in the background.
+
+    Readers never block on the network: `current()` returns the last value
+    read and how old it is. The refresher re-reads every `interval` seconds,
+    or immediately when rtnetlink reports an address or link change.
+    """
+
+    def __init__(self, interval=30.0, reader=read_identity):
+        self._interval = interval
+        self._reader = reader
+        self._lock = threading.Lock()
+        self._value = None  # (device_name, lan_ip, addresses, refreshed_at, changed_at)
+        self._stop = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._stats = {'refreshes': 0, 'changes': 0, 'errors': 0, 'netlink_events': 0}
+
+    def refresh(self):
+        """Re-read the identity now; keeps the previous value if reading fails"""
+        try:
+            device_name, lan_ip, addresses = self._reader()
+        except Exception as error:
+            with self._lock:
+                self._stats['errors'] += 1
+            logger.error("Error reading network identity: %s", error)
+            return
+
+        now = time.time()
+        with self._lock:
+            self._stats['refreshes'] += 1
+            previous = self._value
+            changed_at = now
+            if previous is not None and previous[:2] == (device_name, lan_ip):
+                changed_at = previous[4]
+            elif previous is not None:
+                self._stats['changes'] += 1
+            self._value = (device_name, lan_ip, addresses, now, changed_at)
+
+    def current(self):
+        """Cached identity plus its age; reads synchronously only the first time"""
+        self.start()
+        if self._value is None:
+            self.refresh()
+        with self._lock:
+            device_name, lan_ip, addresses, refreshed_at, changed_at = self._value
+        return {
+            'device_name': device_name,
+            'lan_ip': lan_ip,
+            'addresses': [{'interface': name, 'address': ip} for name, ip in addresses],
+            'age_seconds': round(time.time() - refreshed_at, 3),
+            'changed_at': changed_at,
+        }
+
+    def start(self):
+        """Start the refresher thread if it is not running in this process"""
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._stop.clear()
+            self._thread = threading.Thread(
+                target=self._run, name='network-identity', daemon=True
+            )
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats['interval'] = self._interval
+        stats['netlink'] = hasattr(socket, 'AF_NETLINK')
+        return stats
+
+    def _open_netlink(self):
+        if not hasattr(socket, 'AF_NETLINK'):
+            return None
+        try:
+            sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, socket.NETLINK_ROUTE)
+            sock.bind((0, _RTMGRP_LINK | _RTMGRP_IPV4_IFADDR))
+            sock.setblocking(False)
+            return sock
+        except OSError:
+            return None
+
+    def _wait(self, sock):
+        """Sleep until the next refresh is due or the kernel reports a change"""
+        if sock is None:
+            self._stop.wait(self._interval)
+            return
+        deadline = time.monotonic() + self._interval
+        while not self._stop.is_set():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            ready, _, _ = select.select([sock], [], [], min(remaining, _STOP_POLL_SECONDS))
+            if ready:
+                break
+        else:
+            return
+        try:
+            while sock.recv(65536):
+                pass
+        except (BlockingIOError, OSError):
+            pass
+        with self._lock:
+            self._stats['netlink_events'] += 1
+        # Let a burst of related events (link up, then address) settle
+        self._stop.wait(0.5)
+
+    def _run(self):
+        sock = self._open_netlink()
+        try:
+            while not self._stop.is_set():
+                self.refresh()
+                self._wait(sock)
+        finally:
+            if sock is not None:
+                sock.close()
@@ -0,0 +1,214 @@
+"""Non-blocking JSON-lines access and error logging for server.py and local-server.py.
+
+Request threads only put records on a bounded in-memory queue; a background
+listener formats them as one JSON object per line and writes them to stdout
+(or LOG_FILE). A slow console therefore never stalls a request, and when the
+writer cannot keep up records are dropped and counted rather than queued
+without limit.
+
+Access records carry the request id (taken from X-Request-ID or generated
+and echoed back), route, status, latency and, for server.py, time spent in
+Oracle. High-volume routes can be sampled; errors and slow requests are
+always written.
+"""
+from datetime import datetime, timezone
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+import time
+import uuid
+
+from flask import g, has_request_context, request
+
+LOG_FILE = os.environ.get('LOG_FILE')  # default: stdout
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+LOG_QUEUE_SIZE = int(os.environ.get('LOG_QUEUE_SIZE', 10000))
+ACCESS_LOG_ENABLED = os.environ.get('ACCESS_LOG', '1') == '1'
+# Requests at least this slow are logged even on sampled routes (ms)
+ACCESS_LOG_SLOW_MS = float(os.environ.get('ACCESS_LOG_SLOW_MS', 1000))
+
+access_logger = logging.getLogger('access')
+
+
+def parse_sample_rates(spec, defaults=None):
+    """Parse "/api/health=0.01,/api/rpos-login/status=0.1" into {route: rate}"""
+    rates = dict(defaults or {})
+    for part in filter(None, (item.strip() for item in (spec or '').split(','))):
+        route, _, rate = part.rpartition('=')
+        rates[route.strip()] = min(1.0, max(0.0, float(rate)))
+    return rates
+
+
+class JsonLinesFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+        }
+        request_id = getattr(record, 'request_id', None)
+        if request_id is not None:
+            entry['request_id'] = request_id
+        fields = getattr(record, 'fields', None)
+        if fields:
+            entry.update((name, value) for name, value in fields.items() if value is not None)
+        else:
+            entry['message'] = record.getMessage()
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """Enqueue without blocking; count records dropped while the queue is full"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Resolve only what depends on the request; formatting happens in the writer
+        record.msg = record.getMessage()
+        record.args = None
+        if getattr(record, 'request_id', None) is None and has_request_context():
+            record.request_id = g.get('request_id')
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class LogPipeline:
+    """Root-logger queue handler plus the background writer thread (one per process)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._handler = None
+        self._listener = None
+        self._pid = None
+
+    def start(self):
+        """Attach the queue handler and start the writer if not running in this process"""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            root = logging.getLogger()
+            if self._handler is not None:
+                # Inherited across fork: the old writer thread does not exist here
+                root.removeHandler(self._handler)
+
+            if LOG_FILE:
+                output = logging.FileHandler(LOG_FILE, encoding='utf-8')
+            else:
+                output = logging.StreamHandler(sys.stdout)
+            output.setFormatter(JsonLinesFormatter())
+
+            self._handler = _QueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+            self._listener = logging.handlers.QueueListener(self._handler.queue, output)
+            root.addHandler(self._handler)
+            root.setLevel(LOG_LEVEL)
+            self._listener.start()
+            self._pid = os.getpid()
+
+    def stop(self):
+        """Flush queued records and stop the writer"""
+        with self._lock:
+            if self._listener is not None and self._pid == os.getpid():
+                self._listener.stop()
+                logging.getLogger().removeHandler(self._handler)
+                self._pid = None
+
+    def stats(self):
+        handler = self._handler
+        return {
+            'queued': handler.queue.qsize() if handler else 0,
+            'dropped': handler.dropped if handler else 0,
+            'queue_size': LOG_QUEUE_SIZE,
+        }
+
+
+pipeline = LogPipeline()
+
+
+def assign_request_id():
+    """Use the caller's X-Request-ID or generate one; stored on `g.request_id`"""
+    request_id = request.headers.get('X-Request-ID', '').strip()[:64] or uuid.uuid4().hex[:16]
+    g.request_id = request_id
+    return request_id
+
+
+class AccessLog:
+    """Writes one access record per request, sampling routes listed in `sample_rates`"""
+
+    def __init__(self, service, sample_rates=None):
+        self.service = service
+        self.sample_rates = sample_rates or {}
+        self.sampled_out = 0
+        self._lock = threading.Lock()
+
+    def record(self, request_id, method, route, path, status, latency, **fields):
+        if not ACCESS_LOG_ENABLED:
+            return
+        latency_ms = latency * 1000
+        rate = self.sample_rates.get(route, 1.0)
+        if (rate < 1.0 and status < 400 and latency_ms < ACCESS_LOG_SLOW_MS
+                and random.random() >= rate):
+            with self._lock:
+                self.sampled_out += 1
+            return
+
+        entry = {
+            'service': self.service,
+            'event': 'request',
+            'method': method,
+            'route': route,
+            'path': path,
+            'status': status,
+            'latency_ms': round(latency_ms, 3),
+        }
+        if rate < 1.0:
+            entry['sample_rate'] = rate
+        entry.update((name, value) for name, value in fields.items() if value is not None)
+        access_logger.info('request', extra={'fields': entry, 'request_id': request_id})
+
+    def stats(self):
+        stats = pipeline.stats()
+        stats['sampled_out'] = self.sampled_out
+        return stats
+
+
+def install(app, access_log):
+    """Request id, timing and access logging hooks for a simple Flask app"""
+    pipeline.start()
+
+    @app.before_request
+    def _begin_request_log():
+        pipeline.start()
+        g.request_log_started = time.perf_counter()
+        assign_request_id()
+
+    @app.after_request
+    def _finish_request_log(response):
+        started = g.get('request_log_started')
+        if started is None:
+            return response
+        response.headers['X-Request-ID'] = g.request_id
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        access_log.record(
+            g.request_id, request.method, route, request.path, response.status_code,
+            time.perf_counter() - started,
+            bytes=response.calculate_content_length(),
+            remote=request.remote_addr,
+            query=request.query_string.decode('utf-8', 'replace') or None,
+        )
+        return response
@@ -0,0 +1,205 @@
+"""Production launcher for the Flask apps.
+
+    python serve.py server   # Oracle-backed API (server.py), default port 5010
+    python serve.py local    # device info service (local-server.py), port 5001
+
+On Linux/macOS the app runs under gunicorn with pre-forked workers, each
+initialising its own Oracle session pool after fork, and drains in-flight
+requests on SIGTERM. Windows has no fork, so there it runs under waitress
+with a thread pool. `--async` serves through the asyncio gateway
+(gateway.py) under uvicorn instead, so idle and long-polling connections do
+not each hold a thread. `--dev` keeps the Werkzeug development server for
+local debugging only.
+"""
+import argparse
+import importlib.util
+import os
+import platform
+import sys
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+APPS = {
+    'server': {
+        'path': os.path.join(BASE_DIR, 'server.py'),
+        'module': 'server',
+        'port': 5010,
+    },
+    'local': {
+        'path': os.path.join(BASE_DIR, 'local-server.py'),
+        'module': 'local_server',
+        'port': int(os.environ.get('LOCAL_SERVER_PORT', 5001)),
+    },
+}
+
+
+def load_app_module(name):
+    """Import server.py / local-server.py by path (the latter is not a valid module name)"""
+    target = APPS[name]
+    if target['module'] in sys.modules:
+        return sys.modules[target['module']]
+
+    spec = importlib.util.spec_from_file_location(target['module'], target['path'])
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[target['module']] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def _hook(module, name):
+    hook = getattr(module, name, None)
+    return hook if callable(hook) else None
+
+
+def _asgi_app(module):
+    from gateway import create_gateway
+    return create_gateway(module)
+
+
+def run_gunicorn(module, options):
+    from gunicorn.app.base import BaseApplication
+
+    init_worker = _hook(module, 'init_worker')
+    shutdown_worker = _hook(module, 'shutdown_worker')
+
+    def post_fork(server, worker):
+        if init_worker:
+            init_worker()
+
+    def worker_exit(server, worker):
+        # Runs after the worker has stopped accepting and drained its requests
+        if shutdown_worker:
+            shutdown_worker()
+
+    config = {
+        'bind': [options.bind],
+        'workers': options.workers,
+        'threads': options.threads,
+        # gthread keeps idle keep-alive and long-poll connections off the workers
+        'worker_class': (
+            'uvicorn.workers.UvicornWorker' if options.use_async
+            else 'gthread' if options.threads > 1 else 'sync'
+        ),
+        'keepalive': options.keepalive,
+        'timeout': options.timeout,
+        'graceful_timeout': options.graceful_timeout,
+        'backlog': options.backlog,
+        'max_requests': options.max_requests,
+        'max_requests_jitter': options.max_requests // 10,
+        # Share imported code between workers; DB pools are created after fork
+        'preload_app': True,
+        'accesslog': '-' if options.access_log else None,
+        'post_fork': post_fork,
+        'worker_exit': worker_exit,
+    }
+
+    class FlaskApplication(BaseApplication):
+        def load_config(self):
+            for key, value in config.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            return _asgi_app(module) if options.use_async else module.app
+
+    FlaskApplication().run()
+
+
+def run_uvicorn(module, options):
+    import uvicorn
+
+    host, _, port = options.bind.rpartition(':')
+    if _hook(module, 'init_worker'):
+        module.init_worker()
+    try:
+        uvicorn.run(
+            _asgi_app(module),
+            host=host or '0.0.0.0',
+            port=int(port),
+            backlog=options.backlog,
+            timeout_keep_alive=options.keepalive,
+            timeout_graceful_shutdown=options.graceful_timeout,
+            limit_concurrency=options.connection_limit,
+        )
+    finally:
+        if _hook(module, 'shutdown_worker'):
+            module.shutdown_worker()
+
+
+def run_waitress(module, options):
+    from waitress import serve
+
+    host, _, port = options.bind.rpartition(':')
+    if _hook(module, 'init_worker'):
+        module.init_worker()
+    try:
+        serve(
+            module.app,
+            host=host or '0.0.0.0',
+            port=int(port),
+            threads=max(options.threads, options.workers * options.threads),
+            backlog=options.backlog,
+            channel_timeout=options.timeout,
+            connection_limit=options.connection_limit,
+        )
+    finally:
+        if _hook(module, 'shutdown_worker'):
+            module.shutdown_worker()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Run a POS API app under a production WSGI server')
+    parser.add_argument('app', choices=sorted(APPS), help='which app to serve')
+    parser.add_argument('--bind', help='host:port to listen on (default 0.0.0.0:<app port>)')
+    parser.add_argument('--workers', type=int,
+                        default=int(os.environ.get('SERVE_WORKERS', min(4, os.cpu_count() or 1))),
+                        help='worker processes (each has its own DB pool)')
+    parser.add_argument('--threads', type=int, default=int(os.environ.get('SERVE_THREADS', 8)),
+                        help='threads per worker')
+    parser.add_argument('--keepalive', type=int, default=int(os.environ.get('SERVE_KEEPALIVE', 5)),
+                        help='seconds to hold idle keep-alive connections')
+    parser.add_argument('--timeout', type=int, default=int(os.environ.get('SERVE_TIMEOUT', 120)),
+                        help='seconds before a silent worker is restarted')
+    parser.add_argument('--graceful-timeout', type=int,
+                        default=int(os.environ.get('SERVE_GRACEFUL_TIMEOUT', 30)),
+                        help='seconds to drain in-flight requests after SIGTERM')
+    parser.add_argument('--backlog', type=int, default=int(os.environ.get('SERVE_BACKLOG', 2048)))
+    parser.add_argument('--max-requests', type=int, default=int(os.environ.get('SERVE_MAX_REQUESTS', 0)),
+                        help='recycle a worker after this many requests (0 = never)')
+    parser.add_argument('--connection-limit', type=int,
+                        default=int(os.environ.get('SERVE_CONNECTION_LIMIT', 1000)),
+                        help='waitress/uvicorn only: maximum open connections')
+    parser.add_argument('--async', dest='use_async', action='store_true',
+                        help='serve through the asyncio gateway (gateway.py) under uvicorn')
+    parser.add_argument('--access-log', action='store_true', help='write gunicorn access log to stdout')
+    parser.add_argument('--dev', action='store_true', help='use the Werkzeug development server')
+    options = parser.parse_args(argv)
+
+    if not options.bind:
+        options.bind = f"0.0.0.0:{APPS[options.app]['port']}"
+    return options
+
+
+def main(argv=None):
+    options = parse_args(argv)
+    module = load_app_module(options.app)
+    host, _, port = options.bind.rpartition(':')
+
+    if options.dev:
+        module.app.run(host=host, port=int(port), debug=True)
+        return
+
+    windows = platform.system() == 'Windows'
+    if options.use_async:
+        runner, name = (run_uvicorn, 'uvicorn') if windows else (run_gunicorn, 'gunicorn+uvicorn')
+    else:
+        runner, name = (run_waitress, 'waitress') if windows else (run_gunicorn, 'gunicorn')
+
+    print("=" * 60)
+    print(f"Serving {options.app} on {options.bind} with {name}: "
+          f"{options.workers} worker(s) x {options.threads} thread(s)")
+    print("=" * 60)
+    runner(module, options)
+
+
+if __name__ == '__main__':
+    main()
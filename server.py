@@ -1,24 +1,154 @@
-from datetime import date, datetime
+import base64
+from datetime import date, datetime, timedelta
 import decimal
+import hashlib
+import json
+import logging
 import os
+import struct
+import tempfile
+import threading
+import time
+import zlib
 
 import cx_Oracle
-from flask import Flask, jsonify, request
+from flask import Flask, Response, g, has_request_context, jsonify, make_response, request
 from flask_cors import CORS
+from werkzeug.exceptions import RequestedRangeNotSatisfiable
+from werkzeug.wsgi import wrap_file
+
+from admission import DBGate, RateLimiter, Rejected, parse_rates, route_class
+from catalog import FACETS, CatalogStore
+from catalog_file import CatalogFileStore
+from db_routing import PRIMARY, ReadRouter, parse_dsns, parse_staleness
+from login_watch import StatusWatcher
+from metrics import BYTE_BUCKETS, ROW_BUCKETS, Registry
+import request_log
+from singleflight import SingleFlight
+from statements import Statement, StatementRegistry
+from ttl_cache import TTLCache
+
+try:
+    import orjson
+except ImportError:  # optional: faster encoding of large catalog responses
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # optional: gzip is always available
+    brotli = None
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for Flutter app
 
+logger = logging.getLogger('server')
+# Access log sampling per route, e.g. ACCESS_LOG_SAMPLE="/api/rpos-login/status=0.05"
+access_log = request_log.AccessLog('server', request_log.parse_sample_rates(
+    os.environ.get('ACCESS_LOG_SAMPLE'),
+    {'/api/rpos-login/status': 0.1, '/api/health': 0.1, '/metrics': 0.1},
+))
+request_log.pipeline.start()
+
 # Database configuration
 DB_CONFIG = {
     'user': 'rfim',
     'password': 'rfim',
-    'dsn': '192.168.1.225:1521/rgc'
+    'dsn': os.environ.get('DB_DSN', '192.168.1.225:1521/rgc')
 }
 
+# Session pool configuration (overridable via environment)
+POOL_CONFIG = {
+    'min': int(os.environ.get('DB_POOL_MIN', 2)),
+    'max': int(os.environ.get('DB_POOL_MAX', 20)),
+    'increment': int(os.environ.get('DB_POOL_INCREMENT', 2)),
+    # How long a request may wait for a free session before failing (ms)
+    'wait_timeout_ms': int(os.environ.get('DB_POOL_WAIT_TIMEOUT_MS', 5000)),
+    # Idle sessions above `min` are closed after this many seconds
+    'idle_timeout': int(os.environ.get('DB_POOL_IDLE_TIMEOUT', 300)),
+    # Sessions idle longer than this are pinged before being handed out (s)
+    'ping_interval': int(os.environ.get('DB_POOL_PING_INTERVAL', 60)),
+    # Round-trip timeout applied to every call on a borrowed session (ms)
+    'call_timeout_ms': int(os.environ.get('DB_CALL_TIMEOUT_MS', 30000)),
+    # Per-session parsed statement cache; size it above the number of
+    # itemmaster statements in use (`statements` in /api/db/pool)
+    'stmtcachesize': int(os.environ.get('DB_STMT_CACHE_SIZE', 100)),
+}
+
+# Read-only standbys (see db_routing.py), e.g.
+# DB_READ_DSNS="standby1=10.0.0.5:1521/rgc@3,standby2=10.0.0.6:1521/rgc@1";
+# each gets its own pool sized like POOL_CONFIG
+DB_READ_DSNS = parse_dsns(os.environ.get('DB_READ_DSNS'))
+# Workloads a standby may serve and the replication lag each tolerates in
+# seconds (empty: any, including unknown); unlisted workloads -- 'write' and
+# RPOS_LOGIN 'status' -- always use the primary
+DB_READ_STALENESS = parse_staleness(os.environ.get('DB_READ_STALENESS'), {
+    'catalog': 300.0,
+    'stock': 15.0,
+    'lookup': 300.0,
+})
+DB_HEALTH_INTERVAL = float(os.environ.get('DB_HEALTH_INTERVAL', 5))
+DB_HEALTH_FAILURES = int(os.environ.get('DB_HEALTH_FAILURES', 2))
+DB_HEALTH_TIMEOUT_MS = int(os.environ.get('DB_HEALTH_TIMEOUT_MS', 2000))
+# Replicas whose average probe round trip exceeds this are skipped (0 disables)
+DB_HEALTH_MAX_LATENCY_MS = float(os.environ.get('DB_HEALTH_MAX_LATENCY_MS', 0))
+# Returns a standby's lag as seconds or an interval; the default needs
+# Active Data Guard and SELECT on v$dataguard_stats
+DB_REPLICA_LAG_SQL = os.environ.get(
+    'DB_REPLICA_LAG_SQL',
+    "SELECT TO_DSINTERVAL(value) FROM v$dataguard_stats WHERE name = 'apply lag'",
+)
+
+# Admission control (see admission.py): token buckets per client and route
+# class, e.g. ADMISSION_RATES="catalog=10:40,status=2:10" (tokens/s:burst),
+# and a cap on sessions doing work at once; both answer 429 + Retry-After
+ADMISSION_ENABLED = os.environ.get('ADMISSION_CONTROL', '1') == '1'
+ADMISSION_RATES = parse_rates(os.environ.get('ADMISSION_RATES'), {
+    'catalog': (10.0, 40),
+    'status': (2.0, 10),
+    'login': (1.0, 5),
+    'default': (10.0, 40),
+})
+# Terminals that send no device id are bucketed by address; several of them
+# may share one address behind NAT, so that bucket gets this many times the rates
+ADMISSION_ADDRESS_FACTOR = float(os.environ.get('ADMISSION_ADDRESS_FACTOR', 20))
+ADMISSION_MAX_CLIENTS = int(os.environ.get('ADMISSION_MAX_CLIENTS', 10000))
+ADMISSION_EXEMPT_PATHS = {'/', '/api/health', '/metrics'}
+DB_CONCURRENCY_MAX = int(os.environ.get('DB_CONCURRENCY_MAX', POOL_CONFIG['max']))
+# How long a request may wait for a DB slot before it is turned away (ms)
+DB_ADMISSION_WAIT_MS = int(os.environ.get('DB_ADMISSION_WAIT_MS', 250))
+DB_BUSY_RETRY_AFTER = int(os.environ.get('DB_BUSY_RETRY_AFTER', 1))
+
+rate_limiter = RateLimiter(ADMISSION_RATES, ADMISSION_MAX_CLIENTS)
+db_gate = DBGate(DB_CONCURRENCY_MAX, DB_BUSY_RETRY_AFTER)
+
 RPOS_LOGIN_TABLE = 'RPOS_LOGIN'
 
-ITEMMASTER_ALLOWED_COLUMNS = {
+# Long-poll / SSE approval status: cap on `wait`, shared poll interval,
+# SSE heartbeat and maximum stream lifetime (seconds)
+STATUS_WAIT_MAX = float(os.environ.get('STATUS_WAIT_MAX', 60))
+STATUS_POLL_INTERVAL = float(os.environ.get('STATUS_POLL_INTERVAL', 1.0))
+STATUS_SSE_HEARTBEAT = float(os.environ.get('STATUS_SSE_HEARTBEAT', 15))
+STATUS_SSE_MAX_SECONDS = float(os.environ.get('STATUS_SSE_MAX_SECONDS', 600))
+
+# Lookup caches for APPLICATIONUSER / LOCATIONMASTER (seconds; 0 disables)
+USER_CACHE_TTL = int(os.environ.get('USER_CACHE_TTL', 300))
+LOCATION_CACHE_TTL = int(os.environ.get('LOCATION_CACHE_TTL', 900))
+LOOKUP_NEGATIVE_TTL = int(os.environ.get('LOOKUP_NEGATIVE_TTL', 30))
+LOOKUP_CACHE_SIZE = int(os.environ.get('LOOKUP_CACHE_SIZE', 5000))
+LOOKUP_CACHE_WARMUP = os.environ.get('LOOKUP_CACHE_WARMUP', '0') == '1'
+
+user_cache = TTLCache(LOOKUP_CACHE_SIZE, USER_CACHE_TTL, LOOKUP_NEGATIVE_TTL)
+location_cache = TTLCache(LOOKUP_CACHE_SIZE, LOCATION_CACHE_TTL, LOOKUP_NEGATIVE_TTL)
+
+# Identical concurrent DB-backed GETs share one execution and response body;
+# a follower waiting longer than SINGLE_FLIGHT_WAIT_SECONDS runs its own query
+SINGLE_FLIGHT_ENABLED = os.environ.get('SINGLE_FLIGHT', '1') == '1'
+SINGLE_FLIGHT_WAIT_SECONDS = float(os.environ.get('SINGLE_FLIGHT_WAIT_SECONDS', 30))
+inflight_queries = SingleFlight(SINGLE_FLIGHT_WAIT_SECONDS)
+
+# Selectable ITEMMASTERDETAILS columns, in the canonical order used for SQL
+# text and responses so equivalent `fields` requests share one statement
+ITEMMASTER_COLUMNS = (
     'ITEMCODE',
     'ITEMNAME',
     'ITEMNAMEARA',
@@ -60,12 +190,61 @@ ITEMMASTER_ALLOWED_COLUMNS = {
     'ITEMFLAG',
     'QUANTITYLIMIT',
     'THIRDPRICE',
-    'BRANCHPRICE',
     'AVERAGECOST',
     'LANDINGCOST',
-    'WHOLESALEPRICE',
     'ORIGIN',
-}
+)
+ITEMMASTER_ALLOWED_COLUMNS = frozenset(ITEMMASTER_COLUMNS)
+_ITEMMASTER_COLUMN_ORDER = {column: pos for pos, column in enumerate(ITEMMASTER_COLUMNS)}
+
+# Volatile columns kept in the catalog stock overlay (CATALOG_OVERLAY_COLUMNS)
+CATALOG_OVERLAY_COLUMNS = tuple(sorted(
+    {
+        column.strip().upper()
+        for column in os.environ.get(
+            'CATALOG_OVERLAY_COLUMNS',
+            'RETAILPRICE,WHOLESALEPRICE,BRANCHPRICE,COSTPRICE,ONLINEPRICE,THIRDPRICE,'
+            'CURRENTSTOCK,BRANCHSTOCK,STORE1,STORE2,STORE3,STORE4,STORE5,STORE6',
+        ).split(',')
+    } & (ITEMMASTER_ALLOWED_COLUMNS - {'ITEMCODE', 'BARCODE'}),
+    key=_ITEMMASTER_COLUMN_ORDER.__getitem__,
+))
+
+# Opt-in in-memory catalog snapshot (see catalog.py). Stock and price
+# columns are re-read every CATALOG_OVERLAY_SECONDS by a narrow query and
+# merged into responses (0 disables), so the full view can be reloaded rarely
+CATALOG_SNAPSHOT_ENABLED = os.environ.get('CATALOG_SNAPSHOT', '0') == '1'
+CATALOG_OVERLAY_SECONDS = float(os.environ.get('CATALOG_OVERLAY_SECONDS', 15))
+CATALOG_REFRESH_SECONDS = int(os.environ.get(
+    'CATALOG_REFRESH_SECONDS', 1800 if CATALOG_OVERLAY_SECONDS > 0 else 300
+))
+# Number of past catalog versions a terminal can sync deltas from; with the
+# overlay on, every stock/price change is a version (the current snapshot's
+# own version, e.g. the catalog file's, always stays available)
+CATALOG_HISTORY_SIZE = int(os.environ.get(
+    'CATALOG_HISTORY_SIZE', 240 if CATALOG_OVERLAY_SECONDS > 0 else 48
+))
+# Binary catalog file for provisioning (see catalog_file.py), written per
+# snapshot version; workers sharing the directory reuse each other's files
+CATALOG_FILE_ENABLED = os.environ.get('CATALOG_FILE', '1') == '1'
+CATALOG_FILE_DIR = os.environ.get(
+    'CATALOG_FILE_DIR', os.path.join(tempfile.gettempdir(), 'pos-catalog')
+)
+
+# Batch lookup limits: keys per request and bind variables per IN list
+LOOKUP_MAX_KEYS = int(os.environ.get('LOOKUP_MAX_KEYS', 1000))
+LOOKUP_CHUNK_SIZE = 200
+
+# Response compression: bodies smaller than this are sent as-is
+COMPRESS_MIN_BYTES = int(os.environ.get('COMPRESS_MIN_BYTES', 1024))
+COMPRESS_LEVEL = int(os.environ.get('COMPRESS_LEVEL', 5))
+COMPRESSIBLE_MIMETYPES = {'application/json', 'application/x-ndjson', 'text/plain', 'text/html'}
+
+# Rows per round trip when streaming the full catalog export
+EXPORT_ARRAYSIZE = int(os.environ.get('EXPORT_ARRAYSIZE', 2000))
+
+# Distinct itemmaster SQL texts remembered by the statement registry
+STATEMENT_REGISTRY_SIZE = int(os.environ.get('STATEMENT_REGISTRY_SIZE', 256))
 
 ITEMMASTER_DEFAULT_COLUMNS = [
     'ITEMCODE',
@@ -86,19 +265,378 @@ ITEMMASTER_DEFAULT_COLUMNS = [
 ]
 
 
-def get_db_connection():
-    """Create and return Oracle database connection"""
+_db_pools = {}  # backend name -> SessionPool
+_db_pool_lock = threading.Lock()
+
+_pool_stats_lock = threading.Lock()
+_pool_stats = {
+    'acquired': 0,
+    'released': 0,
+    'dropped': 0,
+    'acquire_errors': 0,
+    'wait_ms_total': 0.0,
+    'wait_ms_max': 0.0,
+}
+
+# Per-route latency broken down by where the time went (see `/metrics`);
+# 'coalesce' is time spent waiting on another request's identical query
+REQUEST_PHASES = ('acquire', 'execute', 'fetch', 'serialise', 'coalesce')
+
+metrics_registry = Registry()
+requests_total = metrics_registry.counter(
+    'pos_http_requests_total', 'HTTP requests by route, method and status',
+    ('route', 'method', 'status'),
+)
+request_duration = metrics_registry.histogram(
+    'pos_http_request_duration_seconds', 'Time from request start to the last body byte',
+    ('route',),
+)
+request_phase_duration = metrics_registry.histogram(
+    'pos_http_request_phase_seconds',
+    'Per-request time spent acquiring a session, executing, fetching and serialising',
+    ('route', 'phase'),
+)
+db_routed_sessions = metrics_registry.counter(
+    'pos_db_routed_sessions_total', 'Sessions borrowed by backend and workload',
+    ('backend', 'workload'),
+)
+coalesced_requests = metrics_registry.counter(
+    'pos_singleflight_requests_total',
+    'DB-backed requests by single-flight role: leader ran the query, follower reused it',
+    ('route', 'role'),
+)
+admission_rejections = metrics_registry.counter(
+    'pos_admission_rejected_total', 'Requests answered 429 by admission control',
+    ('route_class', 'reason'),
+)
+request_rows = metrics_registry.histogram(
+    'pos_http_request_db_rows', 'Rows fetched from Oracle per request', ('route',), ROW_BUCKETS,
+)
+response_bytes = metrics_registry.histogram(
+    'pos_http_response_bytes', 'Response body size as sent (after compression)',
+    ('route',), BYTE_BUCKETS,
+)
+
+
+def _request_phases():
+    """Phase accumulator for the current request, or None outside a request"""
+    if not has_request_context():
+        return None
+    phases = g.get('phases')
+    if phases is None:
+        phases = g.phases = {}
+    return phases
+
+
+def _add_phase(phases, phase, seconds):
+    if phases is not None:
+        phases[phase] = phases.get(phase, 0.0) + seconds
+
+
+def _coalesced(key, query):
+    """Run `query()` once for concurrent identical requests and share its response.
+
+    `key` names the canonical query (route plus normalised parameters). The
+    leader's response is serialised once; every caller gets a copy of its
+    body and status, and followers are charged their wait as 'coalesce'.
+    """
+    if not SINGLE_FLIGHT_ENABLED:
+        return query()
+
+    def run():
+        response = make_response(query())
+        return response.get_data(), response.status_code, response.content_type
+
+    started = time.perf_counter()
+    (body, status, content_type), shared = inflight_queries.do(key, run)
+    route = request.url_rule.rule
+    if shared:
+        _add_phase(_request_phases(), 'coalesce', time.perf_counter() - started)
+    coalesced_requests.inc((route, 'follower' if shared else 'leader'))
+    return Response(body, status=status, content_type=content_type)
+
+
+class _TimedCursor(cx_Oracle.Cursor):
+    """Cursor that charges execute/fetch time and row counts to its request"""
+
+    def execute(self, statement, parameters=None, **kwargs):
+        started = time.perf_counter()
+        try:
+            if parameters is None:
+                return super().execute(statement, **kwargs)
+            return super().execute(statement, parameters, **kwargs)
+        finally:
+            _add_phase(self.connection.phases, 'execute', time.perf_counter() - started)
+
+    def executemany(self, statement, parameters, **kwargs):
+        started = time.perf_counter()
+        try:
+            return super().executemany(statement, parameters, **kwargs)
+        finally:
+            _add_phase(self.connection.phases, 'execute', time.perf_counter() - started)
+
+    def _timed_fetch(self, fetch, *args, **kwargs):
+        started = time.perf_counter()
+        result = fetch(*args, **kwargs)
+        phases = self.connection.phases
+        if phases is not None:
+            _add_phase(phases, 'fetch', time.perf_counter() - started)
+            if result is not None:
+                phases['rows'] = phases.get('rows', 0) + (
+                    len(result) if isinstance(result, list) else 1
+                )
+        return result
+
+    def fetchone(self):
+        return self._timed_fetch(super().fetchone)
+
+    def fetchmany(self, *args, **kwargs):
+        return self._timed_fetch(super().fetchmany, *args, **kwargs)
+
+    def fetchall(self):
+        return self._timed_fetch(super().fetchall)
+
+
+class _TimedConnection(cx_Oracle.Connection):
+    """Pooled session whose cursors report into `phases`.
+
+    `phases` is bound to the borrowing request in get_db_connection() and
+    travels with the session, so rows fetched by a streaming generator after
+    the view has returned are still charged to that request. `admitted` is
+    True while the session holds a DB admission slot; `backend` names the
+    pool it came from.
+    """
+    phases = None
+    admitted = False
+    backend = PRIMARY
+
+    def cursor(self, *args, **kwargs):
+        return _TimedCursor(self, *args, **kwargs)
+
+
+def get_db_pool(backend=PRIMARY):
+    """Return the session pool for `backend`, creating it on first use"""
+    pool = _db_pools.get(backend)
+    if pool is not None:
+        return pool
+
+    with _db_pool_lock:
+        pool = _db_pools.get(backend)
+        if pool is None:
+            try:
+                pool = _db_pools[backend] = cx_Oracle.SessionPool(
+                    user=DB_CONFIG['user'],
+                    password=DB_CONFIG['password'],
+                    dsn=db_router.backends[backend].dsn,
+                    min=POOL_CONFIG['min'],
+                    max=POOL_CONFIG['max'],
+                    increment=POOL_CONFIG['increment'],
+                    threaded=True,
+                    getmode=cx_Oracle.SPOOL_ATTRVAL_TIMEDWAIT,
+                    wait_timeout=POOL_CONFIG['wait_timeout_ms'],
+                    timeout=POOL_CONFIG['idle_timeout'],
+                    ping_interval=POOL_CONFIG['ping_interval'],
+                    stmtcachesize=POOL_CONFIG['stmtcachesize'],
+                    connectiontype=_TimedConnection,
+                )
+            except cx_Oracle.Error as error:
+                logger.error("Error creating Oracle session pool for %s: %s", backend, error)
+                raise
+    return pool
+
+
+def reset_db_pool_after_fork():
+    """Forget pools inherited from a parent process without closing them.
+
+    The parent's sessions share sockets with the child, so the child must
+    never use or close them; it creates its own pools on first use, and its
+    replicas wait for the child's own health check.
+    """
+    global _db_pools, _db_pool_lock
+    _db_pool_lock = threading.Lock()
+    _db_pools = {}
+    db_router.reset()
+
+
+def close_db_pool():
+    """Close every session pool (used on shutdown and after fork)"""
+    global _db_pools
+    with _db_pool_lock:
+        pools, _db_pools = _db_pools, {}
+    for backend, pool in pools.items():
+        try:
+            pool.close(force=True)
+        except cx_Oracle.Error as error:
+            logger.error("Error closing Oracle session pool for %s: %s", backend, error)
+
+
+def _probe_backend(backend):
+    """Health query for the read router; returns a standby's lag in seconds or None"""
+    pool = get_db_pool(backend.name)
+    connection = pool.acquire()
+    cursor = None
+    db_error = None
     try:
-        connection = cx_Oracle.connect(
-            user=DB_CONFIG['user'],
-            password=DB_CONFIG['password'],
-            dsn=DB_CONFIG['dsn']
-        )
-        return connection
+        connection.call_timeout = DB_HEALTH_TIMEOUT_MS
+        cursor = connection.cursor()
+        cursor.execute("SELECT 1 FROM dual")
+        cursor.fetchone()
+        if backend.is_primary or not DB_REPLICA_LAG_SQL:
+            return None
+        try:
+            cursor.execute(DB_REPLICA_LAG_SQL)
+            result = cursor.fetchone()
+        except cx_Oracle.Error as error:
+            if _is_connection_lost(error):
+                raise
+            # Reachable but lag unknown: the replica only serves unbounded workloads
+            backend.lag_error = str(error)
+            return None
+        backend.lag_error = None
+        lag = result[0] if result else None
+        if isinstance(lag, timedelta):
+            return lag.total_seconds()
+        return float(lag) if lag is not None else None
+    except cx_Oracle.Error as error:
+        db_error = error
+        raise
+    finally:
+        if cursor:
+            cursor.close()
+        try:
+            if _is_connection_lost(db_error):
+                pool.drop(connection)
+            else:
+                pool.release(connection)
+        except cx_Oracle.Error as error:
+            logger.error("Error releasing Oracle session: %s", error)
+
+
+db_router = ReadRouter(
+    DB_CONFIG['dsn'], DB_READ_DSNS, _probe_backend, DB_READ_STALENESS,
+    interval=DB_HEALTH_INTERVAL, failure_threshold=DB_HEALTH_FAILURES,
+    max_latency_ms=DB_HEALTH_MAX_LATENCY_MS or None,
+)
+
+
+def get_db_connection(workload='write'):
+    """Borrow a session for `workload` from the pool db_router picks.
+
+    Read workloads listed in DB_READ_STALENESS may get a standby session; a
+    standby that fails to hand one out counts against its health and the
+    request falls back to the primary. Request threads first take a DB
+    admission slot, raising Rejected when none frees up within
+    DB_ADMISSION_WAIT_MS; background work is not gated.
+    """
+    backend = db_router.route(workload)
+    started = time.perf_counter()
+    admitted = ADMISSION_ENABLED and has_request_context()
+    if admitted:
+        db_gate.acquire(DB_ADMISSION_WAIT_MS / 1000, route_class(request.path))
+    try:
+        try:
+            connection = get_db_pool(backend.name).acquire()
+        except cx_Oracle.Error as error:
+            if backend.is_primary:
+                raise
+            db_router.record_failure(backend, error)
+            logger.warning("Read backend %s unavailable, using the primary: %s",
+                           backend.name, error)
+            backend = db_router.primary
+            connection = get_db_pool(PRIMARY).acquire()
     except cx_Oracle.Error as error:
-        print(f"Error connecting to Oracle database: {error}")
+        if admitted:
+            db_gate.release()
+        with _pool_stats_lock:
+            _pool_stats['acquire_errors'] += 1
+        logger.error("Error acquiring Oracle session: %s", error)
         raise
 
+    waited = time.perf_counter() - started
+    waited_ms = waited * 1000
+    with _pool_stats_lock:
+        _pool_stats['acquired'] += 1
+        _pool_stats['wait_ms_total'] += waited_ms
+        if waited_ms > _pool_stats['wait_ms_max']:
+            _pool_stats['wait_ms_max'] = waited_ms
+
+    connection.call_timeout = POOL_CONFIG['call_timeout_ms']
+    connection.outputtypehandler = _output_type_handler
+    connection.phases = _request_phases()
+    connection.admitted = admitted
+    connection.backend = backend.name
+    db_routed_sessions.inc((backend.name, workload))
+    if connection.phases is not None:
+        connection.phases['backend'] = backend.name
+    _add_phase(connection.phases, 'acquire', waited)
+    return connection
+
+
+def release_db_connection(connection, discard=False):
+    """Return a borrowed session to the pool, dropping it if it is unusable"""
+    if connection is None:
+        return
+    connection.phases = None
+    if connection.admitted:
+        connection.admitted = False
+        db_gate.release()
+    backend = db_router.backends[connection.backend]
+    if discard and not backend.is_primary:
+        db_router.record_failure(backend, 'session lost')
+    pool = get_db_pool(backend.name)
+    try:
+        if discard:
+            pool.drop(connection)
+        else:
+            pool.release(connection)
+    except cx_Oracle.Error as error:
+        logger.error("Error releasing Oracle session: %s", error)
+        discard = True
+    with _pool_stats_lock:
+        _pool_stats['dropped' if discard else 'released'] += 1
+
+
+def _is_connection_lost(error) -> bool:
+    """True when an Oracle error means the session itself is no longer usable"""
+    if error is None:
+        return False
+    args = getattr(error, 'args', None)
+    code = getattr(args[0], 'code', None) if args else None
+    # ORA-03113/03114/03135: lost contact, DPI-1080: connection closed by call timeout
+    return code in (3113, 3114, 3135, 28, 1012) or 'DPI-1080' in str(error)
+
+
+def get_pool_stats():
+    """Snapshot of pool occupancy and acquire wait times.
+
+    The top-level occupancy is the primary's; `pools` has every backend's.
+    """
+    with _pool_stats_lock:
+        stats = dict(_pool_stats)
+
+    acquired = stats['acquired']
+    stats['wait_ms_avg'] = round(stats['wait_ms_total'] / acquired, 3) if acquired else 0.0
+    stats['wait_ms_total'] = round(stats['wait_ms_total'], 3)
+    stats['wait_ms_max'] = round(stats['wait_ms_max'], 3)
+
+    pool = _db_pools.get(PRIMARY)
+    if pool is not None:
+        stats.update({
+            'busy': pool.busy,
+            'open': pool.opened,
+            'min': pool.min,
+            'max': pool.max,
+            'increment': pool.increment,
+        })
+    else:
+        stats.update({'busy': 0, 'open': 0, 'min': POOL_CONFIG['min'],
+                      'max': POOL_CONFIG['max'], 'increment': POOL_CONFIG['increment']})
+    stats['pools'] = {
+        backend: {'busy': pool.busy, 'open': pool.opened}
+        for backend, pool in list(_db_pools.items())
+    }
+    return stats
+
 @app.route('/', methods=['GET'])
 def root():
     """Root endpoint - lists available API endpoints"""
@@ -107,12 +645,25 @@ def root():
         'status': 'running',
         'endpoints': {
             'health': '/api/health',
+            'db_pool': '/api/db/pool',
+            'metrics': '/metrics',
+            'cache_stats': '/api/cache/stats',
+            'cache_invalidate': '/api/cache/invalidate (POST)',
             'user_by_code': '/api/user/<employee_code>',
             'user_search': '/api/user/search (POST)',
             'rpos_login': '/api/rpos-login (POST)',
-            'rpos_login_status': '/api/rpos-login/status?device_id=...',
+            'rpos_login_status': '/api/rpos-login/status?device_id=...[&wait=<seconds>|&stream=1]',
+            'rpos_login_watcher': '/api/rpos-login/watcher',
             'location': '/api/location/<location_code>',
-            'itemmaster': '/api/itemmaster/details'
+            'itemmaster': '/api/itemmaster/details',
+            'itemmaster_barcode': '/api/itemmaster/barcode/<barcode>',
+            'itemmaster_itemcode': '/api/itemmaster/itemcode/<item_code>',
+            'itemmaster_lookup': '/api/itemmaster/lookup (POST)',
+            'itemmaster_export': '/api/itemmaster/export',
+            'itemmaster_changes': '/api/itemmaster/changes?since=<version>',
+            'itemmaster_snapshot': '/api/itemmaster/snapshot',
+            'itemmaster_facets': '/api/itemmaster/facets[?facets=category,brand&category=...]',
+            'itemmaster_snapshot_file': '/api/itemmaster/snapshot/file (binary, Range)'
         }
     }), 200
 
@@ -121,57 +672,148 @@ def health_check():
     """Health check endpoint"""
     return jsonify({'status': 'ok', 'message': 'Server is running'}), 200
 
+@app.route('/api/db/pool', methods=['GET'])
+def db_pool_status():
+    """Report session pool occupancy and acquire wait statistics"""
+    stats = get_pool_stats()
+    stats['statements'] = itemmaster_statements.stats()
+    stats['single_flight'] = inflight_queries.stats()
+    stats['admission'] = {'db': db_gate.stats(), 'rate': rate_limiter.stats()}
+    stats['routing'] = db_router.status()
+    return jsonify(stats), 200
+
+
+def _collect_runtime_metrics():
+    """Values read at scrape time: pool occupancy, logging and lookup cache state"""
+    pool = get_pool_stats()
+    cache_stats = {name: cache.stats() for name, cache in _LOOKUP_CACHES.items()}
+    log_stats = access_log.stats()
+    gate = db_gate.stats()
+    backends = db_router.status()['backends']
+    return [
+        ('pos_db_pool_sessions', 'gauge', 'Oracle pool sessions by state', [
+            ({'state': 'busy'}, pool['busy']),
+            ({'state': 'open'}, pool['open']),
+            ({'state': 'max'}, pool['max']),
+        ]),
+        ('pos_db_pool_acquire_errors_total', 'counter', 'Failed session acquires',
+         [({}, pool['acquire_errors'])]),
+        ('pos_db_backend_up', 'gauge', 'Whether a backend is in read rotation',
+         [({'backend': backend['name']}, int(backend['healthy'])) for backend in backends]),
+        ('pos_db_backend_probe_latency_seconds', 'gauge',
+         'Health probe round trip per backend (moving average)',
+         [({'backend': backend['name']}, backend['latency_ms'] / 1000)
+          for backend in backends if backend['latency_ms'] is not None]),
+        ('pos_db_backend_lag_seconds', 'gauge', 'Replication lag reported by each standby',
+         [({'backend': backend['name']}, backend['lag_seconds'])
+          for backend in backends if backend['lag_seconds'] is not None]),
+        ('pos_db_admission_slots', 'gauge', 'Concurrent DB work slots by state', [
+            ({'state': 'active'}, gate['active']),
+            ({'state': 'limit'}, gate['limit']),
+        ]),
+        ('pos_admission_tracked_clients', 'gauge', 'Client/route-class token buckets held',
+         [({}, rate_limiter.stats()['clients'])]),
+        ('pos_log_records_dropped_total', 'counter', 'Log records dropped on a full queue',
+         [({}, log_stats['dropped'])]),
+        ('pos_access_log_sampled_out_total', 'counter', 'Access log lines skipped by sampling',
+         [({}, log_stats['sampled_out'])]),
+        ('pos_lookup_cache_entries', 'gauge', 'Entries held by each lookup cache',
+         [({'cache': name}, stats['size']) for name, stats in cache_stats.items()]),
+        ('pos_lookup_cache_requests_total', 'counter', 'Lookup cache requests by result', [
+            ({'cache': name, 'result': result}, stats[key])
+            for name, stats in cache_stats.items()
+            for result, key in (('hit', 'hits'), ('negative_hit', 'negative_hits'),
+                                ('miss', 'misses'))
+        ]),
+    ]
+
+
+metrics_registry.add_collector(_collect_runtime_metrics)
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus text exposition of this worker's request and pool metrics"""
+    return Response(metrics_registry.render(), mimetype='text/plain; version=0.0.4')
+
+USER_SELECT = """
+    SELECT 
+        COUNTER,
+        EMPLOYEECODE,
+        LOCATIONCODE,
+        PASSWORD,
+        USERID
+    FROM APPLICATIONUSER
+"""
+
+
+def _user_record(result):
+    """Map an APPLICATIONUSER row (USER_SELECT column order) to the API response"""
+    return {
+        'employee_id': str(result[1]),  # EMPLOYEECODE
+        'username': str(result[1]),     # EMPLOYEECODE (same as employee_id)
+        'counter': result[0] if result[0] else 'N',  # COUNTER
+        'name': result[4] if result[4] else '',      # USERID
+        'password': result[3] if result[3] else '',  # PASSWORD
+        'location_code': result[2] if result[2] else None,  # LOCATIONCODE
+        'found': True
+    }
+
+
+def _user_not_found(employee_code):
+    return jsonify({
+        'found': False,
+        'message': f'User with Employee Code {employee_code} not found'
+    }), 404
+
+
 @app.route('/api/user/<int:employee_code>', methods=['GET'])
 def get_user_by_employee_code(employee_code):
     """Fetch user details from APPLICATIONUSER table based on Employee Code"""
+    hit, user_data = user_cache.get(employee_code)
+    if hit:
+        if user_data is None:
+            return _user_not_found(employee_code)
+        return jsonify(user_data), 200
+    return _coalesced(('user', employee_code), lambda: _query_user(employee_code))
+
+
+def _query_user(employee_code):
+    """APPLICATIONUSER lookup on a cache miss; fills the cache either way"""
     connection = None
     cursor = None
+    db_error = None
     
     try:
-        connection = get_db_connection()
+        connection = get_db_connection('lookup')
         cursor = connection.cursor()
         
         # Query to fetch user details
-        query = """
-            SELECT 
-                COUNTER,
-                EMPLOYEECODE,
-                LOCATIONCODE,
-                PASSWORD,
-                USERID
-            FROM APPLICATIONUSER
-            WHERE EMPLOYEECODE = :employee_code
-        """
+        query = USER_SELECT + " WHERE EMPLOYEECODE = :employee_code"
         
         cursor.execute(query, {'employee_code': employee_code})
         result = cursor.fetchone()
         
         if result:
             # Map database columns to response
-            user_data = {
-                'employee_id': str(result[1]),  # EMPLOYEECODE
-                'username': str(result[1]),     # EMPLOYEECODE (same as employee_id)
-                'counter': result[0] if result[0] else 'N',  # COUNTER
-                'name': result[4] if result[4] else '',      # USERID
-                'password': result[3] if result[3] else '',  # PASSWORD
-                'location_code': result[2] if result[2] else None,  # LOCATIONCODE
-                'found': True
-            }
+            user_data = _user_record(result)
+            user_cache.set(employee_code, user_data)
             return jsonify(user_data), 200
         else:
-            return jsonify({
-                'found': False,
-                'message': f'User with Employee Code {employee_code} not found'
-            }), 404
+            user_cache.set(employee_code, None)
+            return _user_not_found(employee_code)
             
     except cx_Oracle.Error as error:
-        print(f"Database error: {error}")
+        db_error = error
+        logger.error("Database error: %s", error)
         return jsonify({
             'error': 'Database error',
             'message': str(error)
         }), 500
+    except Rejected:
+        raise
     except Exception as error:
-        print(f"Unexpected error: {error}")
+        logger.exception("Unexpected error: %s", error)
         return jsonify({
             'error': 'Internal server error',
             'message': str(error)
@@ -180,7 +822,7 @@ def get_user_by_employee_code(employee_code):
         if cursor:
             cursor.close()
         if connection:
-            connection.close()
+            release_db_connection(connection, discard=_is_connection_lost(db_error))
 
 
 def _normalise_flag(flag) -> str:
@@ -204,6 +846,304 @@ def _serialise_value(value):
     return value
 
 
+def _output_type_handler(cursor, name, default_type, size, precision, scale):
+    """Fetch CLOBs inline as strings instead of LOB locators.
+
+    Avoids one LOB.read() round trip per cell. NUMBER columns already arrive
+    as int (integral) or float, so they need no handler.
+    """
+    if default_type in (cx_Oracle.DB_TYPE_CLOB, cx_Oracle.DB_TYPE_NCLOB):
+        return cursor.var(cx_Oracle.DB_TYPE_LONG, arraysize=cursor.arraysize)
+    return None
+
+
+def _date_value(value):
+    return None if value is None else value.isoformat()
+
+
+_DATE_TYPES = (
+    cx_Oracle.DB_TYPE_DATE,
+    cx_Oracle.DB_TYPE_TIMESTAMP,
+    cx_Oracle.DB_TYPE_TIMESTAMP_TZ,
+    cx_Oracle.DB_TYPE_TIMESTAMP_LTZ,
+)
+
+
+def _row_serialiser(description, width=None):
+    """Build a row -> tuple converter once per result set from cursor.description.
+
+    Only columns whose type needs it (dates) get a converter; every other
+    value is passed through untouched. `width` drops trailing helper columns.
+    """
+    description = description[:width] if width is not None else description
+    converters = [
+        _date_value if desc[1] in _DATE_TYPES else None for desc in description
+    ]
+    count = len(converters)
+
+    if not any(converters):
+        if width is None:
+            return tuple
+        return lambda row: tuple(row[:count])
+
+    def serialise(row):
+        return tuple(
+            value if convert is None else convert(value)
+            for convert, value in zip(converters, row)
+        )
+    return serialise
+
+
+def _rows_to_items(column_names, rows, serialise):
+    started = time.perf_counter()
+    items = [dict(zip(column_names, serialise(row))) for row in rows]
+    _add_phase(_request_phases(), 'serialise', time.perf_counter() - started)
+    return items
+
+
+def _rows_to_columns(column_names, rows, serialise):
+    """Columnar layout: one array of values per field"""
+    started = time.perf_counter()
+    columns = list(zip(*(serialise(row) for row in rows))) or [()] * len(column_names)
+    columns = {name: list(values) for name, values in zip(column_names, columns)}
+    _add_phase(_request_phases(), 'serialise', time.perf_counter() - started)
+    return columns
+
+
+def _encode_json(payload) -> str:
+    if orjson is not None:
+        return orjson.dumps(payload).decode('utf-8')
+    return json.dumps(payload, ensure_ascii=False, separators=(',', ':'))
+
+
+def _json_dumps(payload) -> str:
+    started = time.perf_counter()
+    body = _encode_json(payload)
+    _add_phase(_request_phases(), 'serialise', time.perf_counter() - started)
+    return body
+
+
+def _json_response(payload, status=200):
+    """JSON response for large catalog payloads (compact, unsorted keys)"""
+    return Response(_json_dumps(payload), status=status, mimetype='application/json')
+
+
+def _negotiate_encoding():
+    """Preferred content-coding the client accepts: 'br', 'gzip' or None"""
+    accepted = request.accept_encodings
+    if brotli is not None and accepted['br']:
+        return 'br'
+    if accepted['gzip']:
+        return 'gzip'
+    return None
+
+
+def _etag_for(base):
+    """Strong ETag value for `base`, distinct per content-coding"""
+    encoding = _negotiate_encoding()
+    return f"{base}-{encoding}" if encoding else base
+
+
+def _catalog_not_modified(snapshot):
+    """Tie this response's ETag to the served catalog version and request URL.
+
+    Returns True when the client's If-None-Match already names it, so the
+    handler can answer 304 without building the body.
+    """
+    key = f"{_catalog_state().version}|{request.full_path}".encode('utf-8')
+    g.etag_base = hashlib.blake2b(key, digest_size=12).hexdigest()
+    return request.if_none_match.contains(_etag_for(g.etag_base))
+
+
+def _not_modified():
+    return Response(status=304)
+
+
+def _compress(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=COMPRESS_LEVEL)
+    return zlib.compress(data, COMPRESS_LEVEL, wbits=31)
+
+
+def _compress_stream(chunks, encoding):
+    """Compress a streamed body chunk by chunk, flushing after each one"""
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=COMPRESS_LEVEL)
+        compress, flush, finish = compressor.process, compressor.flush, compressor.finish
+    else:
+        compressor = zlib.compressobj(COMPRESS_LEVEL, zlib.DEFLATED, 31)
+        compress = compressor.compress
+        flush = lambda: compressor.flush(zlib.Z_SYNC_FLUSH)
+        finish = compressor.flush
+
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode('utf-8')
+            data = compress(chunk) + flush()
+            if data:
+                yield data
+        yield finish()
+    finally:
+        # Propagate client disconnects so the inner generator releases its session
+        close = getattr(chunks, 'close', None)
+        if close is not None:
+            close()
+
+
+@app.before_request
+def _start_request_timer():
+    request_log.pipeline.start()
+    g.request_started = time.perf_counter()
+    request_log.assign_request_id()
+
+
+def _client_id(device_id, remote_addr):
+    """Rate-limit identity and bucket scale: the device id when sent, else the address"""
+    device_id = (device_id or '').strip()
+    if device_id:
+        return 'device:' + device_id[:64], 1.0
+    return 'ip:' + (remote_addr or 'unknown'), ADMISSION_ADDRESS_FACTOR
+
+
+def _admit(path, device_id, remote_addr):
+    """Take a token from the client's bucket for `path`, raising Rejected when empty.
+
+    Also called by the gateway before it parks a long-poll on the event loop.
+    """
+    if not ADMISSION_ENABLED or path in ADMISSION_EXEMPT_PATHS:
+        return
+    client, scale = _client_id(device_id, remote_addr)
+    rate_limiter.check(client, route_class(path), scale)
+
+
+@app.before_request
+def _admit_request():
+    """Per-client token bucket for the request's route class (429 when empty)"""
+    _admit(
+        request.path,
+        request.headers.get('X-Device-ID') or request.args.get('device_id'),
+        request.remote_addr,
+    )
+    return None
+
+
+@app.errorhandler(Rejected)
+def _admission_rejected(error):
+    admission_rejections.inc((error.route_class, error.reason))
+    message = (
+        'Too many requests from this client' if error.reason == 'rate_limited'
+        else 'Database is busy'
+    )
+    response = jsonify({
+        'error': 'Too many requests',
+        'message': f'{message}; retry in {error.retry_after}s',
+        'reason': error.reason,
+        'retry_after': error.retry_after,
+    })
+    response.status_code = 429
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response
+
+
+def _observe_request(route, method, status, started, phases, size, request_id, path):
+    latency = time.perf_counter() - started
+    requests_total.inc((route, method, str(status)))
+    request_duration.observe((route,), latency)
+    for phase in REQUEST_PHASES:
+        if phase in phases:
+            request_phase_duration.observe((route, phase), phases[phase])
+    if 'acquire' in phases:
+        request_rows.observe((route,), phases.get('rows', 0))
+    if size is not None:
+        response_bytes.observe((route,), size)
+
+    db_seconds = sum(phases.get(phase, 0.0) for phase in ('acquire', 'execute', 'fetch'))
+    access_log.record(
+        request_id, method, route, path, status, latency,
+        db_ms=round(db_seconds * 1000, 3), rows=phases.get('rows', 0), bytes=size,
+        coalesce_ms=round(phases['coalesce'] * 1000, 3) if 'coalesce' in phases else None,
+        db=phases.get('backend'),
+    )
+
+
+@app.after_request
+def _record_request_metrics(response):
+    """Record metrics and the access log line for the matched route.
+
+    Registered before _finalise_response so it runs after it and sees the
+    compressed body. Streamed responses are recorded when the body closes.
+    """
+    started = g.get('request_started')
+    if started is None:
+        return response
+    route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    phases = g.get('phases')
+    if phases is None:
+        phases = g.phases = {}
+    response.headers['X-Request-ID'] = g.request_id
+    observe_args = (route, request.method, response.status_code, started, phases)
+    request_details = (g.request_id, request.path)
+
+    if response.is_streamed:
+        response.call_on_close(
+            lambda: _observe_request(*observe_args, None, *request_details)
+        )
+    else:
+        _observe_request(*observe_args, response.calculate_content_length(), *request_details)
+    return response
+
+
+@app.after_request
+def _finalise_response(response):
+    """Add strong ETags (answering If-None-Match with 304) and compress bodies"""
+    if request.method not in ('GET', 'HEAD') or response.status_code not in (200, 304):
+        return response
+
+    encoding = _negotiate_encoding()
+    base = g.get('etag_base')
+    compressible = (
+        encoding is not None
+        and response.mimetype in COMPRESSIBLE_MIMETYPES
+        and 'Content-Encoding' not in response.headers
+    )
+
+    if response.is_streamed:
+        response.vary.add('Accept-Encoding')
+        if base is not None:
+            response.set_etag(_etag_for(base))
+        if compressible:
+            response.response = _compress_stream(response.response, encoding)
+            response.headers.pop('Content-Length', None)
+            response.headers['Content-Encoding'] = encoding
+        return response
+
+    if base is None and 'ETag' in response.headers:
+        # The handler set its own validator (e.g. the catalog file checksum)
+        return response
+
+    if response.status_code == 200:
+        body = response.get_data()
+        if base is None:
+            base = hashlib.blake2b(body, digest_size=12).hexdigest()
+        etag = _etag_for(base)
+
+        if request.if_none_match.contains(etag):
+            response = _not_modified()
+        elif compressible and len(body) >= COMPRESS_MIN_BYTES:
+            response.set_data(_compress(body, encoding))
+            response.headers['Content-Encoding'] = encoding
+    elif base is not None:
+        etag = _etag_for(base)
+    else:
+        return response
+
+    response.set_etag(etag)
+    response.vary.add('Accept-Encoding')
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
 @app.route('/api/rpos-login', methods=['POST'])
 def upsert_rpos_login():
     """Insert or update a record in RPOS_LOGIN."""
@@ -226,6 +1166,7 @@ def upsert_rpos_login():
 
     connection = None
     cursor = None
+    db_error = None
 
     merge_sql = f"""
         MERGE INTO {RPOS_LOGIN_TABLE} tgt
@@ -255,6 +1196,10 @@ def upsert_rpos_login():
             approval_flag=approval_flag,
         )
         connection.commit()
+        # Oracle stores '' as NULL, so publish what the poller will read back
+        login_watcher.publish(
+            device_id, (approval_flag, str(employee_id), str(admin_employee_id), lan_ip or None)
+        )
 
         return jsonify({
             'success': True,
@@ -262,9 +1207,10 @@ def upsert_rpos_login():
         }), 200
 
     except cx_Oracle.Error as error:
+        db_error = error
         if connection:
             connection.rollback()
-        print(f"Database error in upsert_rpos_login: {error}")
+        logger.error("Database error in upsert_rpos_login: %s", error)
         return jsonify({
             'error': 'Database error',
             'message': str(error)
@@ -273,14 +1219,127 @@ def upsert_rpos_login():
         if cursor:
             cursor.close()
         if connection:
-            connection.close()
+            release_db_connection(connection, discard=_is_connection_lost(db_error))
+
+
+def _fetch_rpos_login_states(device_ids):
+    """Current (APPROVAL_FLAG, EMPLOYEE_ID, ADMIN_EMPLOYEE_ID, LAN_IP) per device"""
+    placeholders = ', '.join(f":d{pos}" for pos in range(LOOKUP_CHUNK_SIZE))
+    query = f"""
+        SELECT DEVICE_ID, APPROVAL_FLAG, EMPLOYEE_ID, ADMIN_EMPLOYEE_ID, LAN_IP
+        FROM {RPOS_LOGIN_TABLE}
+        WHERE DEVICE_ID IN ({placeholders})
+    """
+
+    connection = None
+    cursor = None
+    db_error = None
+    states = {}
+
+    try:
+        connection = get_db_connection('status')
+        cursor = connection.cursor()
+        for start in range(0, len(device_ids), LOOKUP_CHUNK_SIZE):
+            chunk = device_ids[start:start + LOOKUP_CHUNK_SIZE]
+            params = {f"d{pos}": None for pos in range(LOOKUP_CHUNK_SIZE)}
+            params.update({f"d{pos}": device_id for pos, device_id in enumerate(chunk)})
+            cursor.execute(query, params)
+            for result in cursor.fetchall():
+                states[result[0]] = tuple(result[1:])
+        return states
+    except cx_Oracle.Error as error:
+        db_error = error
+        raise
+    finally:
+        if cursor:
+            cursor.close()
+        if connection:
+            release_db_connection(connection, discard=_is_connection_lost(db_error))
+
+
+login_watcher = StatusWatcher(_fetch_rpos_login_states, STATUS_POLL_INTERVAL)
+
+
+def _rpos_status_payload(state, admin_employee_id):
+    """Status response body and HTTP status for a device's RPOS_LOGIN state"""
+    if state is None or (admin_employee_id and state[2] != admin_employee_id):
+        return {
+            'found': False,
+            'approval_flag': 'N'
+        }, 404
+
+    return {
+        'found': True,
+        'approval_flag': state[0],
+        'employee_id': state[1],
+        'admin_employee_id': state[2],
+        'lan_ip': state[3],
+    }, 200
+
+
+def _watched_status(device_id):
+    """(version, state) of a subscribed device, reading Oracle only if unknown"""
+    entry = login_watcher.current(device_id)
+    if entry is None:
+        state = _fetch_rpos_login_states([device_id]).get(device_id)
+        login_watcher.publish(device_id, state)
+        entry = login_watcher.current(device_id)
+    return entry
+
+
+def _stream_rpos_login_status(device_id, admin_employee_id):
+    """Server-sent events: the current status, then one event per change"""
+    def event(state):
+        payload, _ = _rpos_status_payload(state, admin_employee_id)
+        return f"event: status\ndata: {json.dumps(payload)}\n\n"
+
+    def generate():
+        # Subscribe inside the generator so the finally below always pairs with it
+        login_watcher.subscribe(device_id)
+        try:
+            try:
+                version, state = _watched_status(device_id)
+            except cx_Oracle.Error as error:
+                logger.error("Database error in get_rpos_login_status stream: %s", error)
+                yield f"event: error\ndata: {json.dumps({'error': 'Database error', 'message': str(error)})}\n\n"
+                return
+
+            yield event(state)
+            deadline = time.monotonic() + STATUS_SSE_MAX_SECONDS
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return
+                changed = login_watcher.wait_for_change(
+                    device_id, version, min(STATUS_SSE_HEARTBEAT, remaining)
+                )
+                if changed is None:
+                    yield ": keep-alive\n\n"
+                    continue
+                version, state = changed
+                yield event(state)
+        finally:
+            login_watcher.unsubscribe(device_id)
+
+    return Response(
+        generate(),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
 
 
 @app.route('/api/rpos-login/status', methods=['GET'])
 def get_rpos_login_status():
-    """Return approval status for a device/admin combination."""
+    """Return approval status for a device/admin combination.
+
+    `wait=<seconds>` long-polls until APPROVAL_FLAG changes (returning at once
+    if already approved); `stream=1` or `Accept: text/event-stream` streams
+    every change as server-sent events.
+    """
     device_id = request.args.get('device_id')
     admin_employee_id = request.args.get('admin_employee_id')
+    wait = request.args.get('wait', default=0, type=float) or 0
+    wait = max(0.0, min(wait, STATUS_WAIT_MAX))
 
     if not device_id:
         return jsonify({
@@ -288,8 +1347,34 @@ def get_rpos_login_status():
             'message': 'device_id query parameter is required'
         }), 400
 
+    if request.args.get('stream') == '1' or (
+        request.accept_mimetypes.best == 'text/event-stream'
+    ):
+        return _stream_rpos_login_status(device_id, admin_employee_id)
+
+    if wait > 0:
+        login_watcher.subscribe(device_id)
+        try:
+            version, state = _watched_status(device_id)
+            if state is None or state[0] != 'Y':
+                changed = login_watcher.wait_for_change(device_id, version, wait)
+                if changed is not None:
+                    version, state = changed
+        except cx_Oracle.Error as error:
+            logger.error("Database error in get_rpos_login_status: %s", error)
+            return jsonify({
+                'error': 'Database error',
+                'message': str(error)
+            }), 500
+        finally:
+            login_watcher.unsubscribe(device_id)
+
+        payload, status = _rpos_status_payload(state, admin_employee_id)
+        return jsonify(payload), status
+
     connection = None
     cursor = None
+    db_error = None
 
     base_query = f"""
         SELECT APPROVAL_FLAG, EMPLOYEE_ID, ADMIN_EMPLOYEE_ID, LAN_IP
@@ -304,27 +1389,17 @@ def get_rpos_login_status():
         params['admin_employee_id'] = admin_employee_id
 
     try:
-        connection = get_db_connection()
+        connection = get_db_connection('status')
         cursor = connection.cursor()
         cursor.execute(base_query, params)
         result = cursor.fetchone()
 
-        if result:
-            return jsonify({
-                'found': True,
-                'approval_flag': result[0],
-                'employee_id': result[1],
-                'admin_employee_id': result[2],
-                'lan_ip': result[3],
-            }), 200
-
-        return jsonify({
-            'found': False,
-            'approval_flag': 'N'
-        }), 404
+        payload, status = _rpos_status_payload(result, admin_employee_id)
+        return jsonify(payload), status
 
     except cx_Oracle.Error as error:
-        print(f"Database error in get_rpos_login_status: {error}")
+        db_error = error
+        logger.error("Database error in get_rpos_login_status: %s", error)
         return jsonify({
             'error': 'Database error',
             'message': str(error)
@@ -333,7 +1408,13 @@ def get_rpos_login_status():
         if cursor:
             cursor.close()
         if connection:
-            connection.close()
+            release_db_connection(connection, discard=_is_connection_lost(db_error))
+
+
+@app.route('/api/rpos-login/watcher', methods=['GET'])
+def get_rpos_login_watcher_stats():
+    """Report how many devices are waiting on approval and poller activity"""
+    return jsonify(login_watcher.stats()), 200
 
 @app.route('/api/user/search', methods=['POST'])
 def search_user():
@@ -360,65 +1441,94 @@ def search_user():
         # Reuse the GET endpoint logic
         return get_user_by_employee_code(employee_code)
         
+    except Rejected:
+        raise
     except Exception as error:
-        print(f"Error in search_user: {error}")
+        logger.exception("Error in search_user: %s", error)
         return jsonify({
             'error': 'Internal server error',
             'message': str(error)
         }), 500
 
+LOCATION_SELECT = """
+    SELECT 
+        LOCATIONCODE,
+        LOCATIONNAME,
+        ADDRESS,
+        FAX,
+        EMAILID,
+        MANAGER
+    FROM LOCATIONMASTER
+"""
+
+
+def _location_record(result):
+    """Map a LOCATIONMASTER row (LOCATION_SELECT column order) to the API response"""
+    return {
+        'location_code': result[0] if result[0] else None,
+        'location_name': result[1] if result[1] else '',      # LOCATIONNAME -> Shop Name
+        'address': result[2] if result[2] else '',          # ADDRESS -> Shop Address
+        'fax': result[3] if result[3] else '',               # FAX -> Shop Phone
+        'email_id': result[4] if result[4] else '',         # EMAILID -> Email ID
+        'manager': result[5] if result[5] else '',           # MANAGER -> Manager
+        'found': True
+    }
+
+
+def _location_not_found(location_code):
+    return jsonify({
+        'found': False,
+        'message': f'Location with code {location_code} not found'
+    }), 404
+
+
 @app.route('/api/location/<int:location_code>', methods=['GET'])
 def get_location_by_code(location_code):
     """Fetch location details from LOCATIONMASTER table based on Location Code"""
+    hit, location_data = location_cache.get(location_code)
+    if hit:
+        if location_data is None:
+            return _location_not_found(location_code)
+        return jsonify(location_data), 200
+    return _coalesced(('location', location_code), lambda: _query_location(location_code))
+
+
+def _query_location(location_code):
+    """LOCATIONMASTER lookup on a cache miss; fills the cache either way"""
     connection = None
     cursor = None
+    db_error = None
     
     try:
-        connection = get_db_connection()
+        connection = get_db_connection('lookup')
         cursor = connection.cursor()
         
         # Query to fetch location details
-        query = """
-            SELECT 
-                LOCATIONCODE,
-                LOCATIONNAME,
-                ADDRESS,
-                FAX,
-                EMAILID,
-                MANAGER
-            FROM LOCATIONMASTER
-            WHERE LOCATIONCODE = :location_code
-        """
+        query = LOCATION_SELECT + " WHERE LOCATIONCODE = :location_code"
         
         cursor.execute(query, {'location_code': location_code})
         result = cursor.fetchone()
         
         if result:
             # Map database columns to response
-            location_data = {
-                'location_code': result[0] if result[0] else None,
-                'location_name': result[1] if result[1] else '',      # LOCATIONNAME -> Shop Name
-                'address': result[2] if result[2] else '',          # ADDRESS -> Shop Address
-                'fax': result[3] if result[3] else '',               # FAX -> Shop Phone
-                'email_id': result[4] if result[4] else '',         # EMAILID -> Email ID
-                'manager': result[5] if result[5] else '',           # MANAGER -> Manager
-                'found': True
-            }
+            location_data = _location_record(result)
+            location_cache.set(location_code, location_data)
             return jsonify(location_data), 200
         else:
-            return jsonify({
-                'found': False,
-                'message': f'Location with code {location_code} not found'
-            }), 404
+            location_cache.set(location_code, None)
+            return _location_not_found(location_code)
             
     except cx_Oracle.Error as error:
-        print(f"Database error: {error}")
+        db_error = error
+        logger.error("Database error: %s", error)
         return jsonify({
             'error': 'Database error',
             'message': str(error)
         }), 500
+    except Rejected:
+        raise
     except Exception as error:
-        print(f"Unexpected error: {error}")
+        logger.exception("Unexpected error: %s", error)
         return jsonify({
             'error': 'Internal server error',
             'message': str(error)
@@ -427,7 +1537,435 @@ def get_location_by_code(location_code):
         if cursor:
             cursor.close()
         if connection:
-            connection.close()
+            release_db_connection(connection, discard=_is_connection_lost(db_error))
+
+
+def warm_lookup_caches():
+    """Preload APPLICATIONUSER and LOCATIONMASTER into the lookup caches"""
+    connection = None
+    cursor = None
+    db_error = None
+
+    try:
+        connection = get_db_connection('lookup')
+        cursor = connection.cursor()
+        cursor.arraysize = 1000
+
+        cursor.execute(USER_SELECT)
+        users = 0
+        for result in cursor:
+            if result[1] is not None:
+                user_cache.set(int(result[1]), _user_record(result))
+                users += 1
+
+        cursor.execute(LOCATION_SELECT)
+        locations = 0
+        for result in cursor:
+            if result[0] is not None:
+                location_cache.set(int(result[0]), _location_record(result))
+                locations += 1
+
+        logger.info("Lookup caches warmed: %d users, %d locations", users, locations)
+    except cx_Oracle.Error as error:
+        db_error = error
+        logger.error("Database error while warming lookup caches: %s", error)
+    finally:
+        if cursor:
+            cursor.close()
+        if connection:
+            release_db_connection(connection, discard=_is_connection_lost(db_error))
+
+
+_LOOKUP_CACHES = {
+    'user': user_cache,
+    'location': location_cache,
+}
+
+
+@app.route('/api/cache/stats', methods=['GET'])
+def get_cache_stats():
+    """Hit/miss counters and sizes of the user and location caches"""
+    return jsonify({
+        name: cache.stats() for name, cache in _LOOKUP_CACHES.items()
+    }), 200
+
+
+@app.route('/api/cache/invalidate', methods=['POST'])
+def invalidate_cache():
+    """Drop cached user/location entries (one key, or the whole cache).
+
+    The caches live in each worker process, so this clears only the worker
+    that handles the call (reported as `pid`, `scope: 'worker'`); entries in
+    other workers expire after their TTL.
+    """
+    payload = request.get_json(silent=True) or {}
+    name = (payload.get('cache') or 'all').strip().lower()
+    key = payload.get('key')
+
+    if name != 'all' and name not in _LOOKUP_CACHES:
+        return jsonify({
+            'error': 'Bad request',
+            'message': f"cache must be one of: all, {', '.join(_LOOKUP_CACHES)}"
+        }), 400
+
+    names = list(_LOOKUP_CACHES) if name == 'all' else [name]
+    removed = {}
+    for cache_name in names:
+        cache = _LOOKUP_CACHES[cache_name]
+        if key is None:
+            removed[cache_name] = cache.invalidate()
+        else:
+            try:
+                removed[cache_name] = cache.invalidate(int(key))
+            except (TypeError, ValueError):
+                return jsonify({
+                    'error': 'Bad request',
+                    'message': 'key must be a number'
+                }), 400
+
+    return jsonify({
+        'success': True,
+        'removed': removed,
+        'scope': 'worker',
+        'pid': os.getpid(),
+    }), 200
+
+
+def _load_itemmaster_snapshot():
+    """Read every allowed ITEMMASTERDETAILS column for the catalog snapshot"""
+    statement = _itemmaster_scan_statement(ITEMMASTER_COLUMNS, 5000)
+    connection = None
+    cursor = None
+    db_error = None
+
+    try:
+        connection = get_db_connection('catalog')
+        cursor = connection.cursor()
+        statement.execute(cursor)
+        column_names = [desc[0] for desc in cursor.description]
+        serialise = _row_serialiser(cursor.description)
+
+        rows = []
+        while True:
+            batch = cursor.fetchmany()
+            if not batch:
+                break
+            rows.extend(serialise(row) for row in batch)
+        return column_names, rows
+    except cx_Oracle.Error as error:
+        db_error = error
+        raise
+    finally:
+        if cursor:
+            cursor.close()
+        if connection:
+            release_db_connection(connection, discard=_is_connection_lost(db_error))
+
+
+def _load_itemmaster_overlay():
+    """Narrow read of (ITEMCODE, BARCODE) plus the stock/price columns for the overlay"""
+    statement = _itemmaster_scan_statement(
+        ('ITEMCODE', 'BARCODE') + CATALOG_OVERLAY_COLUMNS, 5000, order_by=('ITEMCODE', 'BARCODE')
+    )
+    connection = None
+    cursor = None
+    db_error = None
+
+    try:
+        connection = get_db_connection('stock')
+        cursor = connection.cursor()
+        statement.execute(cursor)
+        column_names = [desc[0] for desc in cursor.description]
+        serialise = _row_serialiser(cursor.description)
+
+        rows = []
+        while True:
+            batch = cursor.fetchmany()
+            if not batch:
+                break
+            rows.extend(serialise(row) for row in batch)
+        return column_names, rows
+    except cx_Oracle.Error as error:
+        db_error = error
+        raise
+    finally:
+        if cursor:
+            cursor.close()
+        if connection:
+            release_db_connection(connection, discard=_is_connection_lost(db_error))
+
+
+# Workers touch their current file on every refresh, so two intervals is
+# enough to never prune a file another worker still serves
+catalog_files = CatalogFileStore(CATALOG_FILE_DIR, grace=2 * CATALOG_REFRESH_SECONDS + 60)
+
+
+def _publish_catalog_file(snapshot):
+    """Materialise a new snapshot version to disk; failures leave the last file in service"""
+    if not CATALOG_FILE_ENABLED:
+        return
+    try:
+        catalog_files.publish(snapshot)
+    except (OSError, ValueError, struct.error) as error:
+        catalog_files.last_error = str(error)
+        logger.error("Error writing catalog file: %s", error)
+
+
+catalog_store = CatalogStore(
+    _load_itemmaster_snapshot, CATALOG_REFRESH_SECONDS, CATALOG_HISTORY_SIZE,
+    overlay_loader=(
+        _load_itemmaster_overlay
+        if CATALOG_OVERLAY_SECONDS > 0 and CATALOG_OVERLAY_COLUMNS else None
+    ),
+    overlay_interval=CATALOG_OVERLAY_SECONDS,
+    on_refresh=_publish_catalog_file,
+)
+
+
+def _catalog_state():
+    """Served catalog state for this request, read once so the ETag and body agree"""
+    if not CATALOG_SNAPSHOT_ENABLED:
+        return None
+    if 'catalog_state' not in g:
+        catalog_store.start()
+        g.catalog_state = catalog_store.state
+    return g.catalog_state
+
+
+def _catalog_snapshot():
+    """Current catalog snapshot, or None when disabled or not loaded yet"""
+    state = _catalog_state()
+    return state.snapshot if state is not None else None
+
+
+def _catalog_overlay():
+    """Stock overlay merged into this request's responses, or None"""
+    state = _catalog_state()
+    return state.overlay if state is not None else None
+
+
+def _snapshot_info(snapshot):
+    overlay = _catalog_overlay()
+    return {
+        'version': _catalog_state().version,
+        'age_seconds': round(time.time() - snapshot.loaded_at, 3),
+        'stock_age_seconds': (
+            round(time.time() - overlay.loaded_at, 3) if overlay is not None else None
+        ),
+    }
+
+
+def _parse_itemmaster_fields(fields_param):
+    """Allowed columns from a comma-separated `fields` value, or the defaults.
+
+    Columns come back de-duplicated and in ITEMMASTER_COLUMNS order, whatever
+    order the caller listed them in.
+    """
+    selected_columns = []
+    if fields_param:
+        requested = {part.strip().upper() for part in fields_param.split(',')}
+        selected_columns = sorted(
+            requested & ITEMMASTER_ALLOWED_COLUMNS, key=_ITEMMASTER_COLUMN_ORDER.__getitem__
+        )
+
+    if not selected_columns:
+        selected_columns = list(ITEMMASTER_DEFAULT_COLUMNS)
+    return selected_columns
+
+
+def _parse_facet_filters():
+    """{facet: code} from the category/maincategory/microcategory/brand parameters"""
+    filters = {}
+    for facet, _, _ in FACETS:
+        value = (request.args.get(facet) or '').strip()
+        if value:
+            filters[facet] = value
+    return filters
+
+
+itemmaster_statements = StatementRegistry(STATEMENT_REGISTRY_SIZE)
+
+_ITEM_SEARCH_CONDITION = (
+    "("
+    "LOWER(ITEMNAME) LIKE :search OR "
+    "LOWER(ITEMNAMEARA) LIKE :search OR "
+    "LOWER(BARCODE) LIKE :search"
+    ")"
+)
+
+# Facet filter -> code column it binds against (`:category`, `:brand`, ...)
+_FACET_CODE_COLUMNS = {facet: code_column for facet, code_column, _ in FACETS}
+
+
+def _item_conditions(search, filters):
+    """WHERE conditions for a search flag and a tuple of facet filter names"""
+    conditions = [_ITEM_SEARCH_CONDITION] if search else []
+    conditions.extend(f"{_FACET_CODE_COLUMNS[facet]} = :{facet}" for facet in filters)
+    return conditions
+
+
+# Rows after the seek key within its (ITEMNAME, ITEMCODE) group, by kind of
+# BARCODE in the key; a NULL barcode sorts last, so nothing in the group follows it
+_ITEM_AFTER_TIES = {
+    'barcode': (
+        "(ITEMCODE > :after_code OR "
+        "(ITEMCODE = :after_code AND (BARCODE > :after_barcode OR BARCODE IS NULL)))"
+    ),
+    'null_barcode': "ITEMCODE > :after_code",
+}
+
+# Keyset seek conditions by kind of `after` key: (name kind, barcode kind)
+_ITEM_AFTER_CONDITIONS = {
+    # NULL names sort last, so only the ITEMCODE/BARCODE tie-break remains
+    ('null_name', tie): f"(ITEMNAME IS NULL AND {condition})"
+    for tie, condition in _ITEM_AFTER_TIES.items()
+}
+_ITEM_AFTER_CONDITIONS.update({
+    ('name', tie): (
+        "("
+        "ITEMNAME > :after_name OR "
+        f"(ITEMNAME = :after_name AND {condition}) OR "
+        "ITEMNAME IS NULL"
+        ")"
+    )
+    for tie, condition in _ITEM_AFTER_TIES.items()
+})
+
+
+def _itemmaster_page_statement(columns, search, after_kind, filters=()):
+    """Keyset page ordered by (ITEMNAME, ITEMCODE, BARCODE); `columns` is a canonical tuple.
+
+    BARCODE makes the order unique when an item has several unit rows, so a
+    page boundary between two of them neither skips nor repeats a row.
+    """
+    def build():
+        # The seek key must be fetched even when the caller did not ask for it
+        query_columns = list(columns)
+        for column in ('ITEMNAME', 'ITEMCODE', 'BARCODE'):
+            if column not in query_columns:
+                query_columns.append(column)
+
+        conditions = _item_conditions(search, filters)
+        if after_kind is not None:
+            conditions.append(_ITEM_AFTER_CONDITIONS[after_kind])
+
+        query = f"SELECT {', '.join(query_columns)} FROM ITEMMASTERDETAILS"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        # One extra row tells us whether another page exists
+        query += " ORDER BY ITEMNAME, ITEMCODE, BARCODE FETCH FIRST :fetch_rows ROWS ONLY"
+        return Statement(query)
+
+    return itemmaster_statements.get(('page', columns, search, after_kind, filters), build)
+
+
+def _itemmaster_offset_statement(columns, search, filters=()):
+    """ROW_NUMBER offset page; `columns` is a canonical tuple"""
+    def build():
+        column_sql = ', '.join(columns)
+        base_query = f"SELECT {column_sql}, ROW_NUMBER() OVER (ORDER BY ITEMNAME) AS RN FROM ITEMMASTERDETAILS"
+        conditions = _item_conditions(search, filters)
+        if conditions:
+            base_query += " WHERE " + " AND ".join(conditions)
+        return Statement(
+            f"SELECT {column_sql} FROM ("
+            f"{base_query}"
+            ") WHERE RN > :offset AND RN <= :offset + :limit"
+        )
+
+    return itemmaster_statements.get(('offset', columns, search, filters), build)
+
+
+def _itemmaster_count_statement(search, filters):
+    """Exact row count, optionally for a search and/or facet filters"""
+    def build():
+        query = "SELECT COUNT(*) FROM ITEMMASTERDETAILS"
+        conditions = _item_conditions(search, filters)
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        return Statement(query, arraysize=1)
+
+    return itemmaster_statements.get(('count', search, filters), build)
+
+
+def _itemmaster_facet_statement(facet, search, filters):
+    """Values, display names and row counts of one facet (DB fallback for /facets)"""
+    def build():
+        _, code_column, name_column = next(entry for entry in FACETS if entry[0] == facet)
+        conditions = [f"{code_column} IS NOT NULL"] + _item_conditions(search, filters)
+        return Statement(
+            f"SELECT {code_column}, MIN({name_column}), COUNT(*) FROM ITEMMASTERDETAILS "
+            f"WHERE {' AND '.join(conditions)} "
+            f"GROUP BY {code_column} ORDER BY MIN({name_column}), {code_column}",
+            arraysize=500,
+        )
+
+    return itemmaster_statements.get(('facet', facet, search, filters), build)
+
+
+def _itemmaster_key_statement(columns, key_column):
+    """Exact match on BARCODE/ITEMCODE: usually one row, fetched with the execute"""
+    def build():
+        return Statement(
+            f"SELECT {', '.join(columns)} FROM ITEMMASTERDETAILS WHERE {key_column} = :code",
+            arraysize=10,
+            prefetchrows=2,
+        )
+
+    return itemmaster_statements.get(('key', columns, key_column), build)
+
+
+def _itemmaster_keys_statement(columns, key_column):
+    """IN-list lookup of LOOKUP_CHUNK_SIZE binds (:k0..); key column appended if absent"""
+    def build():
+        query_columns = list(columns)
+        if key_column not in query_columns:
+            query_columns.append(key_column)
+        placeholders = ', '.join(f":k{pos}" for pos in range(LOOKUP_CHUNK_SIZE))
+        return Statement(
+            f"SELECT {', '.join(query_columns)} FROM ITEMMASTERDETAILS "
+            f"WHERE {key_column} IN ({placeholders})",
+            arraysize=LOOKUP_CHUNK_SIZE,
+            prefetchrows=LOOKUP_CHUNK_SIZE + 1,
+        )
+
+    return itemmaster_statements.get(('keys', columns, key_column), build)
+
+
+def _itemmaster_scan_statement(columns, arraysize, order_by=()):
+    """Full scan for exports and snapshot loads, in large batches"""
+    def build():
+        query = f"SELECT {', '.join(columns)} FROM ITEMMASTERDETAILS"
+        if order_by:
+            query += f" ORDER BY {', '.join(order_by)}"
+        return Statement(query, arraysize=arraysize, prefetchrows=arraysize)
+
+    return itemmaster_statements.get(('scan', columns, arraysize, order_by), build)
+
+
+def _encode_item_cursor(item_name, item_code, barcode) -> str:
+    """Encode the (ITEMNAME, ITEMCODE, BARCODE) seek key of the last row as an opaque token"""
+    raw = json.dumps([item_name, item_code, barcode], separators=(',', ':'), ensure_ascii=False)
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def _decode_item_cursor(token):
+    """Decode a token produced by _encode_item_cursor; raises ValueError if malformed.
+
+    Older two-part tokens decode with a NULL barcode, which seeks past every
+    row of that item, as they did before BARCODE was part of the key.
+    """
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        key = json.loads(base64.urlsafe_b64decode(padded).decode('utf-8'))
+        if len(key) == 2:
+            key.append(None)
+        item_name, item_code, barcode = key
+    except Exception as error:
+        raise ValueError('Invalid cursor token') from error
+    if item_code is None:
+        raise ValueError('Invalid cursor token')
+    return item_name, item_code, barcode
 
 
 @app.route('/api/itemmaster/details', methods=['GET'])
@@ -435,79 +1973,171 @@ def get_itemmaster_details():
     """Fetch catalog items from ITEMMASTERDETAILS view with optional filters."""
     fields_param = (request.args.get('fields') or '').strip()
     search_param = (request.args.get('search') or '').strip()
+    sort_param = (request.args.get('sort') or '').strip().lower()
+    columnar = (request.args.get('format') or '').strip().lower() == 'columnar'
     limit_param = request.args.get('limit', default=100, type=int)
     offset_param = request.args.get('offset', default=0, type=int)
 
-    selected_columns = []
-    if fields_param:
-        requested = [part.strip().upper() for part in fields_param.split(',')]
-        selected_columns = [
-            column for column in requested if column in ITEMMASTER_ALLOWED_COLUMNS
-        ]
-
-    if not selected_columns:
-        selected_columns = list(ITEMMASTER_DEFAULT_COLUMNS)
+    selected_columns = _parse_itemmaster_fields(fields_param)
+    filters = _parse_facet_filters()
 
     limit = max(1, min(limit_param or 100, 500))
     offset = max(0, offset_param or 0)
 
-    column_sql = ', '.join(selected_columns)
-    base_query = f"SELECT {column_sql}, ROW_NUMBER() OVER (ORDER BY ITEMNAME) AS RN FROM ITEMMASTERDETAILS"
+    # Keyset mode: `after` present (empty for the first page) switches from
+    # ROW_NUMBER offsets to seeking on (ITEMNAME, ITEMCODE, BARCODE).
+    keyset = 'after' in request.args
+    after = None
+    if keyset:
+        after_param = (request.args.get('after') or '').strip()
+        if after_param:
+            try:
+                after = _decode_item_cursor(after_param)
+            except ValueError as error:
+                return jsonify({
+                    'error': 'Bad request',
+                    'message': str(error)
+                }), 400
+
+    snapshot = _catalog_snapshot()
+    if snapshot is not None:
+        if _catalog_not_modified(snapshot):
+            return _not_modified()
+        candidates = None
+        total = None
+        if search_param:
+            if sort_param == 'relevance' and not keyset:
+                candidates, total = snapshot.search_ranked(search_param, offset + limit, filters)
+            else:
+                candidates = snapshot.filter_rows(filters, snapshot.search(search_param))
+        elif filters:
+            candidates = snapshot.filter_rows(filters)
+        if total is None:
+            total = len(candidates) if candidates is not None else snapshot.row_count
+        row_ids, next_key = snapshot.page_rows(
+            limit, offset=offset, after=after, candidates=candidates
+        )
+        overlay = _catalog_overlay()
+        if columnar:
+            data = snapshot.project_columns(row_ids, selected_columns, overlay)
+        else:
+            data = snapshot.project(row_ids, selected_columns, overlay)
+        response = {
+            'data': data,
+            'count': len(row_ids),
+            'total': total,
+            'limit': limit,
+            'fields': selected_columns,
+            'snapshot': _snapshot_info(snapshot),
+        }
+        if filters:
+            response['filters'] = filters
+        if keyset:
+            response['next_cursor'] = (
+                _encode_item_cursor(*next_key) if next_key is not None else None
+            )
+        else:
+            response['offset'] = offset
+        return _json_response(response)
+
+    # Identical pages requested together (e.g. every terminal's first page at
+    # opening) share one query; the key uses the canonical column list
+    key = (
+        'details', tuple(selected_columns), search_param.lower(), tuple(filters.items()),
+        columnar, limit, after if keyset else offset, keyset,
+    )
+    return _coalesced(key, lambda: _query_itemmaster_page(
+        selected_columns, search_param, filters, columnar, limit, offset, keyset, after
+    ))
 
-    params = {}
-    conditions = []
 
+def _query_itemmaster_page(selected_columns, search_param, filters, columnar, limit, offset,
+                           keyset, after):
+    """One offset or keyset page of ITEMMASTERDETAILS from Oracle.
+
+    Searched or filtered pages also carry an exact `total` (one COUNT query).
+    """
+    params = {}
     if search_param:
         params['search'] = f"%{search_param.lower()}%"
-        conditions.append(
-            "("
-            "LOWER(ITEMNAME) LIKE :search OR "
-            "LOWER(ITEMNAMEARA) LIKE :search OR "
-            "LOWER(BARCODE) LIKE :search"
-            ")"
-        )
-
-    if conditions:
-        base_query += " WHERE " + " AND ".join(conditions)
+    params.update(filters)
+    count_params = dict(params)
 
-    query = (
-        f"SELECT {column_sql} FROM ("
-        f"{base_query}"
-        ") WHERE RN > :offset AND RN <= :offset + :limit"
-    )
-    params['offset'] = offset
-    params['limit'] = limit
+    if keyset:
+        after_kind = None
+        if after is not None:
+            after_name, after_code, after_barcode = after
+            params['after_code'] = after_code
+            if after_name is not None:
+                params['after_name'] = after_name
+            if after_barcode is not None:
+                params['after_barcode'] = after_barcode
+            after_kind = (
+                'null_name' if after_name is None else 'name',
+                'null_barcode' if after_barcode is None else 'barcode',
+            )
+        statement = _itemmaster_page_statement(
+            tuple(selected_columns), bool(search_param), after_kind, tuple(filters)
+        )
+        params['fetch_rows'] = fetch_rows = limit + 1
+    else:
+        statement = _itemmaster_offset_statement(
+            tuple(selected_columns), bool(search_param), tuple(filters)
+        )
+        params['offset'] = offset
+        params['limit'] = fetch_rows = limit
 
     connection = None
     cursor = None
+    db_error = None
 
     try:
-        connection = get_db_connection()
+        connection = get_db_connection('catalog')
         cursor = connection.cursor()
-        cursor.execute(query, params)
+        statement.execute(cursor, params, rows=fetch_rows)
         rows = cursor.fetchall()
         column_names = [desc[0] for desc in cursor.description]
 
-        items = []
-        for row in rows:
-            item = {
-                column: _serialise_value(value)
-                for column, value in zip(column_names, row)
-            }
-            items.append(item)
+        next_cursor = None
+        if keyset:
+            if len(rows) > limit:
+                rows = rows[:limit]
+                last = dict(zip(column_names, rows[-1]))
+                next_cursor = _encode_item_cursor(
+                    _serialise_value(last['ITEMNAME']), _serialise_value(last['ITEMCODE']),
+                    _serialise_value(last['BARCODE']),
+                )
+            column_names = column_names[:len(selected_columns)]
 
-        return jsonify(
-            {
-                'data': items,
-                'count': len(items),
-                'limit': limit,
-                'offset': offset,
-                'fields': column_names,
-            }
-        ), 200
+        serialise = _row_serialiser(cursor.description, len(column_names))
+        if columnar:
+            data = _rows_to_columns(column_names, rows, serialise)
+        else:
+            data = _rows_to_items(column_names, rows, serialise)
+
+        response = {
+            'data': data,
+            'count': len(rows),
+            'limit': limit,
+            'fields': column_names,
+        }
+        if count_params:
+            _itemmaster_count_statement(bool(search_param), tuple(filters)).execute(
+                cursor, count_params
+            )
+            response['total'] = cursor.fetchone()[0]
+        if filters:
+            response['filters'] = filters
+        if keyset:
+            response['next_cursor'] = next_cursor
+        else:
+            response['offset'] = offset
+
+        return _json_response(response)
 
     except cx_Oracle.Error as error:
-        print(f"Database error when fetching itemmaster details: {error}")
+        db_error = error
+        logger.error("Database error when fetching itemmaster details: %s", error)
         return (
             jsonify(
                 {
@@ -517,8 +2147,10 @@ def get_itemmaster_details():
             ),
             500,
         )
+    except Rejected:
+        raise
     except Exception as error:
-        print(f"Unexpected error when fetching itemmaster details: {error}")
+        logger.exception("Unexpected error when fetching itemmaster details: %s", error)
         return (
             jsonify(
                 {
@@ -532,11 +2164,545 @@ def get_itemmaster_details():
         if cursor:
             cursor.close()
         if connection:
-            connection.close()
+            release_db_connection(connection, discard=_is_connection_lost(db_error))
+
+
+@app.route('/api/itemmaster/facets', methods=['GET'])
+def get_itemmaster_facets():
+    """Category/brand menu data: each facet's values, names and row counts.
+
+    Accepts the same search and facet filters as /details; each facet is
+    counted under the filters on the other facets. `total` is the exact
+    number of rows matching all of them.
+    """
+    facet_names = [facet for facet, _, _ in FACETS]
+    facets_param = (request.args.get('facets') or '').strip()
+    search_param = (request.args.get('search') or '').strip()
+    filters = _parse_facet_filters()
+
+    facets = facet_names
+    if facets_param:
+        requested = {part.strip().lower() for part in facets_param.split(',') if part.strip()}
+        unknown = sorted(requested.difference(facet_names))
+        if unknown:
+            return jsonify({
+                'error': 'Bad request',
+                'message': f"Unknown facets: {', '.join(unknown)} "
+                           f"(expected {', '.join(facet_names)})"
+            }), 400
+        facets = [facet for facet in facet_names if facet in requested]
+
+    snapshot = _catalog_snapshot()
+    if snapshot is not None:
+        if _catalog_not_modified(snapshot):
+            return _not_modified()
+        candidates = snapshot.search(search_param) if search_param else None
+        response = {
+            'facets': snapshot.facet_counts(facets, filters, candidates),
+            'total': len(snapshot.filter_rows(filters, candidates)),
+            'filters': filters,
+            'snapshot': _snapshot_info(snapshot),
+        }
+        return _json_response(response)
+
+    key = ('facets', tuple(facets), search_param.lower(), tuple(filters.items()))
+    return _coalesced(key, lambda: _query_itemmaster_facets(facets, search_param, filters))
+
+
+def _query_itemmaster_facets(facets, search_param, filters):
+    """GROUP BY per facet when no snapshot is loaded"""
+    params = {}
+    if search_param:
+        params['search'] = f"%{search_param.lower()}%"
+    params.update(filters)
+
+    connection = None
+    cursor = None
+    db_error = None
+
+    try:
+        connection = get_db_connection('catalog')
+        cursor = connection.cursor()
+        result = {}
+        for facet in facets:
+            others = tuple(name for name in filters if name != facet)
+            _itemmaster_facet_statement(facet, bool(search_param), others).execute(
+                cursor, {name: value for name, value in params.items() if name != facet}
+            )
+            result[facet] = [
+                {'code': str(_serialise_value(code)).strip(),
+                 'name': _serialise_value(name), 'count': count}
+                for code, name, count in cursor.fetchall()
+            ]
+
+        _itemmaster_count_statement(bool(search_param), tuple(filters)).execute(cursor, params)
+        total = cursor.fetchone()[0]
+        return _json_response({'facets': result, 'total': total, 'filters': filters})
+
+    except cx_Oracle.Error as error:
+        db_error = error
+        logger.error("Database error when counting itemmaster facets: %s", error)
+        return jsonify({
+            'error': 'Database error',
+            'message': str(error)
+        }), 500
+    finally:
+        if cursor:
+            cursor.close()
+        if connection:
+            release_db_connection(connection, discard=_is_connection_lost(db_error))
+
+
+def _lookup_itemmaster(key_column, code):
+    """Exact BARCODE/ITEMCODE lookup: snapshot hash index first, then Oracle"""
+    code = (code or '').strip()
+    selected_columns = _parse_itemmaster_fields((request.args.get('fields') or '').strip())
+
+    if not code:
+        return jsonify({
+            'error': 'Bad request',
+            'message': f'{key_column} is required'
+        }), 400
+
+    snapshot = _catalog_snapshot()
+    if snapshot is not None:
+        row_ids = snapshot.lookup(key_column, code)
+        if row_ids:
+            if _catalog_not_modified(snapshot):
+                return _not_modified()
+            items = snapshot.project(row_ids, selected_columns, _catalog_overlay())
+            return jsonify({
+                'found': True,
+                'data': items,
+                'count': len(items),
+                'fields': selected_columns,
+                'source': 'snapshot',
+                'snapshot': _snapshot_info(snapshot),
+            }), 200
+
+    # Index miss (or no snapshot): a single equality query on the key column
+    return _coalesced(
+        ('key', key_column, tuple(selected_columns), code),
+        lambda: _query_itemmaster_key(key_column, code, selected_columns),
+    )
+
+
+def _query_itemmaster_key(key_column, code, selected_columns):
+    """Exact BARCODE/ITEMCODE match from Oracle"""
+    statement = _itemmaster_key_statement(tuple(selected_columns), key_column)
+
+    connection = None
+    cursor = None
+    db_error = None
+
+    try:
+        connection = get_db_connection('catalog')
+        cursor = connection.cursor()
+        statement.execute(cursor, {'code': code})
+        rows = cursor.fetchall()
+        column_names = [desc[0] for desc in cursor.description]
+
+        items = _rows_to_items(column_names, rows, _row_serialiser(cursor.description))
+
+        if not items:
+            return jsonify({
+                'found': False,
+                'message': f'Item with {key_column} {code} not found'
+            }), 404
+
+        return jsonify({
+            'found': True,
+            'data': items,
+            'count': len(items),
+            'fields': column_names,
+            'source': 'db',
+        }), 200
+
+    except cx_Oracle.Error as error:
+        db_error = error
+        logger.error("Database error when looking up item by %s: %s", key_column, error)
+        return jsonify({
+            'error': 'Database error',
+            'message': str(error)
+        }), 500
+    finally:
+        if cursor:
+            cursor.close()
+        if connection:
+            release_db_connection(connection, discard=_is_connection_lost(db_error))
+
+
+def _requested_keys_by_value(keys):
+    """Index requested keys for mapping rows back: by text, and by number when numeric.
+
+    A NUMBER key column matches '00012' and '12.0' as 12, and the row then
+    carries 12, so numeric rows are matched on value rather than text.
+    """
+    by_text = {key: [key] for key in keys}
+    by_number = {}
+    for key in keys:
+        try:
+            number = decimal.Decimal(key)
+        except decimal.InvalidOperation:
+            continue
+        if number.is_finite():
+            by_number.setdefault(number, []).append(key)
+    return by_text, by_number
+
+
+def _fetch_items_by_keys(cursor, key_column, keys, selected_columns):
+    """Resolve `keys` against `key_column` with chunked IN-list queries.
+
+    Each chunk is padded to LOOKUP_CHUNK_SIZE binds with NULLs (which never
+    match) so every chunk reuses one SQL text. Returns {requested key: [items]}
+    for hits.
+    """
+    statement = _itemmaster_keys_statement(tuple(selected_columns), key_column)
+    key_pos = (
+        selected_columns.index(key_column) if key_column in selected_columns
+        else len(selected_columns)
+    )
+
+    found = {}
+    for start in range(0, len(keys), LOOKUP_CHUNK_SIZE):
+        chunk = keys[start:start + LOOKUP_CHUNK_SIZE]
+        by_text, by_number = _requested_keys_by_value(chunk)
+        params = {f"k{pos}": None for pos in range(LOOKUP_CHUNK_SIZE)}
+        params.update({f"k{pos}": key for pos, key in enumerate(chunk)})
+        statement.execute(cursor, params)
+        serialise = _row_serialiser(cursor.description, len(selected_columns))
+        for row in cursor.fetchall():
+            value = row[key_pos]
+            if isinstance(value, (int, float, decimal.Decimal)) and not isinstance(value, bool):
+                matched = by_number.get(decimal.Decimal(str(value)), ())
+            else:
+                matched = by_text.get(str(value).strip(), ())
+            item = dict(zip(selected_columns, serialise(row)))
+            for key in matched:
+                found.setdefault(key, []).append(item)
+    return found
+
+
+@app.route('/api/itemmaster/lookup', methods=['POST'])
+def lookup_itemmaster_batch():
+    """Resolve many item codes and/or barcodes in one call"""
+    payload = request.get_json(silent=True) or {}
+    if not isinstance(payload, dict):
+        return jsonify({
+            'error': 'Bad request',
+            'message': 'The request body must be a JSON object'
+        }), 400
+    fields_param = payload.get('fields') or request.args.get('fields') or ''
+    if isinstance(fields_param, list):
+        fields_param = ','.join(str(field) for field in fields_param)
+    elif not isinstance(fields_param, str):
+        return jsonify({
+            'error': 'Bad request',
+            'message': 'fields must be a comma-separated string or a list'
+        }), 400
+    selected_columns = _parse_itemmaster_fields(fields_param.strip())
+
+    requested = {}
+    for key_column, field in (('ITEMCODE', 'item_codes'), ('BARCODE', 'barcodes')):
+        values = payload.get(field) or []
+        if not isinstance(values, list):
+            return jsonify({
+                'error': 'Bad request',
+                'message': f'{field} must be a list'
+            }), 400
+        # De-duplicate while keeping the caller's order
+        keys = [str(value).strip() for value in values if value is not None]
+        requested[field] = (key_column, list(dict.fromkeys(key for key in keys if key)))
+
+    total_keys = sum(len(keys) for _, keys in requested.values())
+    if total_keys == 0:
+        return jsonify({
+            'error': 'Bad request',
+            'message': 'item_codes or barcodes is required'
+        }), 400
+    if total_keys > LOOKUP_MAX_KEYS:
+        return jsonify({
+            'error': 'Bad request',
+            'message': f'At most {LOOKUP_MAX_KEYS} keys can be looked up per request'
+        }), 400
+
+    results = {field: {} for field in requested}
+    pending = {}
+    snapshot = _catalog_snapshot()
+    overlay = _catalog_overlay() if snapshot is not None else None
+    for field, (key_column, keys) in requested.items():
+        if snapshot is None:
+            pending[field] = keys
+            continue
+        for key in keys:
+            row_ids = snapshot.lookup(key_column, key)
+            if row_ids:
+                results[field][key] = snapshot.project(row_ids, selected_columns, overlay)
+            else:
+                pending.setdefault(field, []).append(key)
+
+    if pending:
+        connection = None
+        cursor = None
+        db_error = None
+
+        try:
+            connection = get_db_connection('catalog')
+            cursor = connection.cursor()
+            for field, keys in pending.items():
+                key_column = requested[field][0]
+                results[field].update(
+                    _fetch_items_by_keys(cursor, key_column, keys, selected_columns)
+                )
+        except cx_Oracle.Error as error:
+            db_error = error
+            logger.error("Database error in batch item lookup: %s", error)
+            return jsonify({
+                'error': 'Database error',
+                'message': str(error)
+            }), 500
+        finally:
+            if cursor:
+                cursor.close()
+            if connection:
+                release_db_connection(connection, discard=_is_connection_lost(db_error))
+
+    data = {}
+    missing = {}
+    for field, (_, keys) in requested.items():
+        data[field] = {key: results[field].get(key) for key in keys}
+        missing[field] = [key for key in keys if key not in results[field]]
+
+    return _json_response({
+        'data': data,
+        'missing': missing,
+        'found': sum(len(found) for found in results.values()),
+        'requested': total_keys,
+        'fields': selected_columns,
+    })
+
+
+@app.route('/api/itemmaster/barcode/<path:barcode>', methods=['GET'])
+def get_item_by_barcode(barcode):
+    """Look up catalog items by exact barcode"""
+    return _lookup_itemmaster('BARCODE', barcode)
+
+
+@app.route('/api/itemmaster/itemcode/<path:item_code>', methods=['GET'])
+def get_item_by_itemcode(item_code):
+    """Look up catalog items by exact item code"""
+    return _lookup_itemmaster('ITEMCODE', item_code)
+
+
+def _ndjson_lines(items):
+    return ''.join(_encode_json(item) + '\n' for item in items)
+
+
+@app.route('/api/itemmaster/export', methods=['GET'])
+def export_itemmaster():
+    """Stream the whole catalog as NDJSON (one item per line) for offline sync"""
+    selected_columns = _parse_itemmaster_fields((request.args.get('fields') or '').strip())
+    headers = {'X-Catalog-Fields': ','.join(selected_columns)}
+
+    snapshot = _catalog_snapshot()
+    if snapshot is not None:
+        if _catalog_not_modified(snapshot):
+            return _not_modified()
+        overlay = _catalog_overlay()
+
+        def generate_from_snapshot():
+            for start in range(0, snapshot.row_count, EXPORT_ARRAYSIZE):
+                row_ids = range(start, min(start + EXPORT_ARRAYSIZE, snapshot.row_count))
+                yield _ndjson_lines(snapshot.project(row_ids, selected_columns, overlay))
+
+        headers['X-Catalog-Version'] = _catalog_state().version
+        return Response(
+            generate_from_snapshot(), mimetype='application/x-ndjson', headers=headers
+        )
+
+    statement = _itemmaster_scan_statement(tuple(selected_columns), EXPORT_ARRAYSIZE)
+    connection = None
+    cursor = None
+
+    try:
+        connection = get_db_connection('catalog')
+        cursor = connection.cursor()
+        statement.execute(cursor)
+    except cx_Oracle.Error as error:
+        logger.error("Database error when exporting itemmaster: %s", error)
+        if cursor:
+            cursor.close()
+        if connection:
+            release_db_connection(connection, discard=_is_connection_lost(error))
+        return jsonify({
+            'error': 'Database error',
+            'message': str(error)
+        }), 500
+
+    column_names = [desc[0] for desc in cursor.description]
+    serialise = _row_serialiser(cursor.description)
+
+    def generate_from_db():
+        # Owns the cursor and session until the last batch is sent or the
+        # client disconnects; only one fetch batch is ever held in memory.
+        db_error = None
+        try:
+            while True:
+                rows = cursor.fetchmany()
+                if not rows:
+                    break
+                yield _ndjson_lines(_rows_to_items(column_names, rows, serialise))
+        except cx_Oracle.Error as error:
+            db_error = error
+            logger.error("Database error while streaming itemmaster export: %s", error)
+            raise
+        finally:
+            cursor.close()
+            release_db_connection(connection, discard=_is_connection_lost(db_error))
+
+    return Response(generate_from_db(), mimetype='application/x-ndjson', headers=headers)
+
+
+@app.route('/api/itemmaster/changes', methods=['GET'])
+def get_itemmaster_changes():
+    """Items inserted, updated or removed since a catalog snapshot version"""
+    since = (request.args.get('since') or '').strip()
+    selected_columns = _parse_itemmaster_fields((request.args.get('fields') or '').strip())
+
+    if not since:
+        return jsonify({
+            'error': 'Bad request',
+            'message': 'since query parameter is required'
+        }), 400
+
+    state = _catalog_state()
+    if state is None:
+        return jsonify({
+            'error': 'Service unavailable',
+            'message': 'Catalog snapshot is not available'
+        }), 503
+
+    if since == state.version:
+        changes = ([], [], [])
+    else:
+        changes = catalog_store.changes_since(since, state)
+
+    if changes is None:
+        # Unknown or expired version: the terminal must do a full export
+        return jsonify({
+            'error': 'Version expired',
+            'message': f'Catalog version {since} is no longer available; run a full sync',
+            'version': state.version,
+        }), 410
+
+    inserted, updated, removed = changes
+    snapshot, overlay = state.snapshot, state.overlay
+    if _catalog_not_modified(snapshot):
+        return _not_modified()
+    return _json_response({
+        'since': since,
+        'version': state.version,
+        'snapshot': _snapshot_info(snapshot),
+        'fields': selected_columns,
+        'inserted': snapshot.project(snapshot.item_rows(inserted), selected_columns, overlay),
+        'updated': snapshot.project(snapshot.item_rows(updated), selected_columns, overlay),
+        'removed': removed,
+        'count': len(inserted) + len(updated) + len(removed),
+    })
+
+
+@app.route('/api/itemmaster/snapshot', methods=['GET'])
+def get_itemmaster_snapshot_status():
+    """Report the state of the in-memory catalog snapshot"""
+    status = catalog_store.status()
+    status['enabled'] = CATALOG_SNAPSHOT_ENABLED
+    status['file'] = catalog_files.status() if CATALOG_FILE_ENABLED else None
+    return jsonify(status), 200
+
+
+@app.route('/api/itemmaster/snapshot/file', methods=['GET'])
+def get_itemmaster_snapshot_file():
+    """Binary catalog file (catalog_file.py) with Range support for resumable downloads.
+
+    The ETag is the file's SHA-256, so `If-None-Match` skips an unchanged
+    file and `If-Range` keeps a resumed download from mixing two versions.
+    The body goes out through the server's wsgi.file_wrapper where it has one.
+    The file holds the snapshot as loaded; stock and prices that moved since
+    come from /api/itemmaster/changes?since=<X-Catalog-Version>.
+    """
+    catalog_file = catalog_files.current if CATALOG_FILE_ENABLED else None
+    handle = None
+    if catalog_file is not None and _catalog_snapshot() is not None:
+        try:
+            handle = open(catalog_file.path, 'rb')
+        except FileNotFoundError:
+            # Pruned by another worker; the next refresh writes it again
+            logger.warning("Catalog file %s is missing", catalog_file.path)
+    if handle is None:
+        response = jsonify({
+            'error': 'Service unavailable',
+            'message': 'The catalog file is not available yet',
+            'enabled': CATALOG_SNAPSHOT_ENABLED and CATALOG_FILE_ENABLED,
+        })
+        response.status_code = 503
+        response.headers['Retry-After'] = '5'
+        return response
+
+    # No Last-Modified is sent, so only a strong ETag in If-Range resumes a
+    # download; a date, weak or stale validator gets the whole file
+    environ = request.environ
+    if 'HTTP_RANGE' in environ and 'HTTP_IF_RANGE' in environ:
+        if_range = environ['HTTP_IF_RANGE'].strip()
+        if if_range != f'"{catalog_file.checksum}"':
+            environ = {key: value for key, value in environ.items() if key != 'HTTP_RANGE'}
+
+    response = Response(
+        wrap_file(environ, handle),
+        mimetype='application/octet-stream',
+        direct_passthrough=True,
+    )
+    response.content_length = catalog_file.size
+    response.set_etag(catalog_file.checksum)
+    response.headers['X-Catalog-Version'] = catalog_file.version
+    response.headers['X-Catalog-Checksum'] = f'sha256={catalog_file.checksum}'
+    response.headers['Cache-Control'] = 'no-cache'
+    try:
+        return response.make_conditional(
+            environ, accept_ranges=True, complete_length=catalog_file.size
+        )
+    except RequestedRangeNotSatisfiable:
+        response.close()
+        return Response(status=416, headers={
+            'Accept-Ranges': 'bytes',
+            'Content-Range': f'bytes */{catalog_file.size}',
+            'ETag': f'"{catalog_file.checksum}"',
+        })
+
+
+def init_worker():
+    """Per-process start-up for pre-forked workers (see serve.py)"""
+    request_log.pipeline.start()
+    reset_db_pool_after_fork()
+    db_router.start()
+    if LOOKUP_CACHE_WARMUP:
+        warm_lookup_caches()
+    if CATALOG_SNAPSHOT_ENABLED:
+        catalog_store.start()
+
+
+def shutdown_worker():
+    """Stop background work and close pooled sessions once requests have drained"""
+    catalog_store.stop()
+    db_router.stop()
+    close_db_pool()
+    request_log.pipeline.stop()
 
 
 if __name__ == '__main__':
-    # Run the Flask server
+    if LOOKUP_CACHE_WARMUP:
+        warm_lookup_caches()
+
+    # Development server only; production runs via `python serve.py server`
     # Change host and port as needed
     app.run(host='0.0.0.0', port=5010, debug=True)
 
@@ -0,0 +1,82 @@
+"""Single-flight execution for identical concurrent requests.
+
+When a store opens, many terminals ask for the same first catalog page, the
+same location and the same users at once. SingleFlight lets the first
+request for a key (the leader) run the query while identical requests that
+arrive before it finishes (followers) wait and reuse its result, so Oracle
+sees one execution instead of dozens. Nothing is kept after the leader
+finishes; caching stays the job of TTLCache and the catalog snapshot.
+"""
+import threading
+
+
+class _Call:
+    __slots__ = ('done', 'value', 'error', 'followers')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+        self.followers = 0
+
+
+class SingleFlight:
+    """Runs `fn` once per key among concurrent callers.
+
+    A follower that waits longer than `wait_timeout` seconds gives up on the
+    leader and runs `fn` itself, so one stuck query cannot hold every
+    identical request hostage.
+    """
+
+    def __init__(self, wait_timeout=30.0):
+        self.wait_timeout = wait_timeout
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._stats = {'leaders': 0, 'coalesced': 0, 'timeouts': 0, 'errors': 0}
+
+    def do(self, key, fn):
+        """Return (value, shared); `shared` is True when another caller ran `fn`.
+
+        Exceptions raised by the leader's `fn` are re-raised in its followers.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = self._calls[key] = _Call()
+                self._stats['leaders'] += 1
+                leader = True
+            else:
+                call.followers += 1
+                leader = False
+
+        if not leader:
+            if not call.done.wait(self.wait_timeout):
+                with self._lock:
+                    self._stats['timeouts'] += 1
+                return fn(), False
+            with self._lock:
+                self._stats['coalesced'] += 1
+            if call.error is not None:
+                raise call.error
+            return call.value, True
+
+        try:
+            call.value = fn()
+        except BaseException as error:
+            call.error = error
+            with self._lock:
+                self._stats['errors'] += 1
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.value, False
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['in_flight'] = len(self._calls)
+            stats['waiting'] = sum(call.followers for call in self._calls.values())
+        stats['wait_timeout'] = self.wait_timeout
+        return stats
@@ -0,0 +1,77 @@
+"""Registry of canonical SQL statements with per-statement fetch tuning.
+
+Oracle caches parsed statements by exact SQL text, both in the shared pool
+and in each session's client statement cache (`stmtcachesize`). server.py
+builds each query shape once, from a canonical key (columns in a stable
+order, no duplicates), so equivalent requests produce byte-identical SQL and
+every pooled session re-executes its cached cursor instead of parsing again.
+"""
+from collections import OrderedDict
+import threading
+
+
+class Statement:
+    """One SQL text plus the fetch sizes that suit its result shape.
+
+    `arraysize` is the rows fetched per round trip; `prefetchrows` the rows
+    returned with the execute call itself. For queries of a known small size
+    prefetching one more row than expected saves the end-of-fetch round trip.
+    """
+    __slots__ = ('sql', 'arraysize', 'prefetchrows')
+
+    def __init__(self, sql, arraysize=100, prefetchrows=2):
+        self.sql = sql
+        self.arraysize = arraysize
+        self.prefetchrows = prefetchrows
+
+    def execute(self, cursor, params=None, rows=None):
+        """Execute on `cursor`; `rows` sizes the fetch for an expected row count"""
+        if rows is not None:
+            cursor.arraysize = max(1, rows)
+            cursor.prefetchrows = rows + 1
+        else:
+            cursor.arraysize = self.arraysize
+            cursor.prefetchrows = self.prefetchrows
+        if params is None:
+            return cursor.execute(self.sql)
+        return cursor.execute(self.sql, params)
+
+
+class StatementRegistry:
+    """Bounded LRU of Statements keyed by their canonical shape.
+
+    `get(key, build)` returns the registered Statement for `key`, calling
+    `build()` only the first time. The size bound keeps arbitrary `fields`
+    combinations from growing it without limit.
+    """
+
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self._statements = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'builds': 0, 'evictions': 0}
+
+    def get(self, key, build):
+        with self._lock:
+            statement = self._statements.get(key)
+            if statement is not None:
+                self._statements.move_to_end(key)
+                self._stats['hits'] += 1
+                return statement
+
+        statement = build()
+        with self._lock:
+            self._statements.setdefault(key, statement)
+            self._statements.move_to_end(key)
+            self._stats['builds'] += 1
+            while len(self._statements) > self.maxsize:
+                self._statements.popitem(last=False)
+                self._stats['evictions'] += 1
+            return self._statements[key]
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = len(self._statements)
+        stats['maxsize'] = self.maxsize
+        return stats
@@ -0,0 +1,71 @@
+"""Shared setup for the Python API tests (the PHP suite lives in tests/Unit and tests/Feature)"""
+import os
+import sqlite3
+import sys
+import time
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path[:0] = [ROOT, os.path.join(ROOT, 'benchmarks')]
+
+# A second unit row (a carton) for this item: same ITEMCODE and ITEMNAME
+CARTON_ITEM = 'I0000003'
+CARTON_BARCODE = 'CARTON-1'
+CARTON_PRICE = 999
+
+
+@pytest.fixture(scope='session')
+def database(tmp_path_factory):
+    import fake_oracle
+
+    path = str(tmp_path_factory.mktemp('oracle') / 'catalog.sqlite')
+    fake_oracle.seed(path, 30, users=5, locations=5, devices=5)
+    db = sqlite3.connect(path)
+    try:
+        columns = [row[1] for row in db.execute('PRAGMA table_info(ITEMMASTERDETAILS)')]
+        row = list(db.execute(
+            'SELECT * FROM ITEMMASTERDETAILS WHERE ITEMCODE = ?', (CARTON_ITEM,)
+        ).fetchone())
+        row[columns.index('BARCODE')] = CARTON_BARCODE
+        row[columns.index('UNIT')] = 'CTN'
+        row[columns.index('RETAILPRICE')] = CARTON_PRICE
+        db.execute(
+            f"INSERT INTO ITEMMASTERDETAILS VALUES ({', '.join('?' * len(columns))})", row
+        )
+        db.commit()
+    finally:
+        db.close()
+    fake_oracle.install(path, latency_ms=0, jitter_ms=0, parse_ms=0)
+    return path
+
+
+@pytest.fixture(scope='session')
+def server(database, tmp_path_factory):
+    """server.py on the fake Oracle with the snapshot and stock overlay loaded"""
+    os.environ.update({
+        'ACCESS_LOG': '0',
+        'ADMISSION_CONTROL': '0',
+        'CATALOG_SNAPSHOT': '1',
+        'CATALOG_OVERLAY_SECONDS': '3600',
+        'CATALOG_FILE_DIR': str(tmp_path_factory.mktemp('catalog-files')),
+    })
+    import server as module
+
+    module.catalog_store.refresh()
+    # The overlay only applies when loaded after the snapshot
+    time.sleep(0.01)
+    module.catalog_store.refresh_overlay()
+    module.catalog_store.start()
+    return module
+
+
+@pytest.fixture
+def client(server):
+    return server.app.test_client()
+
+
+@pytest.fixture
+def db_only(server, monkeypatch):
+    """Serve catalog requests from Oracle rather than the snapshot"""
+    monkeypatch.setattr(server, 'CATALOG_SNAPSHOT_ENABLED', False)
@@ -0,0 +1,107 @@
+import threading
+
+import pytest
+
+import admission
+from admission import DBGate, RateLimiter, Rejected, parse_rates, route_class
+
+
+class Clock:
+    def __init__(self):
+        self.now = 50.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(admission, 'time', clock)
+    return clock
+
+
+def test_route_class():
+    assert route_class('/api/itemmaster/details') == 'catalog'
+    assert route_class('/api/rpos-login/status') == 'status'
+    assert route_class('/api/rpos-login') == 'login'
+    assert route_class('/api/users') == 'default'
+
+
+def test_parse_rates_overrides_defaults():
+    rates = parse_rates('catalog=5:20, status=:3,new=1', {'catalog': (10.0, 40), 'status': (2.0, 10),
+                                                        'default': (10.0, 40)})
+    assert rates['catalog'] == (5.0, 20)
+    assert rates['status'] == (2.0, 3)
+    assert rates['new'] == (1.0, 40)
+
+
+def test_bucket_allows_the_burst_then_refills(clock):
+    limiter = RateLimiter({'status': (2.0, 3), 'default': (10.0, 40)})
+    for _ in range(3):
+        limiter.check('device:a', 'status')
+    with pytest.raises(Rejected) as rejected:
+        limiter.check('device:a', 'status')
+    assert rejected.value.reason == 'rate_limited'
+    assert rejected.value.retry_after == 1
+
+    # Other clients and other route classes have their own buckets
+    limiter.check('device:b', 'status')
+    limiter.check('device:a', 'catalog')
+
+    clock.now += 0.5
+    limiter.check('device:a', 'status')
+    with pytest.raises(Rejected):
+        limiter.check('device:a', 'status')
+    stats = limiter.stats()
+    assert (stats['allowed'], stats['limited'], stats['clients']) == (6, 2, 3)
+
+
+def test_scale_multiplies_rate_and_burst(clock):
+    limiter = RateLimiter({'default': (1.0, 2)})
+    for _ in range(40):
+        limiter.check('ip:10.0.0.1', 'default', 20)
+    with pytest.raises(Rejected):
+        limiter.check('ip:10.0.0.1', 'default', 20)
+    clock.now += 0.1
+    limiter.check('ip:10.0.0.1', 'default', 20)
+
+
+def test_buckets_are_bounded(clock):
+    limiter = RateLimiter({'default': (1.0, 1)}, max_clients=2)
+    for client in ('a', 'b', 'c'):
+        limiter.check(client, 'default')
+    stats = limiter.stats()
+    assert (stats['clients'], stats['evictions']) == (2, 1)
+    # 'a' was evicted, so it starts again with a full bucket
+    limiter.check('a', 'default')
+
+
+def test_db_gate_rejects_when_every_slot_is_busy():
+    gate = DBGate(1, retry_after=2)
+    gate.acquire(0.01, 'catalog')
+    with pytest.raises(Rejected) as rejected:
+        gate.acquire(0.01, 'catalog')
+    assert (rejected.value.reason, rejected.value.retry_after) == ('db_busy', 2)
+
+    released = threading.Timer(0.05, gate.release)
+    released.start()
+    gate.acquire(5, 'catalog')
+    gate.release()
+    stats = gate.stats()
+    assert (stats['admitted'], stats['rejected'], stats['peak'], stats['active']) == (2, 1, 1, 0)
+
+
+def test_address_clients_get_the_scaled_bucket(server, client, monkeypatch):
+    monkeypatch.setattr(server, 'ADMISSION_ENABLED', True)
+    monkeypatch.setattr(server, 'ADMISSION_ADDRESS_FACTOR', 3)
+    monkeypatch.setattr(server, 'rate_limiter', RateLimiter({'default': (0.001, 2)}))
+
+    device = [client.get('/api/user/1', headers={'X-Device-ID': 'till-1'}).status_code
+              for _ in range(3)]
+    assert device[-1] == 429
+    assert 429 not in device[:2]
+
+    address = [client.get('/api/user/1').status_code for _ in range(7)]
+    assert address[-1] == 429
+    assert 429 not in address[:6]
@@ -0,0 +1,149 @@
+import hashlib
+import os
+
+import pytest
+
+from catalog import CatalogSnapshot
+from catalog_file import CatalogFileStore, read_rows, write_catalog_file
+
+COLUMNS = ['ITEMCODE', 'ITEMNAME', 'ITEMNAMEARA', 'BARCODE', 'RETAILPRICE', 'CURRENTSTOCK']
+ROWS = [
+    ('I1', 'Water', 'ماء', '6291', 1.5, 100),
+    ('I1', 'Water', 'ماء', '6292', 15.0, None),
+    ('I2', 'Juice', None, None, None, -3),
+    ('I3', None, 'عصير', '6290', 2.25, 2 ** 40),
+]
+FILE_PATH = '/api/itemmaster/snapshot/file'
+
+
+def test_write_then_read_round_trip(tmp_path):
+    snapshot = CatalogSnapshot(COLUMNS, ROWS, loaded_at=0)
+    path = tmp_path / 'catalog.bin'
+    checksum = write_catalog_file(str(path), snapshot)
+    data = path.read_bytes()
+    assert checksum == hashlib.sha256(data).hexdigest()
+
+    names, rows = read_rows(data)
+    assert names == list(snapshot.column_names)
+    assert rows == [
+        tuple(snapshot.columns[name][row_id] for name in names)
+        for row_id in range(snapshot.row_count)
+    ]
+    assert not list(tmp_path.glob('*.tmp'))
+
+
+def test_store_reuses_the_file_for_a_version(tmp_path):
+    files = CatalogFileStore(str(tmp_path), keep=1)
+    snapshot = CatalogSnapshot(COLUMNS, ROWS, loaded_at=0)
+    first = files.publish(snapshot)
+    assert first.size == (tmp_path / f'catalog-{snapshot.version}.bin').stat().st_size
+    assert CatalogFileStore(str(tmp_path)).publish(snapshot).checksum == first.checksum
+
+    # Pruning keeps the newest files by mtime
+    os.utime(first.path, (0, 0))
+    changed = CatalogSnapshot(COLUMNS, ROWS[:2], loaded_at=0)
+    second = files.publish(changed)
+    assert second.version != first.version
+    assert sorted(path.name for path in tmp_path.iterdir()) == [
+        f'catalog-{changed.version}.bin', f'catalog-{changed.version}.bin.sha256',
+    ]
+
+
+
+def test_store_never_prunes_a_file_another_worker_serves(tmp_path):
+    ours = CatalogFileStore(str(tmp_path), keep=1, grace=60)
+    theirs = CatalogFileStore(str(tmp_path), keep=1, grace=60)
+    served = theirs.publish(CatalogSnapshot(COLUMNS, ROWS, loaded_at=0))
+    os.utime(served.path, (0, 0))
+
+    # Their next refresh finds the version unchanged and touches the file
+    assert theirs.publish(CatalogSnapshot(COLUMNS, ROWS, loaded_at=0)) is served
+    for count in (3, 2, 1):
+        ours.publish(CatalogSnapshot(COLUMNS, ROWS[:count], loaded_at=0))
+    assert os.path.exists(served.path)
+
+    # Once nobody has published it within the grace period it goes
+    os.utime(served.path, (0, 0))
+    latest = ours.publish(CatalogSnapshot(COLUMNS, ROWS[:1] * 2, loaded_at=0))
+    assert not os.path.exists(served.path)
+
+    # A store whose file was removed writes it again on the next refresh
+    os.remove(latest.path)
+    assert ours.publish(CatalogSnapshot(COLUMNS, ROWS[:1] * 2, loaded_at=0)).checksum == latest.checksum
+    assert os.path.exists(latest.path)
+
+
+@pytest.fixture
+def catalog_file(server):
+    current = server.catalog_files.current
+    assert current is not None
+    return current
+
+
+def test_get_and_head_carry_the_file_checksum(client, catalog_file):
+    got = client.get(FILE_PATH)
+    assert got.status_code == 200
+    body = got.get_data()
+    assert len(body) == catalog_file.size
+    assert got.headers['ETag'] == f'"{hashlib.sha256(body).hexdigest()}"'
+    assert 'Last-Modified' not in got.headers
+
+    head = client.head(FILE_PATH)
+    assert head.status_code == 200
+    assert head.headers['ETag'] == got.headers['ETag']
+    assert head.headers['Content-Length'] == str(catalog_file.size)
+    assert head.headers['X-Catalog-Version'] == catalog_file.version
+    got.close()
+    head.close()
+
+
+def test_conditional_and_range_requests(client, catalog_file):
+    etag = f'"{catalog_file.checksum}"'
+    with open(catalog_file.path, 'rb') as handle:
+        data = handle.read()
+
+    response = client.get(FILE_PATH, headers={'If-None-Match': etag})
+    assert response.status_code == 304
+
+    response = client.get(FILE_PATH, headers={'Range': 'bytes=100-199'})
+    assert response.status_code == 206
+    assert response.headers['Content-Range'] == f'bytes 100-199/{len(data)}'
+    assert response.get_data() == data[100:200]
+    response.close()
+
+    response = client.get(FILE_PATH, headers={'Range': f'bytes={len(data) + 10}-'})
+    assert response.status_code == 416
+    assert response.headers['Content-Range'] == f'bytes */{len(data)}'
+
+
+@pytest.mark.parametrize('if_range, resumed', [
+    ('strong', True),
+    ('weak', False),
+    ('"stale"', False),
+    ('Sat, 17 Oct 2026 00:00:00 GMT', False),
+])
+def test_if_range_resumes_only_on_a_strong_etag_match(client, catalog_file, if_range, resumed):
+    if_range = {
+        'strong': f'"{catalog_file.checksum}"',
+        'weak': f'W/"{catalog_file.checksum}"',
+    }.get(if_range, if_range)
+    response = client.get(FILE_PATH, headers={'Range': 'bytes=10-19', 'If-Range': if_range})
+    if resumed:
+        assert response.status_code == 206
+        assert len(response.get_data()) == 10
+    else:
+        assert response.status_code == 200
+        assert len(response.get_data()) == catalog_file.size
+    response.close()
+
+
+def test_missing_file_is_unavailable_until_republished(server, client, catalog_file):
+    os.remove(catalog_file.path)
+    try:
+        response = client.get(FILE_PATH)
+        assert response.status_code == 503
+        assert response.headers['Retry-After'] == '5'
+    finally:
+        with server.app.app_context():
+            server.catalog_files.publish(server._catalog_snapshot())
+    assert client.get(FILE_PATH).status_code == 200
@@ -0,0 +1,185 @@
+import pytest
+
+from catalog import CatalogSnapshot, CatalogStore, StockOverlay
+from conftest import CARTON_BARCODE, CARTON_ITEM, CARTON_PRICE
+
+COLUMNS = ['ITEMCODE', 'ITEMNAME', 'BARCODE', 'RETAILPRICE', 'CURRENTSTOCK']
+OVERLAY_COLUMNS = ['ITEMCODE', 'BARCODE', 'RETAILPRICE', 'CURRENTSTOCK']
+
+
+class Catalog:
+    """Loaders for a CatalogStore over mutable in-memory rows"""
+
+    def __init__(self):
+        self.rows = [
+            ('I1', 'Water', 'PIECE-1', 1.5, 100),
+            ('I1', 'Water', 'CARTON-1', 15.0, 10),
+            ('I2', 'Juice', 'PIECE-2', 4.0, 50),
+        ]
+
+    def load(self):
+        return COLUMNS, list(self.rows)
+
+    def load_overlay(self):
+        rows = sorted((code, barcode, price, stock) for code, _, barcode, price, stock in self.rows)
+        return OVERLAY_COLUMNS, rows
+
+    def update(self, barcode, price=None, stock=None):
+        self.rows = [
+            (code, name, bc, price if bc == barcode and price is not None else old_price,
+             stock if bc == barcode and stock is not None else old_stock)
+            for code, name, bc, old_price, old_stock in self.rows
+        ]
+
+
+@pytest.fixture
+def catalog():
+    return Catalog()
+
+
+@pytest.fixture
+def store(catalog):
+    store = CatalogStore(catalog.load, overlay_loader=catalog.load_overlay)
+    store.refresh()
+    store.refresh_overlay()
+    return store
+
+
+def prices(snapshot, overlay, code):
+    return {
+        row['BARCODE']: row['RETAILPRICE']
+        for row in snapshot.project(snapshot.lookup('ITEMCODE', code),
+                                    ['BARCODE', 'RETAILPRICE'], overlay)
+    }
+
+
+def test_overlay_rows_must_start_with_the_row_key():
+    with pytest.raises(ValueError):
+        StockOverlay(['ITEMCODE', 'RETAILPRICE'], [])
+
+
+def test_overlay_keeps_a_price_per_unit_row(catalog):
+    snapshot = CatalogSnapshot(*catalog.load(), loaded_at=0)
+    catalog.update('CARTON-1', price=16.0)
+    overlay = StockOverlay(*catalog.load_overlay())
+    assert prices(snapshot, overlay, 'I1') == {'PIECE-1': 1.5, 'CARTON-1': 16.0}
+    columns = snapshot.project_columns(snapshot.lookup('ITEMCODE', 'I1'), ['RETAILPRICE'], overlay)
+    assert sorted(columns['RETAILPRICE']) == [1.5, 16.0]
+
+
+def test_overlay_equal_to_the_snapshot_keeps_its_version(store):
+    state = store.state
+    assert state.overlay is not None
+    assert state.changed == {}
+    assert state.version == store.snapshot.version
+
+
+def test_price_change_moves_the_version_and_shows_in_changes(catalog, store):
+    before = store.state.version
+    catalog.update('CARTON-1', price=16.0)
+    store.refresh_overlay()
+    state = store.state
+    assert state.version != before
+    assert list(state.changed) == ['I1']
+    assert store.changes_since(before) == ([], ['I1'], [])
+    assert store.changes_since(state.version) == ([], [], [])
+
+    catalog.update('PIECE-2', stock=49)
+    store.refresh_overlay()
+    assert store.changes_since(before) == ([], ['I1', 'I2'], [])
+    assert store.changes_since(state.version) == ([], ['I2'], [])
+
+    # Back to the snapshot's values: back to the snapshot's version
+    catalog.update('CARTON-1', price=15.0)
+    catalog.update('PIECE-2', stock=50)
+    store.refresh_overlay()
+    assert store.state.version == before
+    assert store.changes_since(state.version) == ([], ['I1'], [])
+
+
+def test_changes_since_the_snapshot_version_after_a_reload(catalog, store):
+    file_version = store.snapshot.version
+    catalog.update('PIECE-2', price=4.5)
+    store.refresh_overlay()
+    catalog.rows.append(('I3', 'Milk', 'PIECE-3', 2.0, 5))
+    catalog.rows = [row for row in catalog.rows if row[0] != 'I1']
+    store.refresh()
+    store.refresh_overlay()
+    assert store.state.snapshot.version != file_version
+    assert store.changes_since(file_version) == (['I3'], ['I2'], ['I1'])
+    assert store.changes_since('unknown') is None
+
+
+def test_history_is_bounded(catalog):
+    store = CatalogStore(catalog.load, history_size=3, overlay_loader=catalog.load_overlay)
+    store.refresh()
+    store.refresh_overlay()
+    first = store.state.version
+    for stock in range(1, 5):
+        catalog.update('PIECE-2', stock=stock)
+        store.refresh_overlay()
+    assert len(store.status()['history']) == 3
+    # The snapshot's own version stays usable as a sync point
+    assert store.changes_since(first) == ([], ['I2'], [])
+    assert store.changes_since(list(store.status()['history'])[0]) is not None
+
+
+def test_carton_lookup_serves_its_own_overlay_price(server, client, database):
+    import sqlite3
+
+    def served():
+        response = client.get(f'/api/itemmaster/barcode/{CARTON_BARCODE}?fields=BARCODE,RETAILPRICE')
+        return [item['RETAILPRICE'] for item in response.get_json()['data']]
+
+    assert server.catalog_store.overlay is not None
+    assert served() == [CARTON_PRICE]
+    before = server.catalog_store.state.version
+    db = sqlite3.connect(database)
+    try:
+        db.execute('UPDATE ITEMMASTERDETAILS SET RETAILPRICE = 1234 WHERE BARCODE = ?',
+                   (CARTON_BARCODE,))
+        db.commit()
+        server.catalog_store.refresh_overlay()
+        assert served() == [1234]
+        changes = client.get(
+            f'/api/itemmaster/changes?since={before}&fields=ITEMCODE,BARCODE,RETAILPRICE'
+        ).get_json()
+        assert changes['version'] != before
+        assert {item['ITEMCODE'] for item in changes['updated']} == {CARTON_ITEM}
+        assert {'BARCODE': CARTON_BARCODE, 'ITEMCODE': CARTON_ITEM,
+                'RETAILPRICE': 1234} in changes['updated']
+    finally:
+        db.execute('UPDATE ITEMMASTERDETAILS SET RETAILPRICE = ? WHERE BARCODE = ?',
+                   (CARTON_PRICE, CARTON_BARCODE))
+        db.commit()
+        db.close()
+        server.catalog_store.refresh_overlay()
+
+
+def test_changes_endpoint_expired_and_unavailable(server, client, catalog, monkeypatch):
+    store = CatalogStore(catalog.load, history_size=1, overlay_loader=catalog.load_overlay)
+    store.refresh()
+    catalog.update('PIECE-2', stock=1)
+    store.refresh_overlay()
+    evicted = store.state.version
+    catalog.update('PIECE-2', stock=2)
+    store.refresh_overlay()
+    # No refresher threads: a reload would reset the overlay under the test
+    monkeypatch.setattr(store, 'start', lambda: None)
+    monkeypatch.setattr(server, 'catalog_store', store)
+
+    # One version of history: the first overlay version has been dropped
+    response = client.get(f'/api/itemmaster/changes?since={evicted}&fields=ITEMCODE,CURRENTSTOCK')
+    assert response.status_code == 410
+    assert response.get_json()['version'] == store.state.version
+
+    # The snapshot's own version is still retained
+    response = client.get(
+        f'/api/itemmaster/changes?since={store.snapshot.version}&fields=ITEMCODE,CURRENTSTOCK'
+    )
+    assert response.status_code == 200
+    assert response.get_json()['updated'] == [{'ITEMCODE': 'I2', 'CURRENTSTOCK': 2}]
+
+    monkeypatch.setattr(server, 'CATALOG_SNAPSHOT_ENABLED', False)
+    response = client.get(f'/api/itemmaster/changes?since={store.state.version}')
+    assert response.status_code == 503
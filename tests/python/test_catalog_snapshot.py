@@ -0,0 +1,147 @@
+import gzip
+import json
+
+import pytest
+
+from catalog import CatalogSnapshot
+
+COLUMNS = ['ITEMCODE', 'ITEMNAME', 'BARCODE', 'CATEGORYCODE', 'CATEGORYNAME']
+
+
+def make_snapshot(rows, previous=None):
+    return CatalogSnapshot(COLUMNS, rows, loaded_at=0, previous=previous)
+
+
+def catalog_rows():
+    return [
+        ('I3', 'Cola', '300', 'C2', 'Drinks'),
+        ('I1', 'Apple', '100', 'C1', 'Fruit'),
+        ('I2', 'Banana', '200', 'C1', 'Fruit'),
+        ('I4', None, '400', None, None),
+        ('I5', 'Apple', '500', 'C1', 'Fruit'),
+    ]
+
+
+def walk(snapshot, limit, candidates=None):
+    """Every row id reached by following next_key from the first keyset page"""
+    seen = []
+    row_ids, after = snapshot.page_rows(limit, candidates=candidates)
+    seen.extend(row_ids)
+    while after is not None:
+        row_ids, after = snapshot.page_rows(limit, after=after, candidates=candidates)
+        seen.extend(row_ids)
+    return seen
+
+
+def test_rows_are_ordered_by_name_then_code_with_nulls_last():
+    snapshot = make_snapshot(catalog_rows())
+    assert snapshot.columns['ITEMCODE'] == ('I1', 'I5', 'I2', 'I3', 'I4')
+    assert snapshot.row_count == 5
+
+
+def test_offset_paging():
+    snapshot = make_snapshot(catalog_rows())
+    row_ids, next_key = snapshot.page_rows(2, offset=2)
+    assert list(row_ids) == [2, 3]
+    assert next_key == ('Cola', 'I3', '300')
+
+    row_ids, next_key = snapshot.page_rows(2, offset=4)
+    assert list(row_ids) == [4]
+    assert next_key is None
+
+
+def test_first_keyset_page_returns_a_cursor():
+    snapshot = make_snapshot(catalog_rows())
+    row_ids, next_key = snapshot.page_rows(2)
+    assert list(row_ids) == [0, 1]
+    assert next_key == ('Apple', 'I5', '500')
+
+
+def test_keyset_walk_visits_every_row_once():
+    snapshot = make_snapshot(catalog_rows())
+    for limit in (1, 2, 3, 5, 10):
+        assert walk(snapshot, limit) == list(range(snapshot.row_count))
+
+
+def test_keyset_walk_keeps_every_unit_row_of_an_item():
+    # A piece and its carton share ITEMNAME and ITEMCODE; BARCODE breaks the tie
+    rows = [
+        ('I1', 'Water', '6291', None, None),
+        ('I1', 'Water', '6292', None, None),
+        ('I1', 'Water', None, None, None),
+        ('I2', 'Water', '6290', None, None),
+    ]
+    snapshot = make_snapshot(rows)
+    assert snapshot.columns['BARCODE'] == ('6291', '6292', None, '6290')
+    for limit in (1, 2, 3):
+        assert walk(snapshot, limit) == [0, 1, 2, 3]
+
+
+def test_keyset_paging_within_candidates():
+    snapshot = make_snapshot(catalog_rows())
+    candidates = [0, 2, 4]
+    row_ids, after = snapshot.page_rows(2, candidates=candidates)
+    assert list(row_ids) == [0, 2]
+    row_ids, after = snapshot.page_rows(2, after=after, candidates=candidates)
+    assert list(row_ids) == [4]
+    assert after is None
+
+
+def test_filter_rows():
+    snapshot = make_snapshot(catalog_rows())
+    assert list(snapshot.filter_rows({})) == [0, 1, 2, 3, 4]
+    assert list(snapshot.filter_rows({'category': 'C1'})) == [0, 1, 2]
+    assert list(snapshot.filter_rows({'category': ' C2 '})) == [3]
+    assert list(snapshot.filter_rows({'category': 'C1'}, candidates=[1, 3])) == [1]
+    assert list(snapshot.filter_rows({'category': 'missing'})) == []
+    # A facet this snapshot has no column for matches nothing
+    assert list(snapshot.filter_rows({'brand': 'B1'})) == []
+
+
+def test_unchanged_rows_keep_the_version():
+    first = make_snapshot(catalog_rows())
+    assert make_snapshot(list(reversed(catalog_rows())), previous=first).version == first.version
+    changed = catalog_rows()
+    changed[0] = ('I3', 'Cola Zero', '300', 'C2', 'Drinks')
+    assert make_snapshot(changed, previous=first).version != first.version
+
+
+DETAILS_PATH = '/api/itemmaster/details?limit=20'
+
+
+@pytest.mark.parametrize('encoding', [None, 'gzip', 'br'])
+def test_etag_is_distinct_per_content_coding(server, client, encoding):
+    if encoding == 'br' and server.brotli is None:
+        pytest.skip('brotli is not installed')
+    headers = {'Accept-Encoding': encoding or 'identity'}
+    response = client.get(DETAILS_PATH, headers=headers)
+    assert response.status_code == 200
+    assert response.headers.get('Content-Encoding') == encoding
+    assert 'Accept-Encoding' in response.headers['Vary']
+    etag = response.headers['ETag'].strip('"')
+    assert etag.endswith(f'-{encoding}') if encoding else '-' not in etag
+
+    again = client.get(DETAILS_PATH, headers={**headers, 'If-None-Match': f'"{etag}"'})
+    assert again.status_code == 304
+    assert again.headers['ETag'] == response.headers['ETag']
+    assert again.data == b''
+
+    # Another coding's validator does not match this representation
+    other = 'gzip' if encoding is None else 'identity'
+    assert client.get(DETAILS_PATH, headers={
+        'Accept-Encoding': other, 'If-None-Match': f'"{etag}"',
+    }).status_code == 200
+
+
+def test_gzip_body_decodes_to_the_identity_body(client):
+    plain = client.get(DETAILS_PATH, headers={'Accept-Encoding': 'identity'})
+    packed = client.get(DETAILS_PATH, headers={'Accept-Encoding': 'gzip'})
+    assert json.loads(gzip.decompress(packed.data))['data'] == plain.get_json()['data']
+
+
+def test_handler_etag_is_left_alone(server, client):
+    checksum = server.catalog_files.current.checksum
+    response = client.get('/api/itemmaster/snapshot/file', headers={'Accept-Encoding': 'gzip'})
+    assert response.status_code == 200
+    assert response.headers['ETag'] == f'"{checksum}"'
+    assert 'Content-Encoding' not in response.headers
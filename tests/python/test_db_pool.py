@@ -0,0 +1,47 @@
+import pytest
+
+import fake_oracle
+
+
+@pytest.fixture
+def pool_stats(server, monkeypatch):
+    """Fresh pools and counters; the primary's DSN is restored afterwards"""
+    monkeypatch.setattr(server, '_db_pools', {})
+    monkeypatch.setattr(server, '_pool_stats', dict.fromkeys(server._pool_stats, 0))
+    yield server.get_pool_stats
+    fake_oracle.SETTINGS['dsns'].pop(server.DB_CONFIG['dsn'], None)
+    server.close_db_pool()
+
+
+def test_acquire_and_release_are_counted(server, pool_stats):
+    connection = server.get_db_connection('lookup')
+    stats = pool_stats()
+    assert (stats['acquired'], stats['released'], stats['busy']) == (1, 0, 1)
+
+    server.release_db_connection(connection)
+    stats = pool_stats()
+    assert (stats['acquired'], stats['released'], stats['dropped'], stats['busy']) == (1, 1, 0, 0)
+    assert stats['wait_ms_max'] >= stats['wait_ms_avg'] >= 0
+    assert stats['pools'] == {'primary': {'busy': 0, 'open': stats['open']}}
+
+
+def test_broken_session_is_dropped_not_returned(server, client, pool_stats):
+    assert client.get('/api/user/90001').status_code == 404
+    opened = pool_stats()['open']
+
+    # Sessions already open fail with ORA-03113 once the listener is gone
+    fake_oracle.set_dsn(server.DB_CONFIG['dsn'], None)
+    assert client.get('/api/user/90002').status_code == 500
+    stats = pool_stats()
+    assert (stats['acquired'], stats['released'], stats['dropped']) == (2, 1, 1)
+    assert stats['open'] == opened - 1
+
+    # Nothing broken went back to the pool: once the idle sessions are
+    # gone, a new one must be opened, and that fails too
+    for code in range(90003, 90003 + opened - 1):
+        assert client.get(f'/api/user/{code}').status_code == 500
+    assert pool_stats()['open'] == 0
+    assert client.get('/api/user/90100').status_code == 500
+    stats = pool_stats()
+    assert stats['acquire_errors'] == 1
+    assert stats['released'] == 1
@@ -0,0 +1,152 @@
+import collections
+import random
+import shutil
+import sqlite3
+
+import pytest
+
+import fake_oracle
+from db_routing import PRIMARY, ReadRouter, parse_dsns, parse_staleness
+
+# Two standbys on their own fake-Oracle DSNs: (backend, DSN, weight, lag seconds)
+REPLICAS = (('a', 'replica-a', 3.0, 1), ('b', 'replica-b', 1.0, 60))
+
+
+def set_lag(path, lag):
+    db = sqlite3.connect(path)
+    try:
+        db.execute('CREATE TABLE IF NOT EXISTS BENCH_LAG (LAG)')
+        db.execute('DELETE FROM BENCH_LAG')
+        db.execute('INSERT INTO BENCH_LAG VALUES (?)', (lag,))
+        db.commit()
+    finally:
+        db.close()
+
+
+@pytest.fixture
+def replicas(server, database, tmp_path, monkeypatch):
+    """server.py routing 'catalog' (any lag) and 'lookup' (5s) across two standbys"""
+    paths = {}
+    for name, dsn, _, lag in REPLICAS:
+        path = paths[name] = str(tmp_path / f'{dsn}.sqlite')
+        shutil.copyfile(database, path)
+        set_lag(path, lag)
+        fake_oracle.set_dsn(dsn, path)
+    router = ReadRouter(
+        server.DB_CONFIG['dsn'],
+        [(name, dsn, weight) for name, dsn, weight, _ in REPLICAS],
+        server._probe_backend,
+        {'catalog': None, 'lookup': 5.0},
+        failure_threshold=2,
+    )
+    monkeypatch.setattr(server, 'db_router', router)
+    monkeypatch.setattr(server, '_db_pools', {})
+    monkeypatch.setattr(server, 'DB_REPLICA_LAG_SQL', 'SELECT LAG FROM BENCH_LAG')
+    yield paths
+    server.close_db_pool()
+    for _, dsn, _, _ in REPLICAS:
+        fake_oracle.SETTINGS['dsns'].pop(dsn, None)
+
+
+def take_down(server, name):
+    """Stop the standby's listener and drop its idle sessions"""
+    fake_oracle.set_dsn(server.db_router.backends[name].dsn, None)
+    pool = server._db_pools.get(name)
+    if pool is not None:
+        pool.close()
+
+
+def routed(router, workload, count=400):
+    return collections.Counter(router.route(workload).name for _ in range(count))
+
+
+def test_parse_dsns_and_staleness():
+    assert parse_dsns('a=h1:1521/rgc@3, h2:1521/rgc') == [
+        ('a', 'h1:1521/rgc', 3.0), ('read2', 'h2:1521/rgc', 1.0),
+    ]
+    assert parse_dsns('') == []
+    with pytest.raises(ValueError):
+        parse_dsns('a=h1,a=h2')
+    with pytest.raises(ValueError):
+        parse_dsns(f'{PRIMARY}=h1')
+    assert parse_staleness('catalog=,lookup=30,stock=primary', {'stock': 15.0}) == {
+        'catalog': None, 'lookup': 30.0,
+    }
+
+
+def test_replicas_wait_for_their_first_probe(server, replicas):
+    router = server.db_router
+    assert routed(router, 'catalog') == {PRIMARY: 400}
+    router.check()
+    assert {backend['name']: backend['lag_seconds'] for backend in router.status()['backends']} == {
+        PRIMARY: None, 'a': 1.0, 'b': 60.0,
+    }
+
+
+def test_reads_are_spread_by_weight(server, replicas):
+    router = server.db_router
+    router.check()
+    random.seed(25)
+    counts = routed(router, 'catalog', 4000)
+    assert set(counts) == {'a', 'b'}
+    assert 0.7 < counts['a'] / 4000 < 0.8
+    # Writes and unlisted workloads never leave the primary
+    assert routed(router, 'write') == {PRIMARY: 400}
+    assert routed(router, 'status') == {PRIMARY: 400}
+
+
+def test_staleness_bound_excludes_lagging_replicas(server, replicas):
+    router = server.db_router
+    router.check()
+    assert routed(router, 'lookup') == {'a': 400}
+
+    set_lag(replicas['a'], 30)
+    router.check()
+    assert routed(router, 'lookup') == {PRIMARY: 400}
+    assert router.status()['primary_fallbacks'] == 400
+    # An unbounded workload still uses both
+    assert set(routed(router, 'catalog')) == {'a', 'b'}
+
+
+def test_failed_probes_take_a_replica_out_until_it_recovers(server, replicas):
+    router = server.db_router
+    router.check()
+    take_down(server, 'a')
+
+    router.check()
+    assert router.backends['a'].healthy
+    router.check()
+    assert not router.backends['a'].healthy
+    assert routed(router, 'catalog') == {'b': 400}
+
+    fake_oracle.set_dsn('replica-a', replicas['a'])
+    router.check()
+    assert router.backends['a'].healthy
+    assert router.backends['a'].failures == 0
+    assert set(routed(router, 'catalog')) == {'a', 'b'}
+
+
+def test_get_db_connection_falls_back_to_the_primary(server, replicas):
+    router = server.db_router
+    router.check()
+    take_down(server, 'a')
+    take_down(server, 'b')
+
+    for _ in range(50):
+        connection = server.get_db_connection('catalog')
+        try:
+            assert connection.backend == PRIMARY
+            cursor = connection.cursor()
+            cursor.execute('SELECT 1 FROM dual')
+            assert cursor.fetchone()[0] == 1
+            cursor.close()
+        finally:
+            server.release_db_connection(connection)
+        if not router.backends['a'].healthy and not router.backends['b'].healthy:
+            break
+
+    backends = {backend['name']: backend for backend in router.status()['backends']}
+    assert not backends['a']['healthy'] and not backends['b']['healthy']
+    assert backends['a']['session_errors'] == 2
+    assert backends['b']['session_errors'] == 2
+    assert routed(router, 'catalog') == {PRIMARY: 400}
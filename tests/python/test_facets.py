@@ -0,0 +1,67 @@
+from catalog import CatalogSnapshot, FacetIndex
+
+COLUMNS = ['ITEMCODE', 'ITEMNAME', 'BARCODE', 'CATEGORYCODE', 'CATEGORYNAME',
+           'BRANDCODE', 'BRANDNAME']
+ROWS = [
+    ('I1', 'Apple Juice', '1', 'C1', 'Drinks', 'B1', 'Acme'),
+    ('I2', 'Banana', '2', 'C2', 'Fruit', 'B2', 'Farm'),
+    ('I3', 'Cola', '3', 'C1', 'Drinks', 'B2', 'Farm'),
+    ('I4', 'Date', '4', None, None, 'B1', 'Acme'),
+    ('I5', 'Energy', '5', ' C1 ', None, 'B1', 'Acme'),
+]
+
+
+def test_postings_and_values():
+    index = FacetIndex(['C1', 'C2', 'C1', None, ' C1 '], ['Drinks', 'Fruit', None, None, None])
+    assert list(index.rows('C1')) == [0, 2, 4]
+    assert index.count('C2') == 1
+    assert index.count('C9') == 0
+    assert index.codes == ('C1', 'C2', 'C1', None, 'C1')
+    assert index.values == (
+        {'code': 'C1', 'name': 'Drinks', 'count': 3},
+        {'code': 'C2', 'name': 'Fruit', 'count': 1},
+    )
+
+
+def test_name_comes_from_the_first_row_that_has_one():
+    index = FacetIndex(['C1', 'C1'], [None, 'Drinks'])
+    assert index.values == ({'code': 'C1', 'name': 'Drinks', 'count': 2},)
+
+
+def test_counts_restricted_to_candidates():
+    index = FacetIndex(['C1', 'C2', 'C1', None], ['Drinks', 'Fruit', None, None])
+    assert index.counts([1, 2, 3]) == [
+        {'code': 'C1', 'name': 'Drinks', 'count': 1},
+        {'code': 'C2', 'name': 'Fruit', 'count': 1},
+    ]
+    assert index.counts([3]) == []
+
+
+def test_filters_combine_facets():
+    snapshot = CatalogSnapshot(COLUMNS, ROWS, loaded_at=0)
+    codes = snapshot.columns['ITEMCODE']
+    rows = snapshot.filter_rows({'category': 'C1', 'brand': 'B1'})
+    assert [codes[row_id] for row_id in rows] == ['I1', 'I5']
+
+
+def test_facet_counts_ignore_the_facets_own_filter():
+    snapshot = CatalogSnapshot(COLUMNS, ROWS, loaded_at=0)
+    counts = snapshot.facet_counts(['category', 'brand'], {'category': 'C1'})
+    # Sibling categories stay listed while C1 is selected
+    assert counts['category'] == [
+        {'code': 'C1', 'name': 'Drinks', 'count': 3},
+        {'code': 'C2', 'name': 'Fruit', 'count': 1},
+    ]
+    assert counts['brand'] == [
+        {'code': 'B1', 'name': 'Acme', 'count': 2},
+        {'code': 'B2', 'name': 'Farm', 'count': 1},
+    ]
+
+
+def test_search_hits_narrowed_by_a_facet():
+    snapshot = CatalogSnapshot(COLUMNS, ROWS, loaded_at=0)
+    codes = snapshot.columns['ITEMCODE']
+    ranked, total = snapshot.search_ranked('a', 10, {'brand': 'B2'})
+    assert total == 2
+    assert sorted(codes[row_id] for row_id in ranked) == ['I2', 'I3']
+    assert snapshot.search_ranked('a', 10, {'missing': 'X'}) == ([], 0)
@@ -0,0 +1,159 @@
+import asyncio
+import json
+import threading
+import time
+
+import pytest
+
+import gateway
+
+STATUS_PATH = '/api/rpos-login/status'
+
+
+def run_request(app, query, headers=(), disconnect_after=None):
+    """Drive one ASGI request; returns the messages sent back"""
+    async def scenario():
+        messages = asyncio.Queue()
+        await messages.put({'type': 'http.request', 'body': b''})
+        sent = []
+
+        async def send(message):
+            sent.append(message)
+
+        scope = {
+            'type': 'http', 'method': 'GET', 'path': STATUS_PATH,
+            'query_string': query.encode('latin-1'), 'headers': list(headers),
+            'client': ('10.0.0.9', 5000),
+        }
+        task = asyncio.ensure_future(app(scope, messages.get, send))
+        if disconnect_after is not None:
+            await asyncio.sleep(disconnect_after)
+            await messages.put({'type': 'http.disconnect'})
+        await asyncio.wait_for(task, 10)
+        return sent
+
+    return asyncio.run(scenario())
+
+
+def events(sent):
+    return [
+        json.loads(body.split(b'data: ', 1)[1])
+        for body in (message.get('body', b'') for message in sent[1:])
+        if body.startswith(b'event: status')
+    ]
+
+
+@pytest.fixture
+def app(server):
+    app = gateway.create_gateway(server)
+    app.stream_heartbeat = 0.05
+    app.stream_max_seconds = 1.0
+    yield app
+    if app._executor is not None:
+        app._executor.shutdown(wait=True)
+
+
+def upsert(client, device_id, flag):
+    response = client.post('/api/rpos-login', json={
+        'device_id': device_id, 'employee_id': 'E7', 'approval_flag': flag,
+    })
+    assert response.status_code == 200
+
+
+def test_status_stream_is_relayed_without_holding_a_slot(app, client):
+    upsert(client, 'till-sse', 'N')
+    approve = threading.Timer(0.3, upsert, (client, 'till-sse', 'Y'))
+    approve.start()
+    sent = run_request(app, 'device_id=till-sse&stream=1')
+    approve.join()
+
+    assert sent[0]['status'] == 200
+    assert (b'content-type', b'text/event-stream; charset=utf-8') in sent[0]['headers']
+    assert [event['approval_flag'] for event in events(sent)] == ['N', 'Y']
+    assert any(message.get('body') == b': keep-alive\n\n' for message in sent)
+    assert sent[-1] == {'type': 'http.response.body', 'body': b'', 'more_body': False}
+
+    stats = app.stats()
+    assert stats['status_streams'] == 0
+    # Only the first event went through Flask on the pool
+    assert stats['bulkheads']['status']['served'] == 1
+    assert stats['bulkheads']['status']['active'] == 0
+
+
+def test_accept_header_stream_stops_on_disconnect(app, client, server):
+    upsert(client, 'till-sse-2', 'N')
+    sent = run_request(
+        app, 'device_id=till-sse-2', [(b'accept', b'text/event-stream')], disconnect_after=0.1
+    )
+    assert [event['approval_flag'] for event in events(sent)] == ['N']
+    assert app.stats()['status_streams'] == 0
+    assert server.login_watcher.current('till-sse-2') is None
+
+
+def run_requests(app, queries):
+    """Drive concurrent ASGI requests on one loop; returns each one's messages"""
+    async def one(query):
+        messages = asyncio.Queue()
+        await messages.put({'type': 'http.request', 'body': b''})
+        sent = []
+
+        async def send(message):
+            sent.append(message)
+
+        await app({
+            'type': 'http', 'method': 'GET', 'path': STATUS_PATH,
+            'query_string': query.encode('latin-1'), 'headers': [],
+            'client': ('10.0.0.9', 5000),
+        }, messages.get, send)
+        return sent
+
+    async def scenario():
+        return await asyncio.wait_for(asyncio.gather(*(one(query) for query in queries)), 10)
+
+    return asyncio.run(scenario())
+
+
+def test_long_polls_are_answered_from_the_watcher(app, client):
+    upsert(client, 'till-poll', 'N')
+    approve = threading.Timer(0.3, upsert, (client, 'till-poll', 'Y'))
+    approve.start()
+    answers = run_requests(app, ['device_id=till-poll&wait=5'] * 5)
+    approve.join()
+
+    for sent in answers:
+        assert sent[0]['status'] == 200
+        assert json.loads(sent[1]['body'])['approval_flag'] == 'Y'
+    stats = app.stats()
+    assert stats['parked_long_polls'] == 0
+    # The waiters shared one read of the device on the pool
+    assert stats['bulkheads']['status']['served'] == 1
+
+
+def test_long_polls_are_rate_checked_before_parking(app, client, server, monkeypatch):
+    from admission import RateLimiter
+
+    upsert(client, 'till-limited', 'N')
+    monkeypatch.setattr(server, 'ADMISSION_ENABLED', True)
+    monkeypatch.setattr(server, 'rate_limiter', RateLimiter({'default': (0.01, 1)}))
+    [first] = run_requests(app, ['device_id=till-limited&wait=0.1'])
+    assert first[0]['status'] == 200
+
+    # The empty bucket turns the next poll away without parking it
+    started = time.monotonic()
+    [second] = run_requests(app, ['device_id=till-limited&wait=5'])
+    assert second[0]['status'] == 429
+    assert time.monotonic() - started < 1
+
+
+def test_stream_errors_are_relayed_as_is(app):
+    sent = run_request(app, 'stream=1')
+    assert sent[0]['status'] == 400
+    assert json.loads(sent[1]['body'])['message'] == 'device_id query parameter is required'
+
+
+def test_gateway_uses_the_admission_route_classes(app):
+    app._setup()
+    assert app._bulkhead_for('/api/itemmaster/details').name == 'catalog'
+    assert app._bulkhead_for(STATUS_PATH).name == 'status'
+    # 'login' has no bulkhead of its own
+    assert app._bulkhead_for('/api/rpos-login').name == 'default'
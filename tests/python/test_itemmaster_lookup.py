@@ -0,0 +1,52 @@
+import decimal
+
+LOOKUP_PATH = '/api/itemmaster/lookup'
+
+
+class NumericKeyCursor:
+    """Cursor for an ITEMCODE stored as NUMBER: binds match by value, rows carry numbers"""
+
+    def __init__(self, table):
+        self.table = table
+        self.description = [('ITEMCODE', None), ('ITEMNAME', None)]
+
+    def execute(self, sql, params):
+        wanted = set()
+        for value in params.values():
+            try:
+                wanted.add(decimal.Decimal(value))
+            except (TypeError, decimal.InvalidOperation):
+                pass  # NULL padding or a key that is not a number
+        self.rows = [row for row in self.table if row[0] in wanted]
+
+    def fetchall(self):
+        return self.rows
+
+
+def test_numeric_keys_are_reported_under_the_requested_text(server):
+    cursor = NumericKeyCursor([(decimal.Decimal(12), 'Water'), (decimal.Decimal(7), 'Juice')])
+    found = server._fetch_items_by_keys(
+        cursor, 'ITEMCODE', ['00012', '12', '7.0', '99', 'abc'], ['ITEMCODE', 'ITEMNAME']
+    )
+    assert sorted(found) == ['00012', '12', '7.0']
+    assert found['00012'] == [{'ITEMCODE': decimal.Decimal(12), 'ITEMNAME': 'Water'}]
+
+
+def test_malformed_requests_get_400(client):
+    bad_fields = {'item_codes': ['I0000001'], 'fields': {'ITEMCODE': True}}
+    assert client.post(LOOKUP_PATH, json=bad_fields).status_code == 400
+    assert client.post(LOOKUP_PATH, json=['I0000001']).status_code == 400
+    assert client.post(LOOKUP_PATH, json={'item_codes': 'I0000001'}).status_code == 400
+    assert client.post(LOOKUP_PATH, json={}).status_code == 400
+
+
+def test_batch_lookup_from_oracle_keeps_requested_keys(client, db_only):
+    response = client.post(LOOKUP_PATH, json={
+        'item_codes': ['I0000001', ' I0000002 ', 'missing'],
+        'fields': ['ITEMCODE', 'BARCODE'],
+    })
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['missing'] == {'item_codes': ['missing'], 'barcodes': []}
+    assert set(body['data']['item_codes']) == {'I0000001', 'I0000002', 'missing'}
+    assert body['data']['item_codes']['I0000002'][0]['ITEMCODE'] == 'I0000002'
@@ -0,0 +1,86 @@
+import json
+
+import pytest
+
+from conftest import CARTON_BARCODE, CARTON_ITEM
+
+
+def walk(client, limit):
+    """(ITEMCODE, BARCODE) of every row reached by following next_cursor"""
+    seen, after = [], ''
+    while True:
+        response = client.get(
+            f'/api/itemmaster/details?fields=ITEMCODE,BARCODE&limit={limit}&after={after}'
+        )
+        assert response.status_code == 200
+        body = response.get_json()
+        seen.extend((item['ITEMCODE'], item['BARCODE']) for item in body['data'])
+        after = body.get('next_cursor')
+        if not after:
+            return seen
+
+
+@pytest.mark.parametrize('limit', [1, 2, 3, 4, 7])
+def test_keyset_walk_from_oracle_includes_every_unit_row(client, db_only, limit):
+    seen = walk(client, limit)
+    assert len(seen) == 31
+    assert len(set(seen)) == len(seen)
+    assert (CARTON_ITEM, CARTON_BARCODE) in seen
+
+
+@pytest.mark.parametrize('limit', [1, 2, 3, 4, 7])
+def test_keyset_walk_from_snapshot_matches_oracle(client, server, monkeypatch, limit):
+    from_snapshot = walk(client, limit)
+    monkeypatch.setattr(server, 'CATALOG_SNAPSHOT_ENABLED', False)
+    assert from_snapshot == walk(client, limit)
+
+
+def export_lines(response):
+    return [json.loads(line) for line in response.get_data().splitlines()]
+
+
+def test_export_from_oracle_streams_every_row(client, server, db_only, monkeypatch):
+    # Several fetch batches rather than one
+    monkeypatch.setattr(server, 'EXPORT_ARRAYSIZE', 8)
+    response = client.get('/api/itemmaster/export?fields=barcode,ITEMCODE,bogus')
+    assert response.status_code == 200
+    assert response.is_streamed
+    assert response.mimetype == 'application/x-ndjson'
+    assert response.headers['X-Catalog-Fields'] == 'ITEMCODE,BARCODE'
+    assert 'X-Catalog-Version' not in response.headers
+
+    items = export_lines(response)
+    assert len(items) == 31
+    assert all(list(item) == ['ITEMCODE', 'BARCODE'] for item in items)
+    assert {'ITEMCODE': CARTON_ITEM, 'BARCODE': CARTON_BARCODE} in items
+
+
+def test_export_from_oracle_drops_the_session_on_a_mid_stream_error(
+        client, server, db_only, monkeypatch):
+    import fake_oracle
+
+    monkeypatch.setattr(server, 'EXPORT_ARRAYSIZE', 8)
+    fetchmany = fake_oracle.Cursor.fetchmany
+    batches = []
+
+    def failing_fetchmany(cursor, numRows=None):
+        batches.append(numRows)
+        if len(batches) == 2:
+            raise fake_oracle._error(3113, 'ORA-03113: end-of-file on communication channel')
+        return fetchmany(cursor, numRows)
+
+    monkeypatch.setattr(fake_oracle.Cursor, 'fetchmany', failing_fetchmany)
+    before = server.get_pool_stats()
+    response = client.get('/api/itemmaster/export?fields=ITEMCODE')
+    # Headers are already sent: the error can only cut the stream short
+    assert response.status_code == 200
+    chunks = []
+    with pytest.raises(fake_oracle.Error):
+        for chunk in response.response:
+            chunks.append(chunk)
+    assert len(b''.join(chunks).splitlines()) == 8
+
+    after = server.get_pool_stats()
+    assert after['dropped'] == before['dropped'] + 1
+    assert after['released'] == before['released']
+    assert after['busy'] == 0
@@ -0,0 +1,58 @@
+import threading
+
+from login_watch import StatusWatcher
+
+
+def watcher_for(device_id):
+    watcher = StatusWatcher(lambda device_ids: {}, interval=3600)
+    watcher.subscribe(device_id)
+    return watcher
+
+
+def test_only_approval_flag_changes_bump_the_version():
+    watcher = watcher_for('till-1')
+    woken = []
+    watcher.add_listener('till-1', lambda: woken.append(1))
+
+    assert watcher.publish('till-1', ('N', 'E1', 'A1', None)) == 1
+    assert watcher.publish('till-1', ('N', 'E1', 'A1', '10.0.0.5')) == 1
+    assert watcher.current('till-1') == (1, ('N', 'E1', 'A1', '10.0.0.5'))
+    assert watcher.publish('till-1', ('Y', 'E1', 'A1', '10.0.0.5')) == 2
+    assert watcher.publish('till-1', None) == 3
+    assert len(woken) == 3
+    assert watcher.stats()['changes'] == 2
+
+
+def test_unwatched_devices_are_not_recorded():
+    watcher = StatusWatcher(lambda device_ids: {}, interval=3600)
+    assert watcher.publish('till-9', ('Y', 'E1', 'A1', None)) is None
+    assert watcher.current('till-9') is None
+
+
+def test_wait_for_change_returns_on_approval_only():
+    watcher = watcher_for('till-2')
+    watcher.publish('till-2', ('N', 'E1', 'A1', None))
+    assert watcher.wait_for_change('till-2', 1, 0.01) is None
+
+    timer = threading.Timer(0.05, watcher.publish, ('till-2', ('N', 'E1', 'A1', '10.0.0.5')))
+    timer.start()
+    assert watcher.wait_for_change('till-2', 1, 0.2) is None
+    timer.join()
+
+    timer = threading.Timer(0.05, watcher.publish, ('till-2', ('Y', 'E1', 'A1', None)))
+    timer.start()
+    assert watcher.wait_for_change('till-2', 1, 5) == (2, ('Y', 'E1', 'A1', None))
+    timer.join()
+
+
+def test_upsert_publishes_an_empty_lan_ip_as_null(server, client):
+    server.login_watcher.subscribe('till-upsert')
+    try:
+        response = client.post('/api/rpos-login', json={
+            'device_id': 'till-upsert', 'employee_id': 'E1', 'approval_flag': 'N', 'lan_ip': '',
+        })
+        assert response.status_code == 200
+        # The watcher's own poll may have published first, so only the state is fixed
+        assert server.login_watcher.current('till-upsert')[1] == ('N', 'E1', 'E1', None)
+    finally:
+        server.login_watcher.unsubscribe('till-upsert')
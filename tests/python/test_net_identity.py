@@ -0,0 +1,15 @@
+import time
+
+from net_identity import NetworkIdentity
+
+
+def test_stop_ends_the_refresher_without_waiting_out_the_interval():
+    identity = NetworkIdentity(interval=60, reader=lambda: ('till-1', '10.0.0.5', []))
+    assert identity.current()['lan_ip'] == '10.0.0.5'
+    # Let the thread reach its wait (on the netlink socket where available)
+    time.sleep(0.1)
+    started = time.monotonic()
+    identity.stop()
+    identity._thread.join(5)
+    assert not identity._thread.is_alive()
+    assert time.monotonic() - started < 2
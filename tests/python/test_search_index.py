@@ -0,0 +1,66 @@
+from catalog import CatalogSnapshot, SearchIndex, normalise_text
+
+COLUMNS = ['ITEMCODE', 'ITEMNAME', 'ITEMNAMEARA', 'BARCODE']
+
+
+def matches(index, needle):
+    return sorted(row_id for text_id in index.match(needle) for row_id in index.rows(text_id))
+
+
+def test_normalise_text_folds_case_whitespace_and_arabic_variants():
+    assert normalise_text(None) == ''
+    assert normalise_text('  Green   TEA ') == 'green tea'
+    # Hamza forms of alef, taa marbuta and alef maqsura
+    assert normalise_text('أحمد') == normalise_text('احمد')
+    assert normalise_text('قهوة') == normalise_text('قهوه')
+    assert normalise_text('مصطفى') == normalise_text('مصطفي')
+    # Harakat and tatweel are dropped
+    assert normalise_text('شَاي') == 'شاي'
+    assert normalise_text('شـاي') == 'شاي'
+
+
+def test_match_confirms_substrings():
+    index = SearchIndex(['apple juice', 'pineapple', 'grape', 'apple juice'])
+    assert matches(index, 'apple') == [0, 1, 3]
+    assert matches(index, 'juice') == [0, 3]
+    # Both trigrams of 'pleap' occur in 'pineapple', but not next to each other
+    assert matches(index, 'pleap') == []
+    assert matches(index, 'ap') == [0, 1, 2, 3]
+    assert matches(index, 'melon') == []
+
+
+def test_incremental_rebuild_matches_a_full_build():
+    first = SearchIndex(['apple', 'banana', 'cherry'])
+    second = SearchIndex(['banana', 'cherry pie', 'date'], previous=first)
+    full = SearchIndex(['banana', 'cherry pie', 'date'])
+    for needle in ('apple', 'ban', 'cherry', 'pie', 'date', 'an'):
+        assert matches(second, needle) == matches(full, needle)
+
+
+def test_incremental_rebuild_leaves_the_previous_index_intact():
+    first = SearchIndex(['apple', 'banana'])
+    SearchIndex(['banana', 'apricot'], previous=first)
+    assert matches(first, 'apple') == [0]
+    assert matches(first, 'apri') == []
+
+
+def test_snapshot_search_and_ranking():
+    rows = [
+        ('I1', 'Tea Green', 'شاي أخضر', '111'),
+        ('I2', 'Green Tea', 'شاي', '222'),
+        ('I3', 'Teapot', None, '333'),
+        ('I4', 'Coffee', 'قهوة', '444'),
+    ]
+    snapshot = CatalogSnapshot(COLUMNS, rows, loaded_at=0)
+    codes = snapshot.columns['ITEMCODE']
+    assert [codes[row_id] for row_id in snapshot.search('TEA')] == ['I2', 'I1', 'I3']
+    assert [codes[row_id] for row_id in snapshot.search('اخضر')] == ['I1']
+    assert [codes[row_id] for row_id in snapshot.search('قهوه')] == ['I4']
+    assert [codes[row_id] for row_id in snapshot.search('444')] == ['I4']
+    # A needle never matches across the name/Arabic name boundary
+    assert list(snapshot.search('coffeeق')) == []
+
+    ranked, total = snapshot.search_ranked('tea', 2)
+    assert total == 3
+    # Field prefix ('Tea Green', 'Teapot') ranks above a word prefix ('Green Tea')
+    assert [codes[row_id] for row_id in ranked] == ['I1', 'I3']
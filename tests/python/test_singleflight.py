@@ -0,0 +1,102 @@
+import threading
+import time
+
+import pytest
+
+from singleflight import SingleFlight
+
+
+def test_concurrent_callers_share_the_leaders_result():
+    flight = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def query():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return 'rows'
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(flight.do('page', query)))
+    leader.start()
+    assert started.wait(5)
+    followers = [
+        threading.Thread(target=lambda: results.append(flight.do('page', query)))
+        for _ in range(3)
+    ]
+    for follower in followers:
+        follower.start()
+    while flight.stats()['waiting'] < 3:
+        time.sleep(0.001)
+    release.set()
+    for thread in [leader, *followers]:
+        thread.join(5)
+
+    assert len(calls) == 1
+    assert sorted(results) == [('rows', False), ('rows', True), ('rows', True), ('rows', True)]
+    stats = flight.stats()
+    assert (stats['leaders'], stats['coalesced'], stats['in_flight']) == (1, 3, 0)
+
+
+def test_followers_receive_the_leaders_error():
+    flight = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+
+    def failing():
+        started.set()
+        release.wait(5)
+        raise RuntimeError('ORA-03113')
+
+    errors = []
+
+    def call():
+        try:
+            flight.do('key', failing)
+        except RuntimeError as error:
+            errors.append(str(error))
+
+    leader = threading.Thread(target=call)
+    leader.start()
+    assert started.wait(5)
+    follower = threading.Thread(target=call)
+    follower.start()
+    while flight.stats()['waiting'] < 1:
+        time.sleep(0.001)
+    release.set()
+    leader.join(5)
+    follower.join(5)
+    assert errors == ['ORA-03113', 'ORA-03113']
+    assert flight.stats()['errors'] == 1
+
+
+def test_follower_runs_its_own_query_after_the_wait_timeout():
+    flight = SingleFlight(wait_timeout=0.05)
+    started = threading.Event()
+    release = threading.Event()
+
+    def stuck():
+        started.set()
+        release.wait(5)
+        return 'late'
+
+    leader = threading.Thread(target=lambda: flight.do('key', stuck))
+    leader.start()
+    assert started.wait(5)
+    try:
+        assert flight.do('key', lambda: 'own') == ('own', False)
+        assert flight.stats()['timeouts'] == 1
+    finally:
+        release.set()
+        leader.join(5)
+
+
+def test_nothing_is_kept_after_the_call():
+    flight = SingleFlight()
+    assert flight.do('key', lambda: 1) == (1, False)
+    assert flight.do('key', lambda: 2) == (2, False)
+    with pytest.raises(ValueError):
+        flight.do('key', lambda: int('x'))
+    assert flight.stats()['in_flight'] == 0
@@ -0,0 +1,81 @@
+import os
+
+import pytest
+
+import ttl_cache
+from ttl_cache import TTLCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(ttl_cache, 'time', clock)
+    return clock
+
+
+def test_entries_expire_after_their_ttl(clock):
+    cache = TTLCache(ttl=10, negative_ttl=2)
+    cache.set('user', {'name': 'A'})
+    cache.set('missing', None)
+
+    clock.now += 1
+    assert cache.get('user') == (True, {'name': 'A'})
+    assert cache.get('missing') == (True, None)
+
+    clock.now += 1
+    assert cache.get('missing') == (False, None)
+    assert cache.get('user') == (True, {'name': 'A'})
+
+    clock.now += 8
+    assert cache.get('user') == (False, None)
+    stats = cache.stats()
+    assert stats['expired'] == 2
+    assert stats['size'] == 0
+    assert (stats['hits'], stats['negative_hits'], stats['misses']) == (2, 1, 2)
+
+
+def test_least_recently_used_entry_is_evicted(clock):
+    cache = TTLCache(maxsize=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+    assert cache.get('b') == (False, None)
+    assert cache.get('a') == (True, 1)
+    assert cache.get('c') == (True, 3)
+    assert cache.stats()['evictions'] == 1
+
+
+def test_zero_ttl_disables_caching(clock):
+    cache = TTLCache(ttl=10, negative_ttl=0)
+    cache.set('missing', None)
+    assert cache.get('missing') == (False, None)
+
+
+def test_invalidate(clock):
+    cache = TTLCache()
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.invalidate('a') == 1
+    assert cache.invalidate('a') == 0
+    assert cache.get('a') == (False, None)
+    assert cache.invalidate() == 1
+    assert cache.stats()['size'] == 0
+
+
+def test_invalidate_endpoint_reports_its_worker(server, client):
+    server.user_cache.set(7, {'name': 'cached'})
+    response = client.post('/api/cache/invalidate', json={'cache': 'user', 'key': 7})
+    assert response.status_code == 200
+    assert response.get_json() == {
+        'success': True, 'removed': {'user': 1}, 'scope': 'worker', 'pid': os.getpid(),
+    }
+    assert server.user_cache.get(7) == (False, None)
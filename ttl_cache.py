@@ -0,0 +1,90 @@
+"""Bounded LRU cache with per-entry expiry and negative caching.
+
+Used by server.py in front of small, rarely changing lookup tables so that
+repeated logins and receipt renders do not each query Oracle.
+"""
+from collections import OrderedDict
+import threading
+import time
+
+_MISSING = object()
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries expire after a TTL.
+
+    A `None` value records a negative result (e.g. a 404) and lives for the
+    shorter `negative_ttl`.
+    """
+
+    def __init__(self, maxsize=5000, ttl=300, negative_ttl=30):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {
+            'hits': 0,
+            'negative_hits': 0,
+            'misses': 0,
+            'expired': 0,
+            'evictions': 0,
+            'invalidations': 0,
+        }
+
+    def get(self, key):
+        """Return (hit, value); `value` is None for a cached negative result"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key, _MISSING)
+            if entry is _MISSING:
+                self._stats['misses'] += 1
+                return False, None
+
+            expires_at, value = entry
+            if expires_at <= now:
+                del self._entries[key]
+                self._stats['expired'] += 1
+                self._stats['misses'] += 1
+                return False, None
+
+            self._entries.move_to_end(key)
+            self._stats['negative_hits' if value is None else 'hits'] += 1
+            return True, value
+
+    def set(self, key, value):
+        ttl = self.negative_ttl if value is None else self.ttl
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self._stats['evictions'] += 1
+
+    def invalidate(self, key=_MISSING):
+        """Drop one key, or every entry when no key is given; returns the count"""
+        with self._lock:
+            if key is _MISSING:
+                removed = len(self._entries)
+                self._entries.clear()
+            else:
+                removed = 1 if self._entries.pop(key, _MISSING) is not _MISSING else 0
+            self._stats['invalidations'] += removed
+            return removed
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = len(self._entries)
+        lookups = stats['hits'] + stats['negative_hits'] + stats['misses']
+        stats['hit_ratio'] = (
+            round((stats['hits'] + stats['negative_hits']) / lookups, 4) if lookups else 0.0
+        )
+        stats.update({
+            'maxsize': self.maxsize,
+            'ttl': self.ttl,
+            'negative_ttl': self.negative_ttl,
+        })
+        return stats